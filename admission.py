@@ -0,0 +1,123 @@
+# admission.py
+# Load shedding for summary requests. Expected queue wait, recent LLM latency and Discord REST
+# pressure are folded into one load score; the score picks a degradation level, and each
+# level gives up a little more quality so the queue drains before interaction tokens expire:
+# fewer messages, no topics section, a cheaper model with a shorter answer, and finally an
+# early "try again in N minutes". Levels rise as soon as the load does but only fall one at a
+# time, after the load has stayed clearly below the level's threshold for a hold period.
+
+import time
+from typing import Dict, Optional, Sequence
+
+NORMAL = 0
+FEWER_MESSAGES = 1
+NO_TOPICS = 2
+LITE = 3
+REJECT = 4
+LEVEL_NAMES = ("normal", "fewer_messages", "no_topics", "lite", "reject")
+
+class Plan:
+    __slots__ = ("level", "count", "include_topics", "model", "max_tokens", "degraded")
+
+    def __init__(self, level: int, count: int, include_topics: Optional[bool], model: Optional[str],
+                 max_tokens: int, degraded: bool):
+        self.level = level
+        self.count = count
+        self.include_topics = include_topics
+        self.model = model  # None = the route's own model
+        self.max_tokens = max_tokens
+        self.degraded = degraded
+
+class AdmissionController:
+    def __init__(self, thresholds: Sequence[float] = (1.0, 1.5, 2.0, 3.0), exit_ratio: float = 0.7,
+                 hold_seconds: float = 30.0, queue_seconds: float = 180.0, llm_seconds: float = 20.0,
+                 rest_pressure: float = 0.8, max_count: int = 200, lite_model: Optional[str] = None,
+                 max_tokens: int = 400, lite_max_tokens: int = 250):
+        # thresholds[i] is the load at which level i + 1 starts. A load of 1.0 on one signal
+        # means: an expected queue wait of queue_seconds, a p95 LLM latency of llm_seconds, or
+        # REST pressure at rest_pressure.
+        if len(thresholds) != REJECT:
+            raise ValueError(f"expected {REJECT} thresholds")
+        self.thresholds = list(thresholds)
+        self.exit_ratio = exit_ratio
+        self.hold_seconds = hold_seconds
+        self.queue_seconds = queue_seconds
+        self.llm_seconds = llm_seconds
+        self.rest_pressure = rest_pressure
+        self.max_count = max_count
+        self.lite_model = lite_model
+        self.max_tokens = max_tokens
+        self.lite_max_tokens = lite_max_tokens
+
+        self.level = NORMAL
+        self.load = 0.0
+        self.signals: Dict[str, float] = {"queue": 0.0, "llm": 0.0, "rest": 0.0}
+        self._calm_since = 0.0
+
+        self.transitions = 0
+        self.decisions: Dict[str, int] = {}
+
+    def observe(self, queue_wait: float, llm_p95: float, rest_pressure: float, now: Optional[float] = None) -> int:
+        now = time.monotonic() if now is None else now
+        self.signals = {
+            "queue": queue_wait / self.queue_seconds if self.queue_seconds > 0 else 0.0,
+            "llm": llm_p95 / self.llm_seconds if self.llm_seconds > 0 else 0.0,
+            "rest": rest_pressure / self.rest_pressure if self.rest_pressure > 0 else 0.0,
+        }
+        self.load = max(self.signals.values())
+        target = sum(1 for t in self.thresholds if self.load >= t)
+
+        if target > self.level:
+            self.level = target
+            self._calm_since = now
+            self.transitions += 1
+        elif self.level > NORMAL and self.load >= self._exit_line(self.level):
+            self._calm_since = now
+        else:
+            # One level per hold period spent under the exit line; a long quiet spell between
+            # requests can walk down several levels at once.
+            while (self.level > target and now - self._calm_since >= self.hold_seconds
+                   and self.load < self._exit_line(self.level)):
+                self.level -= 1
+                self._calm_since += self.hold_seconds
+                self.transitions += 1
+        return self.level
+
+    def _exit_line(self, level: int) -> float:
+        return self.thresholds[level - 1] * self.exit_ratio
+
+    def admit(self) -> bool:
+        if self.level >= REJECT:
+            self._decide("reject")
+            return False
+        return True
+
+    def plan(self, count: int, include_topics: Optional[bool]) -> Plan:
+        # include_topics=None leaves the choice to the caller once it knows how many messages it got.
+        level = min(self.level, LITE)
+        model, max_tokens = None, self.max_tokens
+        applied = []
+        if level >= FEWER_MESSAGES and count > self.max_count:
+            count = self.max_count
+            applied.append("fewer_messages")
+        if level >= NO_TOPICS and include_topics is not False:
+            include_topics = False
+            applied.append("no_topics")
+        if level >= LITE:
+            model, max_tokens = self.lite_model, self.lite_max_tokens
+            applied.append("lite")
+        for action in applied:
+            self._decide(action)
+        return Plan(level, count, include_topics, model, max_tokens, bool(applied))
+
+    def _decide(self, action: str):
+        self.decisions[action] = self.decisions.get(action, 0) + 1
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "level": LEVEL_NAMES[self.level],
+            "load": round(self.load, 3),
+            **{k: round(v, 3) for k, v in self.signals.items()},
+            "transitions": self.transitions,
+            **self.decisions,
+        }
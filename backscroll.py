@@ -1,48 +1,115 @@
 import os
-import io
-import csv
 import time
-import sqlite3
 import asyncio
-import threading
-from typing import List, Optional
-from collections import defaultdict
-from datetime import datetime
+import math
+import signal
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, List, Optional, Tuple
+from datetime import datetime, timezone
 from zoneinfo import ZoneInfo
 
+_IMPORT_STARTED = time.perf_counter()
+
 import discord
 from discord import app_commands
 from discord.ext import commands
 from dotenv import load_dotenv
-from openai import OpenAI
-
-from http.server import BaseHTTPRequestHandler, HTTPServer
-class _Ping(BaseHTTPRequestHandler):
-    def do_GET(self):
-        self.send_response(200)
-        self.end_headers()
-        self.wfile.write(b"OK")
-    def do_HEAD(self):
-        self.send_response(200)
-        self.end_headers()
-
-def _keepalive():
-    port = int(os.environ.get("PORT", "10000"))
-    server = HTTPServer(("0.0.0.0", port), _Ping)
-    server.serve_forever()
-
-threading.Thread(target=_keepalive, daemon=True).start()
+import httpx
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+from storage import Storage
+from message_cache import CachedMessage, MessageCache
+from summary_cache import SummaryStore
+from compaction import compact_transcript, estimate_tokens
+from singleflight import SingleFlight
+from scheduler import FairScheduler, QueueTimeout
+from quota import QuotaEngine, QuotaGate
+from guild_settings import GuildSettingsStore
+from llm_cache import LLMCache, cache_key
+from llm_router import CircuitBreaker, LLMRouter, Route, parse_routes
+from admission import LEVEL_NAMES, NORMAL, AdmissionController
+import digests
+from digests import BatchClient, DigestItem, DigestStore
+import maintenance
+import migrations
+from event_log import EventLog
+import cluster
+from rest_budget import PRIORITY_NAMES, RestBudgetExceeded, RestGovernor
+from export import export_usage, parse_when
+import metrics
 
 load_dotenv()
 DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-if not DISCORD_TOKEN or not OPENAI_API_KEY:
-    raise SystemExit("❌ Missing DISCORD_TOKEN or OPENAI_API_KEY in environment or .env file.")
-
-client = OpenAI(api_key=OPENAI_API_KEY)
-
+OPENAI_TIMEOUT_SECONDS = float(os.environ.get("OPENAI_TIMEOUT_SECONDS", "60"))
+OPENAI_CONNECT_TIMEOUT_SECONDS = float(os.environ.get("OPENAI_CONNECT_TIMEOUT_SECONDS", "5"))
+OPENAI_MAX_CONNECTIONS = int(os.environ.get("OPENAI_MAX_CONNECTIONS", "50"))
+OPENAI_MAX_KEEPALIVE = int(os.environ.get("OPENAI_MAX_KEEPALIVE", "20"))
+# Retries, hedging and fallback happen in llm_router; the SDK's own retries stay off by default.
+OPENAI_MAX_RETRIES = int(os.environ.get("OPENAI_MAX_RETRIES", "0"))
+
+_openai_client: Optional["AsyncOpenAI"] = None
+
+def openai_client() -> "AsyncOpenAI":
+    # Built on first use, so importing this module opens no connection pool (and skips
+    # importing the SDK, which is most of a cold start).
+    global _openai_client
+    if _openai_client is None:
+        from openai import AsyncOpenAI, DefaultAsyncHttpxClient, Timeout
+        _openai_client = AsyncOpenAI(
+            api_key=OPENAI_API_KEY,
+            max_retries=OPENAI_MAX_RETRIES,
+            http_client=DefaultAsyncHttpxClient(
+                timeout=Timeout(OPENAI_TIMEOUT_SECONDS, connect=OPENAI_CONNECT_TIMEOUT_SECONDS),
+                limits=httpx.Limits(
+                    max_connections=OPENAI_MAX_CONNECTIONS,
+                    max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+                    keepalive_expiry=60,
+                ),
+            ),
+        )
+    return _openai_client
+
+# Ordered fallback list: "model" or "model@base_url", comma separated. The first route is primary.
+LLM_ROUTES = os.environ.get("LLM_ROUTES", "gpt-4o-mini")
+LLM_ATTEMPT_TIMEOUT_SECONDS = float(os.environ.get("LLM_ATTEMPT_TIMEOUT_SECONDS", "30"))
+LLM_DEADLINE_SECONDS = float(os.environ.get("LLM_DEADLINE_SECONDS", "90"))
+LLM_MAX_ATTEMPTS = int(os.environ.get("LLM_MAX_ATTEMPTS", "3"))
+LLM_HEDGE = os.environ.get("LLM_HEDGE", "1") == "1"
+LLM_HEDGE_MIN_SECONDS = float(os.environ.get("LLM_HEDGE_MIN_SECONDS", "1"))
+LLM_HEDGE_DEFAULT_SECONDS = float(os.environ.get("LLM_HEDGE_DEFAULT_SECONDS", "8"))
+LLM_BREAKER_FAILURES = int(os.environ.get("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN_SECONDS = float(os.environ.get("LLM_BREAKER_COOLDOWN_SECONDS", "30"))
+
+def _make_routes() -> List[Route]:
+    routes = []
+    for model, base_url in parse_routes(LLM_ROUTES):
+        if base_url is None:
+            name, connect = model, openai_client
+        else:
+            # with_options shares the connection pool with the primary client.
+            name = f"{model}@{httpx.URL(base_url).host}"
+            connect = lambda base_url=base_url: openai_client().with_options(base_url=base_url)
+        routes.append(Route(name, model, connect, CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN_SECONDS)))
+    return routes
+
+llm_router = LLMRouter(
+    _make_routes(),
+    attempt_timeout=LLM_ATTEMPT_TIMEOUT_SECONDS,
+    deadline=LLM_DEADLINE_SECONDS,
+    max_attempts=LLM_MAX_ATTEMPTS,
+    hedge=LLM_HEDGE,
+    hedge_min=LLM_HEDGE_MIN_SECONDS,
+    hedge_default=LLM_HEDGE_DEFAULT_SECONDS,
+)
+LLM_MODEL = llm_router.routes[0].model
 MAX_BACKSCROLL = 500
+SUMMARY_MAX_TOKENS = 400
+# Hard ceiling on raw messages paged per summary while looking for enough human ones.
+MAX_SCAN_MESSAGES = int(os.getenv("MAX_SCAN_MESSAGES", "2000"))
 BOT_VERSION = "v5.1"
 SUPPORT_LINK = "https://discord.gg/kKSeZU37dy"
 
@@ -54,9 +121,73 @@ MAX_DAILY_PER_USER = 10
 
 LOCAL_TZ = ZoneInfo("America/New_York")
 
-MAX_CONCURRENT_SUMMARIES_GLOBAL = 3
-_global_summary_sem = asyncio.Semaphore(MAX_CONCURRENT_SUMMARIES_GLOBAL)
-_guild_locks: defaultdict[int, asyncio.Lock] = defaultdict(asyncio.Lock)
+QUOTA_COMMANDS = ("backscroll", "backscroll_private", "backscroll_server")
+QUOTA_GUILD_WINDOW_SECONDS = 86400
+QUOTA_CHECKPOINT_SECONDS = 60
+quota = QuotaEngine(QUOTA_GUILD_WINDOW_SECONDS, COOLDOWN_SECONDS)
+
+MESSAGE_CACHE_MAX_BYTES = int(os.environ.get("MESSAGE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+MESSAGE_CACHE_IDLE_SECONDS = int(os.environ.get("MESSAGE_CACHE_IDLE_SECONDS", str(6 * 3600)))
+message_cache = MessageCache(MAX_BACKSCROLL, MESSAGE_CACHE_MAX_BYTES, MESSAGE_CACHE_IDLE_SECONDS)
+
+SUMMARY_CACHE_TTL_SECONDS = int(os.environ.get("SUMMARY_CACHE_TTL_SECONDS", "1800"))
+SUMMARY_CACHE_PER_GUILD = int(os.environ.get("SUMMARY_CACHE_PER_GUILD", "16"))
+SUMMARY_CACHE_MAX_GUILDS = int(os.environ.get("SUMMARY_CACHE_MAX_GUILDS", "5000"))
+summary_store = SummaryStore(SUMMARY_CACHE_PER_GUILD, SUMMARY_CACHE_MAX_GUILDS, SUMMARY_CACHE_TTL_SECONDS)
+
+STREAM_REPLIES = os.environ.get("STREAM_REPLIES", "1") == "1"
+# Discord allows roughly 5 edits per 5s on a message; stay well under that.
+STREAM_EDIT_INTERVAL = float(os.environ.get("STREAM_EDIT_INTERVAL", "1.5"))
+STREAM_MAX_EDITS = 30
+
+summary_flights = SingleFlight()
+
+MAX_CONCURRENT_SUMMARIES_GLOBAL = int(os.environ.get("MAX_CONCURRENT_SUMMARIES_GLOBAL", "3"))
+# "guild_id:weight,..." — a guild with weight 3 gets three turns in the scheduler for every one
+# a default guild gets while both have summaries queued.
+SCHEDULER_GUILD_WEIGHTS = {
+    int(g): int(w)
+    for g, _, w in (part.strip().partition(":") for part in os.environ.get("SCHEDULER_GUILD_WEIGHTS", "").split(","))
+    if g and w
+}
+
+# Cluster mode: `CLUSTER_WORKERS=N python backscroll.py` runs the coordinator, which starts N
+# worker processes of this same script with CLUSTER_ROLE=worker and a shard range each.
+CLUSTER_WORKERS = int(os.environ.get("CLUSTER_WORKERS", "0"))
+CLUSTER_ROLE = os.environ.get("CLUSTER_ROLE", "")
+# Unset: the coordinator picks a private per-instance path and hands it to its workers.
+CLUSTER_SOCKET = os.environ.get("CLUSTER_SOCKET", "")
+CLUSTER_SHARDS = int(os.environ.get("CLUSTER_SHARDS", "0"))  # 0 = Discord's recommendation
+IS_WORKER = CLUSTER_ROLE == "worker"
+
+# Interaction tokens last 15 minutes; leave room to actually produce and deliver the summary.
+INTERACTION_TTL_SECONDS = 15 * 60
+INTERACTION_WORK_MARGIN_SECONDS = 120
+
+# Load shedding: as expected queue wait, LLM p95 or REST pressure climb past SHED_THRESHOLDS, summaries
+# get fewer messages, then no topics, then SHED_LITE_MODEL (if set) with a shorter answer, and
+# finally new requests are turned away with an estimate of when to come back.
+admission = AdmissionController(
+    thresholds=[float(x) for x in os.environ.get("SHED_THRESHOLDS", "1,1.5,2,3").split(",")],
+    exit_ratio=float(os.environ.get("SHED_EXIT_RATIO", "0.7")),
+    hold_seconds=float(os.environ.get("SHED_HOLD_SECONDS", "30")),
+    queue_seconds=float(os.environ.get("SHED_QUEUE_SECONDS", "180")),
+    llm_seconds=float(os.environ.get("SHED_LLM_SECONDS", "20")),
+    rest_pressure=float(os.environ.get("SHED_REST_PRESSURE", "0.8")),
+    max_count=int(os.environ.get("SHED_MAX_COUNT", "200")),
+    lite_model=os.environ.get("SHED_LITE_MODEL") or None,
+    max_tokens=SUMMARY_MAX_TOKENS,
+    lite_max_tokens=int(os.environ.get("SHED_LITE_MAX_TOKENS", "250")),
+)
+
+# /backscroll_server: one sectioned digest of the busiest channels and threads the user can read,
+# fetched and summarized a few at a time inside one scheduler slot and charged as one summary.
+SERVER_DIGEST_MAX_CHANNELS = int(os.environ.get("SERVER_DIGEST_MAX_CHANNELS", "8"))
+SERVER_DIGEST_PER_CHANNEL = int(os.environ.get("SERVER_DIGEST_PER_CHANNEL", "150"))
+SERVER_DIGEST_CONCURRENCY = int(os.environ.get("SERVER_DIGEST_CONCURRENCY", "3"))
+# History pages one digest may request in total, shared across its channels.
+SERVER_DIGEST_MAX_PAGES = int(os.environ.get("SERVER_DIGEST_MAX_PAGES", "24"))
+SERVER_DIGEST_DEFAULT_SINCE = "12h"
 
 CONTROL_GUILDS = [discord.Object(id=782572577260175420), discord.Object(id=912451366839013396)]
 
@@ -71,64 +202,237 @@ def is_privileged(user_id: int) -> bool:
     except Exception:
         return False
 
+# Discord's global REST limit is 50 req/s per bot token; workers each get their shards' share.
+REST_GLOBAL_RATE = float(os.environ.get("REST_GLOBAL_RATE", "45"))
+REST_BULK_MAX_WAIT = float(os.environ.get("REST_BULK_MAX_WAIT", "8"))
+# Above this pressure, streamed replies skip intermediate edits.
+REST_STREAM_PRESSURE = 0.5
+
 intents = discord.Intents.default()
 intents.guilds = True
 intents.message_content = True
-bot = commands.Bot(command_prefix="!", intents=intents)
+if IS_WORKER:
+    _shard_ids = [int(x) for x in os.environ["CLUSTER_SHARD_IDS"].split(",")]
+    _shard_count = int(os.environ["CLUSTER_SHARD_COUNT"])
+    _rate = max(1.0, REST_GLOBAL_RATE * len(_shard_ids) / _shard_count)
+    rest_governor = RestGovernor(_rate, max(5, int(_rate)), bulk_max_wait=REST_BULK_MAX_WAIT)
+    bot = commands.AutoShardedBot(
+        command_prefix="!", intents=intents, shard_ids=_shard_ids, shard_count=_shard_count,
+        http_trace=rest_governor.trace_config(),
+    )
+else:
+    rest_governor = RestGovernor(REST_GLOBAL_RATE, int(REST_GLOBAL_RATE), bulk_max_wait=REST_BULK_MAX_WAIT)
+    bot = commands.Bot(command_prefix="!", intents=intents, http_trace=rest_governor.trace_config())
 
 DB_PATH = "metrics.db"
-_db_lock = threading.Lock()
-
-with sqlite3.connect(DB_PATH) as _conn:
-    _conn.execute("""
-        CREATE TABLE IF NOT EXISTS usage_events (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            guild_id TEXT,
-            guild_name TEXT,
-            command_name TEXT,
-            ts INTEGER
-        )
-    """)
-    _conn.execute("""
-        CREATE TABLE IF NOT EXISTS guild_joins (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            guild_id TEXT,
-            guild_name TEXT,
-            owner_id TEXT,
-            joined_at INTEGER
-        )
-    """)
-
-    for col in ["user_id TEXT", "user_name TEXT", "channel_id TEXT", "channel_name TEXT"]:
-        try:
-            _conn.execute(f"ALTER TABLE usage_events ADD COLUMN {col}")
-        except sqlite3.OperationalError:
-            pass
-
-    _conn.execute("CREATE INDEX IF NOT EXISTS idx_usage_time ON usage_events(ts)")
-    _conn.execute("CREATE INDEX IF NOT EXISTS idx_usage_guild ON usage_events(guild_id)")
-    _conn.execute("CREATE INDEX IF NOT EXISTS idx_usage_user ON usage_events(user_id)")
 
-    _conn.execute("""
-        CREATE TABLE IF NOT EXISTS guild_settings (
-            guild_id TEXT PRIMARY KEY,
-            language TEXT DEFAULT '',
-            update_notice_version TEXT DEFAULT ''
-        )
-    """)
-    _conn.execute("CREATE INDEX IF NOT EXISTS idx_settings_guild ON guild_settings(guild_id)")
-
-    _conn.execute("""
-        CREATE TABLE IF NOT EXISTS user_daily_usage (
-            user_id TEXT NOT NULL,
-            day_key TEXT NOT NULL,
-            used INTEGER NOT NULL DEFAULT 0,
-            PRIMARY KEY (user_id, day_key)
-        )
-    """)
-    _conn.execute("CREATE INDEX IF NOT EXISTS idx_user_daily_day ON user_daily_usage(day_key)")
+ARCHIVE_DB_PATH = "metrics_archive.db"
+RAW_RETENTION_DAYS = int(os.environ.get("RAW_RETENTION_DAYS", "90"))
+HOURLY_RETENTION_DAYS = int(os.environ.get("HOURLY_RETENTION_DAYS", "35"))
+VACUUM_EVERY_DAYS = int(os.environ.get("VACUUM_EVERY_DAYS", "7"))
+# Local hours in which VACUUM may run; it holds the write lock for as long as it takes.
+VACUUM_QUIET_HOURS = digests.parse_hours(os.environ.get("VACUUM_QUIET_HOURS", "3-7"))
+RETENTION_INTERVAL_SECONDS = 86400
+EXPORT_MAX_PARTS = 10
+
+if IS_WORKER:
+    coordinator = cluster.CoordinatorClient(CLUSTER_SOCKET)
+    storage = cluster.RemoteStorage(coordinator)
+    summary_scheduler = cluster.RemoteScheduler(coordinator, MAX_CONCURRENT_SUMMARIES_GLOBAL)
+    quota_gate = cluster.RemoteQuotaGate(coordinator)
+else:
+    coordinator = None
+    storage = Storage(DB_PATH)
+    summary_scheduler = FairScheduler(MAX_CONCURRENT_SUMMARIES_GLOBAL)
+    # Workers queue on the coordinator's scheduler, so the weights only need setting here.
+    for _gid, _weight in SCHEDULER_GUILD_WEIGHTS.items():
+        summary_scheduler.set_weight(_gid, _weight)
+    quota_gate = QuotaGate(quota, storage, MAX_DAILY_PER_GUILD, MAX_DAILY_PER_USER)
+cluster_coordinator: Optional[cluster.Coordinator] = None
+
+GUILD_SETTINGS_CACHE_MAX = int(os.environ.get("GUILD_SETTINGS_CACHE_MAX", "50000"))
+guild_settings = GuildSettingsStore(storage, GUILD_SETTINGS_CACHE_MAX)
+
+LLM_CACHE_TTL_SECONDS = int(os.environ.get("LLM_CACHE_TTL_SECONDS", "86400"))
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "20000"))
+response_cache = LLMCache(storage, LLM_CACHE_TTL_SECONDS, LLM_CACHE_MAX_ENTRIES)
+
+# Digests are collected when nobody is waiting for a summary (daily ones only inside the quiet
+# hours, local time) and summarized through the Batch API on the primary route.
+DIGEST_QUIET_HOURS = digests.parse_hours(os.environ.get("DIGEST_QUIET_HOURS", "3-7"))
+DIGEST_TICK_SECONDS = int(os.environ.get("DIGEST_TICK_SECONDS", "300"))
+DIGEST_MAX_MESSAGES = int(os.environ.get("DIGEST_MAX_MESSAGES", "300"))
+DIGEST_MAX_PER_GUILD = int(os.environ.get("DIGEST_MAX_PER_GUILD", "5"))
+DIGEST_BATCH_MAX = int(os.environ.get("DIGEST_BATCH_MAX", "200"))
+DIGEST_USE_BATCH = os.environ.get("DIGEST_USE_BATCH", "1") == "1"
+DIGEST_MAX_ATTEMPTS = int(os.environ.get("DIGEST_MAX_ATTEMPTS", "4"))
+DIGEST_RETRY_BASE_SECONDS = int(os.environ.get("DIGEST_RETRY_BASE_SECONDS", "600"))
+DIGEST_RETRY_MAX_SECONDS = int(os.environ.get("DIGEST_RETRY_MAX_SECONDS", "21600"))
+# Digests summarized live share this one scheduler queue, so together they get no more than a
+# single guild's turn (guild ids are never 0).
+DIGEST_QUEUE_ID = 0
+# Batches belong to the process that submitted them; a worker is identified by its shard range.
+DIGEST_OWNER = os.environ.get("CLUSTER_SHARD_IDS", "main")
+digest_store = DigestStore(storage, DIGEST_MAX_ATTEMPTS, DIGEST_RETRY_BASE_SECONDS, DIGEST_RETRY_MAX_SECONDS)
+digest_batches = BatchClient(llm_router.routes[0])
+
+# Usage events and guild joins as JSON lines, written off the event loop. Each worker keeps its
+# own file so rotation never races another process.
+EVENT_LOG_PATH = os.environ.get("EVENT_LOG_PATH", "events.jsonl")
+if IS_WORKER:
+    _root, _ext = os.path.splitext(EVENT_LOG_PATH)
+    EVENT_LOG_PATH = f"{_root}.{_shard_ids[0]}{_ext}"
+event_log = EventLog(
+    EVENT_LOG_PATH,
+    max_bytes=int(os.environ.get("EVENT_LOG_MAX_MB", "50")) * 2 ** 20,
+    rotate_seconds=int(os.environ.get("EVENT_LOG_ROTATE_SECONDS", "86400")),
+    backups=int(os.environ.get("EVENT_LOG_BACKUPS", "14")),
+    compress=os.environ.get("EVENT_LOG_COMPRESS", "1") == "1",
+    max_queue=int(os.environ.get("EVENT_LOG_MAX_QUEUE", "10000")),
+)
+
+registry = metrics.Registry()
+STAGE_SECONDS = registry.histogram("backscroll_stage_seconds", "Time spent in each summary pipeline stage.", ("stage",))
+STAGE_INFLIGHT = registry.gauge("backscroll_stage_inflight", "Requests currently inside each pipeline stage.", ("stage",))
+COMMAND_SECONDS = registry.histogram("backscroll_command_seconds", "End-to-end command latency.", ("command",))
+COMMANDS = registry.counter("backscroll_commands_total", "Summary commands by outcome.", ("command", "outcome"))
+LLM_SECONDS = registry.histogram("backscroll_llm_request_seconds", "Latency of single LLM requests.", ("mode",))
+LLM_TOKENS = registry.counter("backscroll_llm_tokens_total", "LLM tokens used.", ("type",))
+LLM_ERRORS = registry.counter("backscroll_llm_errors_total", "Failed LLM requests by error type.", ("error",))
+registry.counter_fn("backscroll_llm_cache_lookups_total", "LLM response cache lookups by result.",
+                    lambda: {("hit",): response_cache.hits, ("miss",): response_cache.misses}, ("result",))
+registry.counter_fn("backscroll_llm_cache_tokens_saved_total", "LLM tokens not spent thanks to cached responses.",
+                    lambda: response_cache.tokens_saved)
+registry.counter_fn("backscroll_llm_attempts_total", "LLM attempts by route and result.",
+                    lambda: {(r.name, k): v for r in llm_router.routes for k, v in r.results.items()},
+                    ("route", "result"))
+registry.gauge_fn("backscroll_llm_route_open", "1 while a route's circuit breaker is open.",
+                  lambda: {(r.name,): int(r.breaker.state == "open") for r in llm_router.routes}, ("route",))
+registry.counter_fn("backscroll_llm_hedges_total", "Hedged LLM attempts started, and how many won.",
+                    lambda: {("started",): llm_router.hedges, ("won",): llm_router.hedge_wins}, ("result",))
+registry.counter_fn("backscroll_llm_retries_total", "LLM attempts retried after a retryable failure.",
+                    lambda: llm_router.retries)
+registry.counter_fn("backscroll_compaction_chars_total", "Transcript characters before and after compaction.",
+                    lambda: {(k,): compaction_totals[f"chars_{k}"] for k in ("before", "after")}, ("stage",))
+registry.counter_fn("backscroll_compaction_tokens_total", "Estimated transcript tokens before and after compaction.",
+                    lambda: {(k,): compaction_totals[f"tokens_{k}"] for k in ("before", "after")}, ("stage",))
+registry.counter_fn("backscroll_compaction_lines_dropped_total", "Transcript lines dropped to fit the token budget.",
+                    lambda: compaction_totals["lines_dropped"])
+DIGESTS = registry.counter("backscroll_digests_total", "Channel digests by outcome.", ("outcome",))
+registry.gauge_fn("backscroll_shed_level", "Load shedding level (0 normal .. 4 rejecting).", lambda: admission.level)
+registry.gauge_fn("backscroll_shed_load", "Load score per signal and overall (1 = first shedding threshold scale).",
+                  lambda: {**{(k,): v for k, v in admission.signals.items()}, ("overall",): admission.load}, ("signal",))
+registry.counter_fn("backscroll_shed_decisions_total",
+                    "Requests degraded or rejected by the admission controller, by action.",
+                    lambda: {(k,): v for k, v in admission.decisions.items()}, ("action",))
+registry.counter_fn("backscroll_shed_transitions_total", "Load shedding level changes.", lambda: admission.transitions)
+registry.gauge_fn("backscroll_startup_seconds", "Time spent in each startup step.",
+                  lambda: {(k,): v for k, v in startup_timings.items()}, ("step",))
+registry.gauge_fn("backscroll_scheduler_running", "Summaries holding a scheduler slot.", lambda: summary_scheduler.running)
+registry.gauge_fn("backscroll_scheduler_queued", "Summaries waiting for a scheduler slot.", lambda: summary_scheduler.queued)
+registry.gauge_fn("backscroll_scheduler_capacity", "Scheduler concurrency limit.", lambda: summary_scheduler.concurrency)
+registry.gauge_fn("backscroll_coalesce_inflight", "Distinct summaries being produced.", lambda: len(summary_flights))
+registry.counter_fn("backscroll_coalesce_requests_total",
+                    "Summary requests that did the work (leader) or shared another's (follower).",
+                    lambda: {("leader",): summary_flights.leaders, ("follower",): summary_flights.followers},
+                    ("role",))
+registry.counter_fn("backscroll_coalesce_handoffs_total", "Followers that took over after their leader was cancelled.",
+                    lambda: summary_flights.handoffs)
+registry.gauge_fn("backscroll_storage_pending_writes", "Writes queued for the storage thread.", lambda: storage.pending())
+registry.counter_fn("backscroll_storage_write_errors_total", "Writes that failed on the storage thread.",
+                    lambda: storage.write_errors)
+registry.counter_fn("backscroll_event_log_events_total", "Event log records by result.",
+                    lambda: {("written",): event_log.written, ("dropped",): event_log.dropped,
+                             ("failed",): event_log.write_errors}, ("result",))
+registry.gauge_fn("backscroll_event_log_pending", "Event log records waiting to be written.", lambda: event_log.pending())
+registry.gauge_fn("backscroll_message_cache_bytes", "Approximate message cache size.", lambda: message_cache.bytes_used)
+registry.gauge_fn("backscroll_rest_budget_tokens", "Discord REST requests available right now.",
+                  lambda: rest_governor.tokens)
+registry.gauge_fn("backscroll_rest_pressure", "Discord REST budget pressure (0 idle, 1 exhausted).",
+                  lambda: rest_governor.pressure())
+registry.counter_fn("backscroll_rest_requests_total", "Discord REST requests admitted by priority.",
+                    lambda: {(n,): rest_governor.requests[i] for i, n in enumerate(PRIORITY_NAMES)},
+                    ("priority",))
+registry.counter_fn("backscroll_rest_shed_total", "History page requests shed for lack of REST budget.",
+                    lambda: rest_governor.shed)
+registry.counter_fn("backscroll_rest_global_429s_total", "Global 429 responses from Discord.",
+                    lambda: rest_governor.global_429s)
+registry.gauge_fn("backscroll_gateway_latency_seconds", "Discord gateway heartbeat latency.",
+                  lambda: bot.latency if math.isfinite(bot.latency) else -1)
+
+def _stage(name: str):
+    return STAGE_SECONDS.time(name, inflight=STAGE_INFLIGHT)
+
+HEALTH_MAX_QUEUE = int(os.environ.get("HEALTH_MAX_QUEUE", "50"))
+
+def _health():
+    if cluster_coordinator is not None:
+        return cluster_coordinator.healthy(), {
+            "role": "coordinator",
+            "workers": {i: p.returncode is None for i, p in cluster_coordinator.workers.items()},
+            "queued": summary_scheduler.queued,
+            "running": summary_scheduler.running,
+            "version": BOT_VERSION,
+        }
+    latency = bot.latency
+    connected = bot.is_ready() and not bot.is_closed() and math.isfinite(latency)
+    try:
+        queued = summary_scheduler.queued
+    except RuntimeError:
+        queued = 0
+    detail = {
+        "gateway": "connected" if connected else "disconnected",
+        "latency": round(latency, 3) if math.isfinite(latency) else None,
+        "queued": queued,
+        "running": summary_scheduler.running,
+        "version": BOT_VERSION,
+    }
+    return connected and queued < HEALTH_MAX_QUEUE, detail
+
+metrics_server = None
+
+# Import, create_app() and setup_hook() together; over budget only logs a warning.
+STARTUP_BUDGET_SECONDS = float(os.environ.get("STARTUP_BUDGET_SECONDS", "3"))
+startup_timings: Dict[str, float] = {}
+
+@contextmanager
+def _startup_step(name: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_timings[name] = round(time.perf_counter() - t0, 4)
+
+def _report_startup():
+    total = round(sum(v for k, v in startup_timings.items() if k != "total"), 4)
+    startup_timings["total"] = total
+    steps = ", ".join(f"{k} {v * 1000:.0f}ms" for k, v in startup_timings.items() if k != "total")
+    flag = "⚠️ over budget" if total > STARTUP_BUDGET_SECONDS else "🚀"
+    print(f"{flag} Startup {total * 1000:.0f}ms (budget {STARTUP_BUDGET_SECONDS * 1000:.0f}ms): {steps}")
+
+def create_app(serve_metrics: bool = True) -> commands.Bot:
+    # Everything with a side effect happens here rather than at import: checking the
+    # configuration, starting the storage and event log threads, migrating metrics.db and
+    # serving /metrics.
+    global metrics_server
+    if not DISCORD_TOKEN or not OPENAI_API_KEY:
+        raise SystemExit("❌ Missing DISCORD_TOKEN or OPENAI_API_KEY in environment or .env file.")
+
+    # Workers reach the database through the coordinator only.
+    if not IS_WORKER:
+        with _startup_step("storage"):
+            storage.start()
+        with _startup_step("migrations"):
+            applied = storage.submit_call(migrations.migrate).result()
+        if applied:
+            print(f"🗃️ Applied schema migrations {applied} (now at v{migrations.LATEST})")
+    event_log.start()
+
+    if serve_metrics and metrics_server is None:
+        with _startup_step("metrics_server"):
+            metrics_server = metrics.serve("0.0.0.0", int(os.environ.get("PORT", "10000")), registry, _health)
+    return bot
 
-PLAIN_LOG_PATH = "usage.txt"
 
 def _now() -> int:
     return int(time.time())
@@ -136,98 +440,59 @@ def _now() -> int:
 def _day_key_now() -> str:
     return datetime.now(LOCAL_TZ).strftime("%Y-%m-%d")
 
-def _append_plain_log(line: str):
-    try:
-        with open(PLAIN_LOG_PATH, "a", encoding="utf-8") as f:
-            f.write(line.rstrip() + "\n")
-    except Exception:
-        pass
-
 def log_usage_inter(inter: discord.Interaction, command_name: str):
     if inter.guild is None or inter.channel is None:
         return
     ts = _now()
-    with _db_lock, sqlite3.connect(DB_PATH) as conn:
-        conn.execute("""
-            INSERT INTO usage_events
-            (guild_id, guild_name, command_name, ts, user_id, user_name, channel_id, channel_name)
-            VALUES (?,?,?,?,?,?,?,?)
-        """, (
-            str(inter.guild.id), inter.guild.name, command_name, ts,
-            str(inter.user.id), inter.user.display_name,
-            str(inter.channel.id), getattr(inter.channel, "name", "DM")
-        ))
-        conn.commit()
-    _append_plain_log(
-        f"[{ts}] {inter.guild.name} ({inter.guild_id}) "
-        f"#{getattr(inter.channel,'name','DM')} | {command_name} by {inter.user.display_name} ({inter.user.id})"
+    storage.write("""
+        INSERT INTO usage_events
+        (guild_id, guild_name, command_name, ts, user_id, user_name, channel_id, channel_name)
+        VALUES (?,?,?,?,?,?,?,?)
+    """, (
+        str(inter.guild.id), inter.guild.name, command_name, ts,
+        str(inter.user.id), inter.user.display_name,
+        str(inter.channel.id), getattr(inter.channel, "name", "DM")
+    ))
+    event_log.emit(
+        "command", command=command_name,
+        guild_id=str(inter.guild.id), guild_name=inter.guild.name,
+        channel_id=str(inter.channel.id), channel_name=getattr(inter.channel, "name", "DM"),
+        user_id=str(inter.user.id), user_name=inter.user.display_name,
     )
 
 def log_guild_join(guild: discord.Guild):
     ts = _now()
-    with _db_lock, sqlite3.connect(DB_PATH) as conn:
-        conn.execute(
-            "INSERT INTO guild_joins (guild_id,guild_name,owner_id,joined_at) VALUES (?,?,?,?)",
-            (str(guild.id), guild.name, str(guild.owner_id), ts)
-        )
-        conn.commit()
-    _append_plain_log(f"[{ts}] Joined guild: {guild.name} ({guild.id}) owner={guild.owner_id}")
+    storage.write(
+        "INSERT INTO guild_joins (guild_id,guild_name,owner_id,joined_at) VALUES (?,?,?,?)",
+        (str(guild.id), guild.name, str(guild.owner_id), ts)
+    )
+    event_log.emit("guild_join", guild_id=str(guild.id), guild_name=guild.name, owner_id=str(guild.owner_id))
 
 def is_admin(inter: discord.Interaction) -> bool:
     return inter.user.id == ADMIN_ID
 
-def _ensure_guild_settings_row(guild_id: int):
-    with _db_lock, sqlite3.connect(DB_PATH) as conn:
-        conn.execute("INSERT OR IGNORE INTO guild_settings (guild_id) VALUES (?)", (str(guild_id),))
-        conn.commit()
-
-def get_guild_language(guild_id: int) -> str:
-    _ensure_guild_settings_row(guild_id)
-    with _db_lock, sqlite3.connect(DB_PATH) as conn:
-        row = conn.execute(
-            "SELECT language FROM guild_settings WHERE guild_id = ?",
-            (str(guild_id),)
-        ).fetchone()
-    return (row[0] or "").strip()
-
-def set_guild_language(guild_id: int, lang: str):
-    _ensure_guild_settings_row(guild_id)
-    with _db_lock, sqlite3.connect(DB_PATH) as conn:
-        conn.execute(
-            "UPDATE guild_settings SET language = ? WHERE guild_id = ?",
-            (lang.strip(), str(guild_id))
-        )
-        conn.commit()
-
-def reset_guild_language(guild_id: int):
-    set_guild_language(guild_id, "")
-
-def _has_seen_update_notice(guild_id: int) -> bool:
-    _ensure_guild_settings_row(guild_id)
-    with _db_lock, sqlite3.connect(DB_PATH) as conn:
-        row = conn.execute(
-            "SELECT update_notice_version FROM guild_settings WHERE guild_id = ?",
-            (str(guild_id),)
-        ).fetchone()
-    seen_ver = (row[0] or "").strip()
-    return seen_ver == BOT_VERSION
-
-def _mark_update_notice_seen(guild_id: int):
-    _ensure_guild_settings_row(guild_id)
-    with _db_lock, sqlite3.connect(DB_PATH) as conn:
-        conn.execute(
-            "UPDATE guild_settings SET update_notice_version = ? WHERE guild_id = ?",
-            (BOT_VERSION, str(guild_id))
-        )
-        conn.commit()
+async def get_guild_language(guild_id: int) -> str:
+    return (await guild_settings.get(guild_id)).language
+
+async def set_guild_language(guild_id: int, lang: str):
+    await guild_settings.set_language(guild_id, lang)
+
+async def reset_guild_language(guild_id: int):
+    await set_guild_language(guild_id, "")
+
+async def _has_seen_update_notice(guild_id: int) -> bool:
+    return (await guild_settings.get(guild_id)).update_notice_version == BOT_VERSION
+
+async def _mark_update_notice_seen(guild_id: int):
+    await guild_settings.set_update_notice_version(guild_id, BOT_VERSION)
 
 async def maybe_send_update_notice(inter: discord.Interaction):
     if inter.guild is None:
         return
-    if _has_seen_update_notice(inter.guild.id):
+    if await _has_seen_update_notice(inter.guild.id):
         return
 
-    _mark_update_notice_seen(inter.guild.id)
+    await _mark_update_notice_seen(inter.guild.id)
 
     msg = (
         "**Backscroll Update**\n"
@@ -252,86 +517,162 @@ async def maybe_send_update_notice(inter: discord.Interaction):
     except Exception:
         pass
 
-def _get_user_daily_used(user_id: int, day_key: str) -> int:
-    with _db_lock, sqlite3.connect(DB_PATH) as conn:
-        row = conn.execute(
-            "SELECT used FROM user_daily_usage WHERE user_id = ? AND day_key = ?",
-            (str(user_id), day_key)
-        ).fetchone()
-    return int(row[0]) if row else 0
-
-def _inc_user_daily_used(user_id: int, day_key: str, delta: int = 1):
-    with _db_lock, sqlite3.connect(DB_PATH) as conn:
-        conn.execute(
-            "INSERT OR IGNORE INTO user_daily_usage (user_id, day_key, used) VALUES (?,?,0)",
-            (str(user_id), day_key)
-        )
-        conn.execute(
-            "UPDATE user_daily_usage SET used = used + ? WHERE user_id = ? AND day_key = ?",
-            (int(delta), str(user_id), day_key)
-        )
-        conn.commit()
-
-_user_last_used: defaultdict[int, float] = defaultdict(float)
-
-def _cooldown_remaining(user_id: int) -> int:
-    last = _user_last_used[user_id]
-    rem = COOLDOWN_SECONDS - int(_now() - last)
-    return rem if rem > 0 else 0
-
-def _bump_cooldown(user_id: int):
-    _user_last_used[user_id] = _now()
+async def _load_quota_state():
+    now = _now()
+    events = await storage.read(f"""
+        SELECT guild_id, ts FROM usage_events
+        WHERE ts > ? AND command_name IN ({",".join("?" * len(QUOTA_COMMANDS))})
+    """, (now - QUOTA_GUILD_WINDOW_SECONDS, *QUOTA_COMMANDS))
+    quota.load_guild_events(events)
+    quota.load_user_days(await storage.read(
+        "SELECT user_id, day_key, used FROM user_daily_usage WHERE day_key = ?", (_day_key_now(),)
+    ))
+    quota.load_cooldowns(await storage.read(
+        "SELECT user_id, last_used FROM user_cooldowns WHERE last_used > ?", (now - COOLDOWN_SECONDS,)
+    ))
+    print(f"✅ Quota state loaded: {quota.stats()}")
+
+def _checkpoint_quota():
+    now = _now()
+    quota.purge(now, _day_key_now())
+    for user_id, last_used in quota.take_dirty_cooldowns():
+        storage.write("""
+            INSERT INTO user_cooldowns (user_id, last_used) VALUES (?,?)
+            ON CONFLICT(user_id) DO UPDATE SET last_used = MAX(last_used, excluded.last_used)
+        """, (user_id, last_used))
+    storage.write("DELETE FROM user_cooldowns WHERE last_used <= ?", (now - COOLDOWN_SECONDS,))
+
+async def _quota_checkpoint_loop():
+    while True:
+        await asyncio.sleep(QUOTA_CHECKPOINT_SECONDS)
+        try:
+            _checkpoint_quota()
+        except Exception as e:
+            print(f"⚠️ quota checkpoint failed: {e}")
+
+async def _run_retention() -> dict:
+    now = _now()
+    cutoff = now - RAW_RETENTION_DAYS * 86400
+    archived = 0
+    while True:
+        moved = await storage.call(lambda conn: maintenance.archive_batch(conn, cutoff, ARCHIVE_DB_PATH))
+        archived += moved
+        if not moved:
+            break
+    out = await storage.call(lambda conn: maintenance.finish_retention(conn, now, HOURLY_RETENTION_DAYS))
+    out["archived"] = archived
+    return out
 
-def _guild_usage_24h(guild_id: int) -> int:
-    since = _now() - 86400
-    with _db_lock, sqlite3.connect(DB_PATH) as conn:
-        c1 = conn.execute("""
-            SELECT COUNT(*) FROM usage_events
-            WHERE guild_id = ? AND ts > ? AND command_name IN ('backscroll','backscroll_private')
-        """, (str(guild_id), since)).fetchone()[0]
-    return int(c1 or 0)
+async def _maintenance_loop():
+    # Nothing runs in the first interval after boot, when startup traffic is at its peak.
+    started = _now()
+    while True:
+        await asyncio.sleep(3600)
+        now = _now()
+        try:
+            last = await storage.read_one("SELECT last_run FROM maintenance_state WHERE name = 'retention'")
+            if now - max(last[0] if last else 0, started) >= RETENTION_INTERVAL_SECONDS:
+                out = await _run_retention()
+                print(f"🧹 Retention: {out}")
+            last = await storage.read_one("SELECT last_run FROM maintenance_state WHERE name = 'vacuum'")
+            if (now - max(last[0] if last else 0, started) >= VACUUM_EVERY_DAYS * 86400
+                    and digests.in_window(now, VACUUM_QUIET_HOURS, LOCAL_TZ)):
+                await asyncio.to_thread(maintenance.vacuum, DB_PATH, now)
+                print("🧹 Vacuumed metrics.db")
+        except Exception as e:
+            print(f"⚠️ retention failed: {e}")
+
+def _rollup_edge(since: int) -> int:
+    # Whole hours at or after the edge come from usage_hourly; the partial hour before it from raw rows.
+    return since - since % 3600 + 3600
 
 async def _preflight_checks(inter: discord.Interaction) -> Optional[str]:
     if inter.guild is None:
         return "❌ This command must be used in a server channel."
 
-    rem = _cooldown_remaining(inter.user.id)
-    if rem > 0:
-        return f"⏳ Cooldown: please wait **{rem}s** before using this again."
-
-    used_guild = _guild_usage_24h(inter.guild.id)
-    if used_guild >= MAX_DAILY_PER_GUILD:
+    # Admission also starts the user's cooldown.
+    verdict, value = await quota_gate.admit(inter.guild.id, inter.user.id, not is_privileged(inter.user.id),
+                                            _now(), _day_key_now())
+    if verdict == "cooldown":
+        return f"⏳ Cooldown: please wait **{value}s** before using this again."
+    if verdict == "guild":
         return (
-            f"🚫 This server reached its 24-hour limit of **{MAX_DAILY_PER_GUILD}** summaries. "
+            f"🚫 This server reached its 24-hour limit of **{value}** summaries. "
             f"Try again later or contact support: {SUPPORT_LINK}"
         )
-
-    if not is_privileged(inter.user.id):
-        day_key = _day_key_now()
-        used_user = _get_user_daily_used(inter.user.id, day_key)
-        if used_user >= MAX_DAILY_PER_USER:
-            return f"🚫 Daily limit reached (**{MAX_DAILY_PER_USER}/day**). Support: {SUPPORT_LINK}"
-
+    if verdict == "user":
+        return f"🚫 Daily limit reached (**{value}/day**). Support: {SUPPORT_LINK}"
     return None
 
-async def fetch_messages(channel: discord.TextChannel, limit: int) -> List[discord.Message]:
-    out: List[discord.Message] = []
-    async for m in channel.history(limit=limit, oldest_first=False):
-        if m.author.bot:
-            continue
-        if not (m.content and m.content.strip()):
-            continue
-        out.append(m)
-    out.sort(key=lambda m: m.created_at)
-    return out
-
-def format_messages(msgs: List[discord.Message]) -> str:
-    lines = []
-    for m in msgs:
-        safe = m.content.replace("\n", " ").replace("\r", " ").strip()
-        name = m.author.display_name
-        lines.append(f"{name}: {safe}")
-    return "\n".join(lines)
+def _is_summarizable(m: discord.Message) -> bool:
+    return not m.author.bot and bool(m.content and m.content.strip())
+
+async def fetch_messages(channel: discord.TextChannel, limit: int,
+                         after_id: Optional[int] = None, max_scan: Optional[int] = None) -> List[CachedMessage]:
+    # Newest `limit` human messages, oldest first; with after_id, only messages newer than it.
+    # Bots and empty messages don't count, so REST keeps paging until `limit` real ones are
+    # found or MAX_SCAN_MESSAGES (or max_scan) raw messages have been read.
+    if after_id is None:
+        cached = message_cache.recent(channel.id, limit)
+        if len(cached) >= limit:
+            return cached
+    else:
+        cached = message_cache.after(channel.id, after_id, limit)
+        if len(cached) >= limit or message_cache.covers(channel.id, after_id):
+            return cached
+
+    # Only page REST for the part of the history older than what the gateway gave us, and no
+    # more pages than the bulk share of the REST budget allows right now.
+    want = limit - len(cached)
+    scan = max(want, MAX_SCAN_MESSAGES) if max_scan is None else max_scan
+    pages = rest_governor.bulk_pages_available()
+    if pages * 100 < scan:
+        scan = max(1, pages) * 100
+        print(f"⚠️ REST budget low: scanning at most {scan} older messages in #{channel.name}")
+
+    before = discord.Object(id=cached[0].id) if cached else None
+    # Newest first with an `after` bound: paging stops at the first page that crosses it.
+    after = discord.Object(id=after_id) if after_id is not None else None
+    older: List[CachedMessage] = []
+    try:
+        async for m in channel.history(limit=scan, before=before, after=after, oldest_first=False):
+            if _is_summarizable(m):
+                older.append(CachedMessage.from_message(m))
+                if len(older) >= want:
+                    break  # discord.py fetches lazily, so no further page is requested
+    except RestBudgetExceeded:
+        if not older and not cached:
+            raise
+    older.sort(key=lambda m: m.id)
+    return older + cached
+
+SINCE_ME_WORDS = ("me", "mine", "last", "my-last-message", "since-my-last-message")
+SINCE_ME_SCAN_LIMIT = 1000
+
+def _parse_since(since: str, now: int) -> Optional[int]:
+    # None for "since my last message", else the window start as a unix time. Windows reaching
+    # back past Discord's epoch are clamped to it, which also keeps `99999999d` in datetime's range.
+    if since.strip().lower() in SINCE_ME_WORDS:
+        return None
+    try:
+        ts = parse_when(since, now, LOCAL_TZ)
+    except OverflowError:
+        raise ValueError(since)
+    if ts >= now:
+        raise ValueError(since)
+    return max(ts, discord.utils.DISCORD_EPOCH // 1000)
+
+def _snowflake_at(ts: int) -> int:
+    return discord.utils.time_snowflake(datetime.fromtimestamp(ts, timezone.utc))
+
+async def _last_message_by(channel: discord.TextChannel, user_id: int) -> Optional[int]:
+    found = message_cache.last_by_author(channel.id, user_id)
+    if found is not None:
+        return found
+    async for m in channel.history(limit=SINCE_ME_SCAN_LIMIT, oldest_first=False):
+        if m.author.id == user_id:
+            return m.id
+    return None
 
 LANG_ALIASES = {
     "english": "English",
@@ -357,15 +698,53 @@ LANG_ALIASES = {
     "türkçe": "Turkish",
 }
 
+MAP_REDUCE_THRESHOLD_TOKENS = int(os.environ.get("MAP_REDUCE_THRESHOLD_TOKENS", "6000"))
+MAP_CHUNK_TOKENS = int(os.environ.get("MAP_CHUNK_TOKENS", "3000"))
+MAP_CONCURRENCY = int(os.environ.get("MAP_CONCURRENCY", "4"))
+PROMPT_TOKEN_BUDGET = int(os.environ.get("PROMPT_TOKEN_BUDGET", "24000"))
+
+compaction_totals = {"calls": 0, "chars_before": 0, "chars_after": 0, "tokens_before": 0, "tokens_after": 0,
+                     "lines_dropped": 0}
+
+def _prepare_transcript(msgs: List[CachedMessage]) -> str:
+    with _stage("format"):
+        res = compact_transcript([(m.author_id, m.author_name, m.content) for m in msgs], PROMPT_TOKEN_BUDGET)
+    compaction_totals["calls"] += 1
+    compaction_totals["chars_before"] += res.chars_before
+    compaction_totals["chars_after"] += res.chars_after
+    compaction_totals["tokens_before"] += res.tokens_before
+    compaction_totals["tokens_after"] += res.tokens_after
+    compaction_totals["lines_dropped"] += res.dropped
+    return res.text
+
+def _split_transcript(formatted_msgs: str, budget: int) -> List[str]:
+    chunks: List[str] = []
+    cur: List[str] = []
+    cur_tokens = 0
+    for line in formatted_msgs.split("\n"):
+        t = estimate_tokens(line)
+        if t > budget:
+            line = line[: budget * 2]
+            t = estimate_tokens(line)
+        if cur and cur_tokens + t > budget:
+            chunks.append("\n".join(cur))
+            cur, cur_tokens = [], 0
+        cur.append(line)
+        cur_tokens += t
+    if cur:
+        chunks.append("\n".join(cur))
+    return chunks
+
 def normalize_language(inp: str) -> str:
     if not inp:
         return ""
     key = inp.strip().lower()
     return LANG_ALIASES.get(key, inp.strip().title())
 
-async def summarize_with_ai(formatted_msgs: str, include_topics: bool, language: str) -> str:
-    lang = (language or "").strip() or "English"
+ProgressCallback = Callable[[str], None]
 
+def _summary_prompt(include_topics: bool, lang: str, previous: str = "") -> List[dict]:
+    # Everything but the transcript itself, which the caller appends.
     core_rules = f"""
 Language:
 - Write natively in {lang}.
@@ -412,18 +791,206 @@ Output only:
 <paragraph here>
 """
 
-    resp = await asyncio.to_thread(
-        client.chat.completions.create,
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": "You are a helpful assistant that summarizes Discord chats."},
-            {"role": "user", "content": core_rules},
-            {"role": "user", "content": f"Messages:\n{formatted_msgs}"},
-        ],
-        temperature=0.3,
-        max_tokens=400,
-    )
-    return resp.choices[0].message.content.strip()
+    messages = [
+        {"role": "system", "content": "You are a helpful assistant that summarizes Discord chats."},
+        {"role": "user", "content": core_rules},
+    ]
+    if previous:
+        messages.append({"role": "user", "content": (
+            "Here is a summary of the earlier part of this chat:\n\n"
+            f"{previous}\n\n"
+            "Update it so it also covers the newer messages below. "
+            "Keep the same rules, length and format; give the newer messages their fair weight."
+        )})
+    return messages
+
+async def summarize_with_ai(formatted_msgs: str, include_topics: bool, language: str, previous: str = "",
+                            on_progress: Optional[ProgressCallback] = None, guild_id: int = 0,
+                            model: Optional[str] = None, max_tokens: int = SUMMARY_MAX_TOKENS) -> str:
+    lang = (language or "").strip() or "English"
+    messages = _summary_prompt(include_topics, lang, previous)
+
+    if estimate_tokens(formatted_msgs) > MAP_REDUCE_THRESHOLD_TOKENS:
+        notes = await _map_transcript(formatted_msgs, lang, guild_id, model)
+        messages.append({"role": "user", "content": f"Notes on consecutive parts of the chat, oldest first:\n\n{notes}"})
+    else:
+        messages.append({"role": "user", "content": f"Messages:\n{formatted_msgs}"})
+
+    return await _chat_completion(messages, max_tokens=max_tokens, on_delta=on_progress, guild_id=guild_id,
+                                  model=model)
+
+def _record_usage(usage) -> int:
+    if usage is None:
+        return 0
+    LLM_TOKENS.inc("prompt", n=usage.prompt_tokens or 0)
+    LLM_TOKENS.inc("completion", n=usage.completion_tokens or 0)
+    return (usage.prompt_tokens or 0) + (usage.completion_tokens or 0)
+
+async def _chat_completion(messages: List[dict], max_tokens: int,
+                           on_delta: Optional[ProgressCallback] = None, guild_id: int = 0,
+                           model: Optional[str] = None) -> str:
+    # Same model, parameters and prompt give the same answer: serve it from the cache.
+    key = cache_key(model or LLM_MODEL, messages, temperature=0.3, max_tokens=max_tokens)
+    cached = await response_cache.get(key)
+    if cached is not None:
+        if on_delta is not None:
+            on_delta(cached)
+        return cached
+
+    text, tokens, answered_by = await _complete(messages, max_tokens, on_delta, model)
+    if answered_by != (model or LLM_MODEL):
+        # A fallback route answered with its own model; file the answer under that model.
+        key = cache_key(answered_by, messages, temperature=0.3, max_tokens=max_tokens)
+    response_cache.put(key, guild_id, text, tokens)
+    return text
+
+async def _complete(messages: List[dict], max_tokens: int, on_delta: Optional[ProgressCallback],
+                    model: Optional[str] = None) -> Tuple[str, int, str]:
+    # Returns (text, tokens, model that answered).
+    mode = "plain" if on_delta is None else "stream"
+
+    async def attempt(route: Route, claim: Callable[[], bool]) -> Tuple[str, int, str]:
+        # One try on one route; the router may run a hedge of it concurrently. A model
+        # override is served by the primary endpoint only; fallbacks keep their own model.
+        name = model if model and route is llm_router.routes[0] else route.model
+        try:
+            with LLM_SECONDS.time(mode):
+                if on_delta is None:
+                    resp = await route.client.chat.completions.create(
+                        model=name,
+                        messages=messages,
+                        temperature=0.3,
+                        max_tokens=max_tokens,
+                    )
+                    tokens = _record_usage(resp.usage)
+                    return resp.choices[0].message.content.strip(), tokens, name
+
+                stream = await route.client.chat.completions.create(
+                    model=name,
+                    messages=messages,
+                    temperature=0.3,
+                    max_tokens=max_tokens,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                )
+                text = ""
+                tokens = 0
+                async with stream:
+                    async for chunk in stream:
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            text += chunk.choices[0].delta.content
+                            # The first attempt to produce text owns the reply; a losing hedge is cancelled.
+                            if claim():
+                                on_delta(text)
+                        if chunk.usage:
+                            tokens = _record_usage(chunk.usage)
+                return text.strip(), tokens, name
+        except Exception as e:
+            LLM_ERRORS.inc(type(e).__name__)
+            raise
+
+    return await llm_router.run(attempt, mode)
+
+async def _map_transcript(formatted_msgs: str, lang: str, guild_id: int = 0, model: Optional[str] = None) -> str:
+    # Map step of the chunked mode: condense each part into notes, then let the normal
+    # summary prompt reduce the notes. Repeats if the notes are still too long.
+    sem = asyncio.Semaphore(MAP_CONCURRENCY)
+    text = formatted_msgs
+
+    async def _notes(chunk: str) -> str:
+        async with sem:
+            return await _chat_completion([
+                {"role": "system", "content": "You take notes on Discord chats for a later summary."},
+                {"role": "user", "content": (
+                    f"Write short factual notes in {lang} on this part of a Discord chat: who said or asked what, "
+                    "decisions, links or plans mentioned. No commentary on tone or structure.\n\n"
+                    f"Messages:\n{chunk}"
+                )},
+            ], max_tokens=300, guild_id=guild_id, model=model)
+
+    while True:
+        chunks = _split_transcript(text, MAP_CHUNK_TOKENS)
+        notes = await asyncio.gather(*[_notes(c) for c in chunks])
+        text = "\n\n".join(notes)
+        if len(chunks) == 1 or estimate_tokens(text) <= MAP_REDUCE_THRESHOLD_TOKENS:
+            return text
+
+async def summarize_messages(guild_id: int, channel_id: int, msgs: List[CachedMessage],
+                             include_topics: bool, language: str,
+                             on_progress: Optional[ProgressCallback] = None,
+                             model: Optional[str] = None, max_tokens: int = SUMMARY_MAX_TOKENS) -> str:
+    ids = [m.id for m in msgs]
+    prior = summary_store.find(guild_id, channel_id, ids, language, include_topics)
+
+    if prior is None:
+        transcript = _prepare_transcript(msgs)
+        with _stage("llm"):
+            summary = await summarize_with_ai(transcript, include_topics, language, on_progress=on_progress,
+                                              guild_id=guild_id, model=model, max_tokens=max_tokens)
+    else:
+        tail = [m for m in msgs if m.id > prior.last_id]
+        if not tail:
+            summary = prior.summary
+        else:
+            transcript = _prepare_transcript(tail)
+            with _stage("llm"):
+                summary = await summarize_with_ai(transcript, include_topics, language,
+                                                  previous=prior.summary, on_progress=on_progress,
+                                                  guild_id=guild_id, model=model, max_tokens=max_tokens)
+
+    # A summary cut down under load isn't worth extending later.
+    if model is None and max_tokens == SUMMARY_MAX_TOKENS:
+        summary_store.put(guild_id, channel_id, ids[0], ids[-1], language, include_topics, len(msgs), summary)
+    return summary
+
+class _StreamedReply:
+    # Shows a summary as it is generated by editing one message on a fixed cadence.
+    def __init__(self, edit: Callable[[str], Awaitable[object]], header: str):
+        self._edit = edit
+        self.header = header
+        self._text = ""
+        self._shown = ""
+        self._edits = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def _render(self, text: str, partial: bool) -> str:
+        out = f"{self.header}\n\n{text}"
+        if partial:
+            out = out[:1990] + " ▌"
+        return out[:2000]
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def update(self, text: str):
+        self._text = text
+
+    async def _run(self):
+        while self._edits < STREAM_MAX_EDITS:
+            await asyncio.sleep(STREAM_EDIT_INTERVAL)
+            if not self._text or self._text == self._shown:
+                continue
+            if rest_governor.pressure() > REST_STREAM_PRESSURE:
+                continue  # the final edit still goes out
+            self._shown = self._text
+            try:
+                await self._edit(self._render(self._text, partial=True))
+            except discord.HTTPException:
+                pass
+            self._edits += 1
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def finish(self, text: str):
+        await self.stop()
+        await self._edit(self._render(text, partial=False))
 
 language_group = app_commands.Group(name="language", description="Set the bot language for this server.")
 
@@ -434,7 +1001,7 @@ async def language_set(inter: discord.Interaction, language: str):
         return await inter.response.send_message("❌ Use this in a server.", ephemeral=True)
 
     lang = normalize_language(language)
-    set_guild_language(inter.guild.id, lang)
+    await set_guild_language(inter.guild.id, lang)
     await inter.response.send_message(
         f"✅ Server language set to **{lang}**.\nNext summaries will be written in that language.",
         ephemeral=True
@@ -445,7 +1012,7 @@ async def language_current(inter: discord.Interaction):
     if inter.guild is None:
         return await inter.response.send_message("❌ Use this in a server.", ephemeral=True)
 
-    lang = get_guild_language(inter.guild.id)
+    lang = await get_guild_language(inter.guild.id)
     if not lang:
         return await inter.response.send_message("🌍 Server language is **default (English)**.", ephemeral=True)
     await inter.response.send_message(f"🌍 Server language is set to **{lang}**.", ephemeral=True)
@@ -455,98 +1022,566 @@ async def language_reset(inter: discord.Interaction):
     if inter.guild is None:
         return await inter.response.send_message("❌ Use this in a server.", ephemeral=True)
 
-    reset_guild_language(inter.guild.id)
+    await reset_guild_language(inter.guild.id)
     await inter.response.send_message("✅ Server language reset to **default (English)**.", ephemeral=True)
 
 bot.tree.add_command(language_group)
 
-@bot.tree.command(name="backscroll", description="Summarize the last N messages in this channel.")
-@app_commands.describe(count="How many messages to fetch (1–800)")
-async def backscroll(inter: discord.Interaction, count: Optional[int] = 100):
-    err = await _preflight_checks(inter)
-    if err:
-        return await inter.response.send_message(err, ephemeral=True)
-
-    await maybe_send_update_notice(inter)
-
-    _bump_cooldown(inter.user.id)
-    await inter.response.defer(thinking=True)
-
-    if not isinstance(inter.channel, discord.TextChannel):
-        return await inter.followup.send("❌ This command can only be used in text channels.", ephemeral=True)
-
-    requested = count or 100
-    count = max(1, min(MAX_BACKSCROLL, requested))
-
-    guild_lock = _guild_locks[int(inter.guild.id)] if inter.guild else asyncio.Lock()
+digest_group = app_commands.Group(
+    name="digest", description="Post a summary of a channel every hour or day.",
+    guild_only=True, default_permissions=discord.Permissions(manage_guild=True),
+)
+
+@digest_group.command(name="add", description="Post a digest of a channel every hour or every day.")
+@app_commands.describe(period="How often", channel="Channel to digest (default: this one)")
+@app_commands.choices(period=[
+    app_commands.Choice(name="daily", value=digests.DAILY),
+    app_commands.Choice(name="hourly", value=digests.HOURLY),
+])
+async def digest_add(inter: discord.Interaction, period: app_commands.Choice[str],
+                     channel: Optional[discord.TextChannel] = None):
+    channel = channel or inter.channel
+    if not isinstance(channel, discord.TextChannel):
+        return await inter.response.send_message("❌ Digests work in text channels only.", ephemeral=True)
+    # The digest is posted where anyone in the channel can read it, so whoever sets one up
+    # must be able to read the channel, and the bot must be able to read and post there.
+    mine, theirs = channel.permissions_for(inter.guild.me), channel.permissions_for(inter.user)
+    if not (theirs.view_channel and theirs.read_message_history):
+        return await inter.response.send_message(
+            f"❌ You need to be able to read {channel.mention} to set up its digest.", ephemeral=True
+        )
+    if not (mine.view_channel and mine.read_message_history and mine.send_messages):
+        return await inter.response.send_message(
+            f"❌ I need View Channel, Read Message History and Send Messages in {channel.mention}.",
+            ephemeral=True
+        )
+    subs = await digest_store.for_guild(inter.guild.id)
+    if len(subs) >= DIGEST_MAX_PER_GUILD and all(s.channel_id != channel.id for s in subs):
+        return await inter.response.send_message(
+            f"🚫 This server already has **{DIGEST_MAX_PER_GUILD}** digests. Remove one first.", ephemeral=True
+        )
+    digest_store.add(inter.guild.id, channel.id, period.value, inter.user.id, _now())
+    when = "every hour" if period.value == digests.HOURLY else (
+        f"once a day, between {DIGEST_QUIET_HOURS[0]}:00 and {DIGEST_QUIET_HOURS[1]}:00 ({LOCAL_TZ.key})"
+    )
+    await inter.response.send_message(f"✅ {channel.mention} will get a digest {when}.", ephemeral=True)
+
+@digest_group.command(name="remove", description="Stop the digest for a channel.")
+@app_commands.describe(channel="Channel (default: this one)")
+async def digest_remove(inter: discord.Interaction, channel: Optional[discord.TextChannel] = None):
+    channel = channel or inter.channel
+    digest_store.remove(inter.guild.id, channel.id)
+    await inter.response.send_message(f"✅ No more digests for {channel.mention}.", ephemeral=True)
+
+@digest_group.command(name="list", description="Show this server's digests.")
+async def digest_list(inter: discord.Interaction):
+    subs = await digest_store.for_guild(inter.guild.id)
+    if not subs:
+        return await inter.response.send_message("No digests set up. Use `/digest add`.", ephemeral=True)
+    out = "\n".join(f"<#{s.channel_id}> | {s.period} | last <t:{s.last_run}:R>" for s in subs)
+    await inter.response.send_message(f"📰 Digests:\n{out}", ephemeral=True)
+
+bot.tree.add_command(digest_group)
+
+async def _post_digest(item: DigestItem, summary: str, now: int):
+    channel = bot.get_channel(item.channel_id)
+    if isinstance(channel, discord.TextChannel):
+        header = f"📰 **Digest of #{channel.name}:** {item.message_count} messages since <t:{item.since_ts}:f>"
+        try:
+            await channel.send(f"{header}\n\n{summary}"[:2000])
+            DIGESTS.inc("posted")
+        except discord.HTTPException as e:
+            DIGESTS.inc("failed")
+            print(f"⚠️ digest for #{channel.name} not posted: {e}")
+    digest_store.done(item, now)
+
+async def _finish_digest_batch(batch_id: str, now: int):
+    status, output_file = await digest_batches.poll(batch_id)
+    if status not in digests.FINISHED:
+        return
+    results = await digest_batches.results(output_file) if output_file else {}
+    for item in await digest_store.items(batch_id):
+        got = results.get(digests.item_id(item.guild_id, item.channel_id))
+        if got is None:
+            DIGESTS.inc("failed")
+            digest_store.failed(item.guild_id, item.channel_id, now, item.last_message_id)
+            continue
+        LLM_TOKENS.inc("batch", n=got[1])
+        await _post_digest(item, got[0], now)
+    digest_store.close_batch(batch_id, status)
+
+async def _collect_digests(now: int):
+    quiet = digests.in_window(now, DIGEST_QUIET_HOURS, LOCAL_TZ)
+    # Each process digests the channels it can see; in cluster mode that is its own shards.
+    due = [s for s in await digest_store.all()
+           if s.is_due(now, quiet, LOCAL_TZ) and isinstance(bot.get_channel(s.channel_id), discord.TextChannel)]
+
+    requests: List[Tuple[str, List[dict], int]] = []
+    items: List[DigestItem] = []
+    for sub in due[:DIGEST_BATCH_MAX]:
+        channel = bot.get_channel(sub.channel_id)
+        since_ts = sub.last_run or now - digests.PERIOD_SECONDS[sub.period]
+        try:
+            msgs = await fetch_messages(channel, DIGEST_MAX_MESSAGES, sub.last_message_id or _snowflake_at(since_ts))
+        except RestBudgetExceeded:
+            break  # try the rest on the next tick
+        except discord.HTTPException as e:
+            DIGESTS.inc("failed")
+            digest_store.failed(sub.guild_id, sub.channel_id, now)
+            print(f"⚠️ digest history for #{channel.name} failed: {e}")
+            continue
+        if not msgs:
+            DIGESTS.inc("empty")
+            digest_store.skipped(sub.guild_id, sub.channel_id, now)
+            continue
 
-    async with _global_summary_sem:
-        async with guild_lock:
+        lang = (await get_guild_language(sub.guild_id)).strip() or "English"
+        include_topics = len(msgs) > 100
+        transcript = _prepare_transcript(msgs)
+        item = DigestItem(sub.guild_id, sub.channel_id, since_ts, msgs[-1].id, len(msgs))
+        if not DIGEST_USE_BATCH or estimate_tokens(transcript) > MAP_REDUCE_THRESHOLD_TOKENS:
+            # Oversized transcripts need the map step, which doesn't fit one batch line. These are
+            # live LLM calls, so they only run while load is normal and wait their turn in the
+            # scheduler behind on-demand summaries.
+            if _observe_load() > NORMAL:
+                break
             try:
-                msgs = await fetch_messages(inter.channel, count)
-                if not msgs:
-                    return await inter.followup.send("No messages found.", ephemeral=True)
-
-                formatted = format_messages(msgs)
-                include_topics = requested > 100
-
-                lang = get_guild_language(inter.guild.id) if inter.guild else ""
-                summary = await summarize_with_ai(formatted, include_topics, lang)
-
-                if not is_privileged(inter.user.id):
-                    _inc_user_daily_used(inter.user.id, _day_key_now(), 1)
-
-                log_usage_inter(inter, "backscroll")
-                await inter.followup.send(f"📜 **Summary of the last {requested} messages:**\n\n{summary}")
-            except Exception:
-                await inter.followup.send(f"❌ I couldn’t complete the summary. Need help? {SUPPORT_LINK}", ephemeral=True)
-
-@bot.tree.command(name="backscroll_private", description="Summarize the last N messages and send privately.")
-@app_commands.describe(count="How many messages to fetch (1–800)")
-async def backscroll_private(inter: discord.Interaction, count: Optional[int] = 100):
-    err = await _preflight_checks(inter)
+                async with summary_scheduler.slot(DIGEST_QUEUE_ID, sub.channel_id, max(1, round(len(msgs) / 100)),
+                                                  timeout=DIGEST_TICK_SECONDS):
+                    summary = await summarize_with_ai(transcript, include_topics, lang, guild_id=sub.guild_id)
+            except QueueTimeout:
+                break
+            except Exception as e:
+                DIGESTS.inc("failed")
+                digest_store.failed(sub.guild_id, sub.channel_id, now, item.last_message_id)
+                print(f"⚠️ digest for #{channel.name} failed: {e}")
+                continue
+            DIGESTS.inc("direct")
+            await _post_digest(item, summary, now)
+            continue
+        messages = _summary_prompt(include_topics, lang) + [
+            {"role": "user", "content": f"Messages:\n{transcript}"}
+        ]
+        requests.append((digests.item_id(sub.guild_id, sub.channel_id), messages, SUMMARY_MAX_TOKENS))
+        items.append(item)
+
+    if requests:
+        batch_id = await digest_batches.submit(requests)
+        digest_store.record_batch(batch_id, DIGEST_OWNER, items, now)
+        DIGESTS.inc("batched", n=len(requests))
+        print(f"📰 Submitted digest batch {batch_id} with {len(requests)} channels")
+
+async def _digest_loop():
+    await bot.wait_until_ready()
+    while True:
+        now = _now()
+        try:
+            for batch_id in await digest_store.open_batches(DIGEST_OWNER):
+                await _finish_digest_batch(batch_id, now)
+            # On-demand summaries come first: only collect while nobody is queued for a slot.
+            if not summary_scheduler.queued and summary_scheduler.running < summary_scheduler.concurrency:
+                await _collect_digests(now)
+        except Exception as e:
+            print(f"⚠️ digest tick failed: {e}")
+        await asyncio.sleep(DIGEST_TICK_SECONDS)
+
+def _queue_budget(inter: discord.Interaction) -> float:
+    age = time.time() - inter.created_at.timestamp()
+    return max(1.0, INTERACTION_TTL_SECONDS - INTERACTION_WORK_MARGIN_SECONDS - age)
+
+def _queue_eta() -> float:
+    # Time for everything queued to get a slot, at the recent time per summary.
+    service = summary_scheduler.stats()["avg_service"] or max(
+        (w.quantile(0.5) for w in llm_router.routes[0].latency.values()), default=10.0)
+    return summary_scheduler.queued / max(1, summary_scheduler.concurrency) * service
+
+def _observe_load() -> int:
+    p95 = max((w.quantile(0.95) for w in llm_router.routes[0].latency.values()), default=0.0)
+    return admission.observe(_queue_eta(), p95, rest_governor.pressure())
+
+def _queue_notice(inter: discord.Interaction):
+    async def notice(position: int, eta: float):
+        text = f"⏳ Busy right now — you're **#{position}** in line (about {max(5, int(eta))}s)."
+        await inter.edit_original_response(content=text)
+    return notice
+
+async def _produce_summary(inter: discord.Interaction, count: int, include_topics: Optional[bool], lang: str,
+                           on_progress: Optional[ProgressCallback],
+                           after_id: Optional[int] = None, model: Optional[str] = None,
+                           max_tokens: int = SUMMARY_MAX_TOKENS) -> Optional[Tuple[str, int]]:
+    channel = inter.channel
+    guild_id = inter.guild.id
+    cost = max(1, round(count / 100))
+
+    async with summary_scheduler.slot(guild_id, channel.id, cost, timeout=_queue_budget(inter),
+                                      on_wait=_queue_notice(inter)) as ticket:
+        STAGE_SECONDS.observe("queue_wait", value=ticket.started_at - ticket.enqueued_at)
+        with _stage("fetch"):
+            msgs = await fetch_messages(channel, count, after_id)
+        if not msgs:
+            return None
+        if include_topics is None:
+            include_topics = len(msgs) > 100
+        summary = await summarize_messages(guild_id, channel.id, msgs, include_topics, lang, on_progress=on_progress,
+                                           model=model, max_tokens=max_tokens)
+        return summary, len(msgs)
+
+async def _run_backscroll(inter: discord.Interaction, count: Optional[int], private: bool,
+                          since: Optional[str] = None):
+    command_name = "backscroll_private" if private else "backscroll"
+    outcome = "error"
+    with COMMAND_SECONDS.time(command_name):
+        try:
+            outcome = await _backscroll_flow(inter, count, private, command_name, since)
+        finally:
+            COMMANDS.inc(command_name, outcome)
+
+async def _backscroll_flow(inter: discord.Interaction, count: Optional[int], private: bool,
+                           command_name: str, since: Optional[str]) -> str:
+    since_ts: Optional[int] = None
+    if since:
+        try:
+            since_ts = _parse_since(since, _now())
+        except ValueError:
+            await inter.response.send_message(
+                "❌ I couldn't read `since`. Try `2h`, `30m`, `1d`, a date, or `me` for since your last message.",
+                ephemeral=True
+            )
+            return "rejected"
+
+    with _stage("preflight"):
+        err = await _preflight_checks(inter)
     if err:
-        return await inter.response.send_message(err, ephemeral=True)
+        await inter.response.send_message(err, ephemeral=True)
+        return "rejected"
+
+    # Turn the request away now rather than let it wait out its interaction token in the queue.
+    _observe_load()
+    if not admission.admit():
+        minutes = max(1, math.ceil(_queue_eta() / 60))
+        await inter.response.send_message(
+            f"🚦 I'm overloaded right now. Please try again in about {minutes} min.", ephemeral=True
+        )
+        return "shed"
 
     await maybe_send_update_notice(inter)
 
-    _bump_cooldown(inter.user.id)
-    await inter.response.defer(thinking=True, ephemeral=True)
+    await inter.response.defer(thinking=True, ephemeral=private)
 
     if not isinstance(inter.channel, discord.TextChannel):
-        return await inter.followup.send("❌ This command can only be used in text channels.", ephemeral=True)
+        await inter.followup.send("❌ This command can only be used in text channels.", ephemeral=True)
+        return "rejected"
 
-    requested = count or 100
-    count = max(1, min(MAX_BACKSCROLL, requested))
+    dm: Optional[discord.Message] = None
+    try:
+        after_id: Optional[int] = None
+        window = ""
+        if since and since_ts is None:
+            after_id = await _last_message_by(inter.channel, inter.user.id)
+            window = "your last message" if after_id is not None else ""
+        elif since:
+            # Whole minutes, so people catching up on the same window share one summary.
+            after_id = _snowflake_at(since_ts - since_ts % 60)
+            window = f"<t:{since_ts}:R>"
+
+        if window:
+            # Time windows stop at their boundary; count only caps them.
+            requested = count or MAX_BACKSCROLL
+            count = max(1, min(MAX_BACKSCROLL, requested))
+            include_topics: Optional[bool] = None
+
+            def make_header(n: Optional[int]) -> str:
+                what = f"{n} messages" if n is not None else "messages"
+                if private:
+                    out = f"📬 **Private summary of {what} in #{inter.channel.name} since {window}:**"
+                else:
+                    out = f"📜 **Summary of {what} since {window}:**"
+                return out + busy_note
+        else:
+            requested = count or 100
+            count = max(1, min(MAX_BACKSCROLL, requested))
+            include_topics = requested > 100
+
+            def make_header(n: Optional[int]) -> str:
+                if private:
+                    out = f"📬 **Private summary of the last {n or count} messages in #{inter.channel.name}:**"
+                else:
+                    out = f"📜 **Summary of the last {n or count} messages:**"
+                if n is not None and n < count:
+                    out += f"\n-# (Only {n} messages with text turned up in the recent history.)"
+                if since:
+                    out += "\n-# (I couldn't find your last message here, so this covers the latest ones.)"
+                return out + busy_note
+
+        # Under load the summary covers fewer messages, skips topics or uses a lighter model.
+        plan = admission.plan(count, include_topics)
+        count, include_topics = plan.count, plan.include_topics
+        busy_note = "\n-# (I'm busy right now, so this summary is shorter than usual.)" if plan.degraded else ""
+
+        # Until the fetch finishes the header can only show what was asked for.
+        header = make_header(None)
+
+        lang = await get_guild_language(inter.guild.id)
+
+        reply = None
+        if STREAM_REPLIES:
+            if private:
+                # Open the DM first so a closed inbox fails before we pay for the summary.
+                try:
+                    dm = await inter.user.send(f"{header}\n\n…")
+                except discord.Forbidden:
+                    await inter.followup.send("❌ Could not DM you.", ephemeral=True)
+                    return "dm_closed"
+                edit = dm.edit
+            else:
+                edit = inter.edit_original_response
+            reply = _StreamedReply(lambda content: edit(content=content), header)
+
+        async def produce() -> Optional[str]:
+            if reply:
+                reply.start()
+            return await _produce_summary(inter, count, include_topics, lang,
+                                          reply.update if reply else None, after_id, plan.model, plan.max_tokens)
+
+        # Identical requests on the same channel share one fetch + LLM call; each user is still charged.
+        # Only the exact same count is shared, so everyone gets the summary they asked for.
+        key = (inter.channel.id, count, lang, include_topics, after_id, plan.model, plan.max_tokens)
+        try:
+            result, _shared = await summary_flights.do(key, produce)
+        finally:
+            if reply:
+                await reply.stop()
+
+        if result is None:
+            if dm:
+                await dm.delete()
+            await inter.followup.send("No messages found.", ephemeral=True)
+            return "empty"
+        summary, summarized = result
+        header = make_header(summarized)
+        if reply:
+            reply.header = header
+
+        quota_gate.charge(inter.guild.id, inter.user.id, not is_privileged(inter.user.id), _now(), _day_key_now())
+        log_usage_inter(inter, command_name)
+
+        with _stage("deliver"):
+            if not private:
+                if reply:
+                    await reply.finish(summary)
+                else:
+                    # The deferred response may already show a queue notice; replace it.
+                    await inter.edit_original_response(content=f"{header}\n\n{summary}")
+                return "ok"
+
+            if reply:
+                await reply.finish(summary)
+            else:
+                try:
+                    await inter.user.send(f"{header}\n\n{summary}")
+                except discord.Forbidden:
+                    await inter.followup.send("❌ Could not DM you.", ephemeral=True)
+                    return "dm_closed"
+            await inter.followup.send("✅ Sent you a DM with the summary.", ephemeral=True)
+            return "ok"
+    except RestBudgetExceeded:
+        if dm:
+            try:
+                await dm.delete()
+            except discord.HTTPException:
+                pass
+        await inter.followup.send("⚠️ Discord is rate limiting me right now. Please try again in a minute.",
+                                  ephemeral=True)
+        return "rest_budget"
+    except QueueTimeout:
+        if dm:
+            try:
+                await dm.delete()
+            except discord.HTTPException:
+                pass
+        try:
+            await inter.followup.send("⌛ The queue is too long right now. Please try again in a few minutes.",
+                                      ephemeral=True)
+        except discord.HTTPException:
+            pass
+        return "queue_timeout"
+    except Exception:
+        if dm:
+            try:
+                await dm.delete()
+            except discord.HTTPException:
+                pass
+        await inter.followup.send(f"❌ I couldn’t complete the summary. Need help? {SUPPORT_LINK}", ephemeral=True)
+        return "error"
 
-    guild_lock = _guild_locks[int(inter.guild.id)] if inter.guild else asyncio.Lock()
+@bot.tree.command(name="backscroll", description="Summarize the last N messages in this channel.")
+@app_commands.describe(
+    count="How many messages to fetch (1–800); with since, the most to include",
+    since="Only messages from this window: 2h, 30m, 1d, or 'me' for since your last message",
+)
+async def backscroll(inter: discord.Interaction, count: Optional[int] = None, since: Optional[str] = None):
+    await _run_backscroll(inter, count, private=False, since=since)
 
-    async with _global_summary_sem:
-        async with guild_lock:
-            try:
-                msgs = await fetch_messages(inter.channel, count)
+@bot.tree.command(name="backscroll_private", description="Summarize the last N messages and send privately.")
+@app_commands.describe(
+    count="How many messages to fetch (1–800); with since, the most to include",
+    since="Only messages from this window: 2h, 30m, 1d, or 'me' for since your last message",
+)
+async def backscroll_private(inter: discord.Interaction, count: Optional[int] = None, since: Optional[str] = None):
+    await _run_backscroll(inter, count, private=True, since=since)
+
+def _server_channels(inter: discord.Interaction, after_id: int) -> List[discord.abc.Messageable]:
+    # Text channels and open public threads with messages in the window that both the bot and
+    # the user can read, busiest first by what the gateway has shown us, then by latest message.
+    guild = inter.guild
+    nsfw_ok = isinstance(inter.channel, discord.TextChannel) and inter.channel.is_nsfw()
+    candidates = list(guild.text_channels) + [
+        t for t in guild.threads if not t.archived and t.type == discord.ChannelType.public_thread
+    ]
+    out = []
+    for ch in candidates:
+        if not ch.last_message_id or ch.last_message_id <= after_id:
+            continue
+        if ch.is_nsfw() and not nsfw_ok:
+            continue
+        mine, theirs = ch.permissions_for(guild.me), ch.permissions_for(inter.user)
+        if not (mine.read_message_history and theirs.read_message_history and theirs.view_channel):
+            continue
+        out.append(ch)
+    out.sort(key=lambda ch: (len(message_cache.after(ch.id, after_id, SERVER_DIGEST_PER_CHANNEL)),
+                             ch.last_message_id), reverse=True)
+    return out[:SERVER_DIGEST_MAX_CHANNELS]
+
+def _pack_sections(header: str, sections: List[str], limit: int = 2000) -> List[str]:
+    # As few messages as possible, never splitting a section unless it is longer than a message.
+    pages, cur = [], header
+    for sec in sections:
+        if len(cur) + 2 + len(sec) <= limit:
+            cur = f"{cur}\n\n{sec}"
+            continue
+        pages.append(cur)
+        cur = sec[:limit]
+    pages.append(cur)
+    return pages
+
+async def _server_digest(inter: discord.Interaction, after_id: int, lang: str,
+                         channels: List[discord.abc.Messageable]) -> List[Tuple[discord.abc.Messageable, int, str]]:
+    plan = admission.plan(SERVER_DIGEST_PER_CHANNEL, False)
+    # The page budget is split evenly; channels the gateway already covers use none of theirs.
+    max_scan = max(1, SERVER_DIGEST_MAX_PAGES // len(channels)) * 100
+    sem = asyncio.Semaphore(SERVER_DIGEST_CONCURRENCY)
+    notice = _queue_notice(inter)
+
+    async def section(i: int, ch) -> Optional[Tuple[discord.abc.Messageable, int, str]]:
+        # Each section holds its own scheduler slot, so a digest gets no more LLM concurrency than
+        # the same number of /backscroll calls and queues behind other guilds the same way.
+        async with sem:
+            async with summary_scheduler.slot(inter.guild.id, ch.id, max(1, round(plan.count / 100)),
+                                              timeout=_queue_budget(inter),
+                                              on_wait=notice if i == 0 else None) as ticket:
+                STAGE_SECONDS.observe("queue_wait", value=ticket.started_at - ticket.enqueued_at)
+                with _stage("fetch"):
+                    msgs = await fetch_messages(ch, plan.count, after_id, max_scan)
                 if not msgs:
-                    return await inter.followup.send("No messages found.", ephemeral=True)
-
-                formatted = format_messages(msgs)
-                include_topics = requested > 100
+                    return None
+                with _stage("llm"):
+                    text = await summarize_messages(inter.guild.id, ch.id, msgs, False, lang,
+                                                    model=plan.model, max_tokens=plan.max_tokens)
+        return ch, len(msgs), text.removeprefix("**Summary**").strip()
+
+    results = await asyncio.gather(*[section(i, ch) for i, ch in enumerate(channels)], return_exceptions=True)
+    out, failed = [], []
+    for ch, res in zip(channels, results):
+        if isinstance(res, BaseException):
+            print(f"⚠️ server digest section for #{ch.name} failed: {res!r}")
+            failed.append(res)
+        elif res is not None:
+            out.append(res)
+    if failed and not out:
+        raise failed[0]
+    out.sort(key=lambda x: x[1], reverse=True)
+    return out
 
-                lang = get_guild_language(inter.guild.id) if inter.guild else ""
-                summary = await summarize_with_ai(formatted, include_topics, lang)
+async def _server_digest_flow(inter: discord.Interaction, since: str) -> str:
+    try:
+        since_ts = _parse_since(since, _now())
+    except ValueError:
+        since_ts = -1
+    if since_ts is None or since_ts < 0:
+        await inter.response.send_message(
+            "❌ I couldn't read `since`. Try `2h`, `30m`, `1d` or a date.", ephemeral=True
+        )
+        return "rejected"
 
-                if not is_privileged(inter.user.id):
-                    _inc_user_daily_used(inter.user.id, _day_key_now(), 1)
+    with _stage("preflight"):
+        err = await _preflight_checks(inter)
+    if err:
+        await inter.response.send_message(err, ephemeral=True)
+        return "rejected"
+
+    _observe_load()
+    if not admission.admit():
+        minutes = max(1, math.ceil(_queue_eta() / 60))
+        await inter.response.send_message(
+            f"🚦 I'm overloaded right now. Please try again in about {minutes} min.", ephemeral=True
+        )
+        return "shed"
 
-                log_usage_inter(inter, "backscroll_private")
-                try:
-                    await inter.user.send(
-                        f"📬 **Private summary of the last {requested} messages in #{inter.channel.name}:**\n\n{summary}"
-                    )
-                    await inter.followup.send("✅ Sent you a DM with the summary.", ephemeral=True)
-                except discord.Forbidden:
-                    await inter.followup.send("❌ Could not DM you.", ephemeral=True)
-            except Exception:
-                await inter.followup.send(f"❌ I couldn’t complete the summary. Need help? {SUPPORT_LINK}", ephemeral=True)
+    # Only the caller sees the digest: it may cover channels others in this one can't read.
+    await inter.response.defer(thinking=True, ephemeral=True)
+    after_id = _snowflake_at(since_ts - since_ts % 60)
+    channels = _server_channels(inter, after_id)
+    if not channels:
+        await inter.followup.send(f"No channels you can read have new messages since <t:{since_ts}:R>.",
+                                  ephemeral=True)
+        return "empty"
+
+    lang = await get_guild_language(inter.guild.id)
+    # People with the same view of the server asking at the same time share one digest.
+    key = ("server", inter.guild.id, tuple(ch.id for ch in channels), after_id, lang)
+    try:
+        sections, _shared = await summary_flights.do(key, lambda: _server_digest(inter, after_id, lang, channels))
+    except RestBudgetExceeded:
+        await inter.followup.send("⚠️ Discord is rate limiting me right now. Please try again in a minute.",
+                                  ephemeral=True)
+        return "rest_budget"
+    except QueueTimeout:
+        try:
+            await inter.followup.send("⌛ The queue is too long right now. Please try again in a few minutes.",
+                                      ephemeral=True)
+        except discord.HTTPException:
+            pass
+        return "queue_timeout"
+    except Exception:
+        await inter.followup.send(f"❌ I couldn’t complete the summary. Need help? {SUPPORT_LINK}", ephemeral=True)
+        return "error"
+    if not sections:
+        await inter.followup.send("No messages found.", ephemeral=True)
+        return "empty"
+
+    total = sum(n for _, n, _ in sections)
+    header = f"🗞️ **{inter.guild.name} since <t:{since_ts}:R>:** {total} messages in {len(sections)} channels"
+    pages = _pack_sections(header, [f"**#{ch.name}** · {n} messages\n{text}" for ch, n, text in sections])
+
+    quota_gate.charge(inter.guild.id, inter.user.id, not is_privileged(inter.user.id), _now(), _day_key_now())
+    log_usage_inter(inter, "backscroll_server")
+
+    with _stage("deliver"):
+        await inter.edit_original_response(content=pages[0])
+        for page in pages[1:]:
+            await inter.followup.send(page, ephemeral=True)
+    return "ok"
+
+@bot.tree.command(name="backscroll_server", description="Summarize the busiest channels in this server, just for you.")
+@app_commands.describe(since="How far back to look: 2h, 30m, 1d or a date (default 12h)")
+@app_commands.guild_only()
+async def backscroll_server(inter: discord.Interaction, since: Optional[str] = None):
+    outcome = "error"
+    with COMMAND_SECONDS.time("backscroll_server"):
+        try:
+            outcome = await _server_digest_flow(inter, since or SERVER_DIGEST_DEFAULT_SINCE)
+        finally:
+            COMMANDS.inc("backscroll_server", outcome)
 
 @bot.tree.command(name="sync", description="(Admin) Sync slash commands now.")
 async def sync_cmd(inter: discord.Interaction):
@@ -575,8 +1610,12 @@ for g in CONTROL_GUILDS:
         if not is_admin(inter):
             return await inter.response.send_message("❌ Not allowed.", ephemeral=True)
         since = _now() - 86400
-        with sqlite3.connect(DB_PATH) as conn:
-            total = conn.execute("SELECT COUNT(*) FROM usage_events WHERE ts > ?", (since,)).fetchone()[0]
+        edge = _rollup_edge(since)
+        row = await storage.read_one("""
+            SELECT (SELECT COALESCE(SUM(count), 0) FROM usage_hourly WHERE hour_ts >= ?)
+                 + (SELECT COUNT(*) FROM usage_events WHERE ts > ? AND ts < ?)
+        """, (edge, since, edge))
+        total = row[0]
         await inter.response.send_message(f"📊 Usage (last 24h): **{total}**", ephemeral=True)
 
     @bot.tree.command(name="top", description="(Admin) Top 5 servers by usage (last 7d).", guild=g)
@@ -584,49 +1623,137 @@ for g in CONTROL_GUILDS:
         if not is_admin(inter):
             return await inter.response.send_message("❌ Not allowed.", ephemeral=True)
         since = _now() - 7 * 86400
-        with sqlite3.connect(DB_PATH) as conn:
-            rows = conn.execute("""
-                SELECT guild_name, COUNT(*) FROM usage_events
-                WHERE ts > ?
+        edge = _rollup_edge(since)
+        rows = await storage.read("""
+            SELECT COALESCE(n.name, t.guild_id), t.c FROM (
+                SELECT guild_id, SUM(c) AS c FROM (
+                    SELECT guild_id, SUM(count) AS c FROM usage_hourly WHERE hour_ts >= ? GROUP BY guild_id
+                    UNION ALL
+                    SELECT COALESCE(guild_id, ''), COUNT(*) FROM usage_events WHERE ts > ? AND ts < ? GROUP BY 1
+                )
                 GROUP BY guild_id
-                ORDER BY COUNT(*) DESC
+                ORDER BY c DESC
                 LIMIT 5
-            """, (since,)).fetchall()
+            ) t
+            LEFT JOIN guild_names n ON n.guild_id = t.guild_id
+            ORDER BY t.c DESC
+        """, (edge, since, edge))
         if not rows:
             return await inter.response.send_message("No usage in last 7d.", ephemeral=True)
         out = "\n".join([f"{i+1}. {name} | {cnt} uses" for i, (name, cnt) in enumerate(rows)])
         await inter.response.send_message(f"🏆 Top 5 servers (7d):\n{out}", ephemeral=True)
 
-    @bot.tree.command(name="export", description="(Admin) Export usage (last 7d) as CSV.", guild=g)
-    async def export_cmd(inter: discord.Interaction):
+    @bot.tree.command(name="export", description="(Admin) Export usage as CSV.", guild=g)
+    @app_commands.describe(
+        since="Start: 7d, 12h, 2024-05-01 or unix time (default 7d)",
+        until="End, same formats (default now)",
+        guild_id="Only this guild ID",
+        command="Only this command name",
+        compress="gzip the CSV",
+    )
+    async def export_cmd(inter: discord.Interaction, since: Optional[str] = "7d", until: Optional[str] = None,
+                         guild_id: Optional[str] = None, command: Optional[str] = None,
+                         compress: Optional[bool] = False):
         if not is_admin(inter):
             return await inter.response.send_message("❌ Not allowed.", ephemeral=True)
-        since = _now() - 7 * 86400
-        with sqlite3.connect(DB_PATH) as conn:
-            rows = conn.execute("""
-                SELECT guild_name, channel_name, user_name, user_id, command_name, ts
-                FROM usage_events WHERE ts > ?
-            """, (since,)).fetchall()
-        if not rows:
-            return await inter.response.send_message("No data to export.", ephemeral=True)
-        buf = io.StringIO()
-        writer = csv.writer(buf)
-        writer.writerow(["Guild", "Channel", "User", "UserID", "Command", "Timestamp"])
-        for r in rows:
-            writer.writerow(r)
-        file = discord.File(io.BytesIO(buf.getvalue().encode()), filename="usage.csv")
-        await inter.response.send_message("📂 Exported usage (7d):", file=file, ephemeral=True)
+        now = _now()
+        try:
+            start = parse_when(since or "7d", now, LOCAL_TZ)
+            end = parse_when(until, now, LOCAL_TZ) if until else now + 1
+        except (ValueError, OverflowError):
+            return await inter.response.send_message("❌ Couldn't read that time range.", ephemeral=True)
+        # Nothing is logged before 1970 or after now; this also keeps both ends in SQLite's range.
+        start, end = max(start, 0), min(end, now + 1)
+        if start >= end:
+            return await inter.response.send_message("❌ `since` must be before `until`.", ephemeral=True)
+
+        await inter.response.defer(ephemeral=True, thinking=True)
+
+        limit = inter.guild.filesize_limit if inter.guild else 10 * 1024 * 1024
+        part_limit = int(limit * 0.9) - 64 * 1024
+        files, total, truncated = await asyncio.to_thread(
+            export_usage, DB_PATH, ARCHIVE_DB_PATH, start, end, guild_id, command,
+            bool(compress), part_limit, EXPORT_MAX_PARTS,
+        )
+        if not files:
+            return await inter.followup.send("No data to export.", ephemeral=True)
+
+        try:
+            for i, (name, fp) in enumerate(files):
+                if i == 0:
+                    msg = f"📂 Exported usage <t:{start}:f> → <t:{min(end, now)}:f> ({total} rows):"
+                else:
+                    msg = f"Part {i + 1}/{len(files)}"
+                await inter.followup.send(msg, file=discord.File(fp, filename=name), ephemeral=True)
+        finally:
+            for _, fp in files:
+                fp.close()
+        if truncated:
+            await inter.followup.send(
+                f"⚠️ Stopped after {EXPORT_MAX_PARTS} files. Narrow the range or use `compress`.", ephemeral=True
+            )
+
+    @bot.tree.command(name="stats", description="(Admin) Cache and coalescing stats.", guild=g)
+    async def stats_cmd(inter: discord.Interaction):
+        if not is_admin(inter):
+            return await inter.response.send_message("❌ Not allowed.", ephemeral=True)
+        mc = message_cache.stats()
+        sc = summary_store.stats()
+        sf = summary_flights.stats()
+        sq = summary_scheduler.stats()
+        qs = await quota_gate.stats()
+        gs = guild_settings.stats()
+        rb = rest_governor.stats()
+        lc = response_cache.stats()
+        lr = llm_router.stats()
+        el = event_log.stats()
+        shed = ", ".join(f"{k} {v}" for k, v in admission.decisions.items()) or "none"
+        routes = ", ".join(f"{name} {r['state']}" for name, r in lr["routes"].items())
+        out = (
+            f"Message cache: {mc['channels']} channels, {mc['bytes'] // 1024} KiB | "
+            f"hits {mc['hits']}, partial {mc['partial_hits']}, misses {mc['misses']}\n"
+            f"Summary cache: {sc['entries']} entries | exact {sc['exact_hits']}, "
+            f"partial {sc['partial_hits']}, misses {sc['misses']}\n"
+            f"Coalescing: {sf['followers']}/{sf['leaders'] + sf['followers']} shared "
+            f"({sf['coalesce_rate']:.0%}), {sf['inflight']} in flight\n"
+            f"Scheduler: {sq['running']} running, {sq['queued']} queued across {sq['guilds_waiting']} guilds | "
+            f"avg wait {sq['avg_wait']}s, timed out {sq['timed_out']}\n"
+            f"Compaction: {compaction_totals['calls']} calls, "
+            f"{compaction_totals['chars_before'] - compaction_totals['chars_after']} chars / "
+            f"~{compaction_totals['tokens_before'] - compaction_totals['tokens_after']} tokens saved\n"
+            f"LLM cache: {await response_cache.size()} entries | hits {lc['hits']}, misses {lc['misses']} "
+            f"({lc['hit_ratio']:.0%}), {lc['tokens_saved']} tokens saved\n"
+            f"LLM routes: {routes} | retries {lr['retries']}, hedges {lr['hedges']} (won {lr['hedge_wins']})\n"
+            f"Quota: {qs['guild_windows']} guild windows, {qs['user_days']} user days, {qs['cooldowns']} cooldowns\n"
+            f"Guild settings: {gs['entries']} cached (complete={bool(gs['complete'])}), misses {gs['misses']}\n"
+            f"Event log: {el['written']} written, {el['pending']} pending, {el['dropped']} dropped, "
+            f"{el['rotations']} rotations\n"
+            f"Load shedding: {LEVEL_NAMES[admission.level]} (load {admission.load:.2f}) | decisions: {shed}\n"
+            f"REST budget: {rb['tokens']:.0f} tokens, pressure {rb['pressure']:.0%} | "
+            f"interactive {rb['interactive']}, bulk {rb['bulk']}, shed {rb['shed']}, global 429s {rb['global_429s']}"
+        )
+        await inter.response.send_message(f"📈 Stats:\n{out}", ephemeral=True)
+
+    @bot.tree.command(name="llm_cache_purge", description="(Admin) Drop cached LLM responses for a server.", guild=g)
+    @app_commands.describe(guild_id="Server ID (default: this server)")
+    async def llm_cache_purge(inter: discord.Interaction, guild_id: Optional[str] = None):
+        if not is_admin(inter):
+            return await inter.response.send_message("❌ Not allowed.", ephemeral=True)
+        target = (guild_id or "").strip() or str(inter.guild_id)
+        if not target.isdigit():
+            return await inter.response.send_message("❌ `guild_id` must be a server ID.", ephemeral=True)
+        n = await response_cache.purge_guild(int(target))
+        await inter.response.send_message(f"🧽 Dropped **{n}** cached responses for `{target}`.", ephemeral=True)
 
     @bot.tree.command(name="joins", description="(Admin) Show last N servers joined.", guild=g)
     @app_commands.describe(n="How many servers to list (default 5)")
     async def joins(inter: discord.Interaction, n: Optional[int] = 5):
         if not is_admin(inter):
             return await inter.response.send_message("❌ Not allowed.", ephemeral=True)
-        with sqlite3.connect(DB_PATH) as conn:
-            rows = conn.execute(
-                "SELECT guild_name, joined_at FROM guild_joins ORDER BY joined_at DESC LIMIT ?",
-                (n or 5,)
-            ).fetchall()
+        rows = await storage.read(
+            "SELECT guild_name, joined_at FROM guild_joins ORDER BY joined_at DESC LIMIT ?",
+            (n or 5,)
+        )
         if not rows:
             return await inter.response.send_message("No join records.", ephemeral=True)
         out = "\n".join([f"{name} | joined <t:{ts}:R>" for name, ts in rows])
@@ -637,15 +1764,21 @@ for g in CONTROL_GUILDS:
         if not is_admin(inter):
             return await inter.response.send_message("❌ Not allowed.", ephemeral=True)
         since = _now() - 86400
-        with sqlite3.connect(DB_PATH) as conn:
-            rows = conn.execute("""
-                SELECT user_name, user_id, COUNT(*) as c
-                FROM usage_events
-                WHERE ts > ?
+        edge = _rollup_edge(since)
+        rows = await storage.read("""
+            SELECT n.name, t.user_id, t.c FROM (
+                SELECT user_id, SUM(c) AS c FROM (
+                    SELECT user_id, SUM(count) AS c FROM usage_hourly WHERE hour_ts >= ? GROUP BY user_id
+                    UNION ALL
+                    SELECT COALESCE(user_id, ''), COUNT(*) FROM usage_events WHERE ts > ? AND ts < ? GROUP BY 1
+                )
                 GROUP BY user_id
                 ORDER BY c DESC
                 LIMIT 10
-            """, (since,)).fetchall()
+            ) t
+            LEFT JOIN user_names n ON n.user_id = t.user_id
+            ORDER BY t.c DESC
+        """, (edge, since, edge))
         if not rows:
             return await inter.response.send_message("No usage in last 24h.", ephemeral=True)
         out = "\n".join([f"{i+1}. {name} | {cnt} calls (ID `{uid}`)"
@@ -658,14 +1791,13 @@ for g in CONTROL_GUILDS:
             return await inter.response.send_message("❌ Not allowed.", ephemeral=True)
         if inter.guild is None:
             return await inter.response.send_message("Use in a server.", ephemeral=True)
-        with sqlite3.connect(DB_PATH) as conn:
-            rows = conn.execute("""
-                SELECT user_name, user_id, command_name, channel_name, ts
-                FROM usage_events
-                WHERE guild_id = ?
-                ORDER BY ts DESC
-                LIMIT 10
-            """, (str(inter.guild.id),)).fetchall()
+        rows = await storage.read("""
+            SELECT user_name, user_id, command_name, channel_name, ts
+            FROM usage_events
+            WHERE guild_id = ?
+            ORDER BY ts DESC
+            LIMIT 10
+        """, (str(inter.guild.id),))
         if not rows:
             return await inter.response.send_message("No records for this guild.", ephemeral=True)
         out = "\n".join([f"<t:{ts}:R> | {user} (`{uid}`) ran **/{cmd}** in #{chan}"
@@ -675,11 +1807,126 @@ for g in CONTROL_GUILDS:
 @bot.event
 async def on_guild_join(guild: discord.Guild):
     log_guild_join(guild)
-    _ensure_guild_settings_row(guild.id)
+    await guild_settings.reload(guild.id)
+
+async def _setup_hook():
+    # Runs before the gateway connects, so no interaction can see half-loaded caches.
+    if coordinator is not None:
+        with _startup_step("coordinator"):
+            await coordinator.connect()
+        with _startup_step("preload"):
+            await guild_settings.preload()
+        _report_startup()
+        asyncio.create_task(_digest_loop())
+        return
+    with _startup_step("preload"):
+        await guild_settings.preload()
+    with _startup_step("quota_state"):
+        await _load_quota_state()
+    _report_startup()
+    asyncio.create_task(_quota_checkpoint_loop())
+    asyncio.create_task(_maintenance_loop())
+    asyncio.create_task(_digest_loop())
+
+bot.setup_hook = _setup_hook
+
+@bot.event
+async def on_message(message: discord.Message):
+    if message.guild is None or not _is_summarizable(message):
+        return
+    message_cache.add(message.channel.id, CachedMessage.from_message(message))
+
+@bot.event
+async def on_raw_message_edit(payload: discord.RawMessageUpdateEvent):
+    if "content" in payload.data:
+        message_cache.edit(payload.channel_id, payload.message_id, payload.data.get("content"))
+        if payload.guild_id:
+            summary_store.invalidate(payload.guild_id, payload.channel_id, payload.message_id)
+
+@bot.event
+async def on_raw_message_delete(payload: discord.RawMessageDeleteEvent):
+    message_cache.delete(payload.channel_id, [payload.message_id])
+    if payload.guild_id:
+        summary_store.invalidate(payload.guild_id, payload.channel_id, payload.message_id)
+
+@bot.event
+async def on_raw_bulk_message_delete(payload: discord.RawBulkMessageDeleteEvent):
+    message_cache.delete(payload.channel_id, payload.message_ids)
+    if payload.guild_id:
+        for mid in payload.message_ids:
+            summary_store.invalidate(payload.guild_id, payload.channel_id, mid)
+
+@bot.event
+async def on_guild_remove(guild: discord.Guild):
+    summary_store.purge_guild(guild.id)
+    guild_settings.forget(guild.id)
+
+@bot.event
+async def on_guild_channel_delete(channel: discord.abc.GuildChannel):
+    message_cache.drop_channel(channel.id)
+    digest_store.remove(channel.guild.id, channel.id)
 
 @bot.event
 async def on_ready():
+    # A fresh IDENTIFY means we may have missed gateway events; start the message cache over.
+    # With shards that is done per shard in on_shard_ready, so one shard reconnecting doesn't
+    # cost the others their cache.
+    if not isinstance(bot, commands.AutoShardedBot):
+        message_cache.clear()
     print(f"✅ Logged in as {bot.user}")
 
+@bot.event
+async def on_shard_ready(shard_id: int):
+    # Only a shard that had to IDENTIFY again gets here; a RESUME replays what was missed.
+    for channel_id in message_cache.channel_ids():
+        channel = bot.get_channel(channel_id)
+        if channel is None or channel.guild.shard_id == shard_id:
+            message_cache.drop_channel(channel_id)
+
+async def _run_coordinator():
+    global cluster_coordinator
+    with _startup_step("quota_state"):
+        await _load_quota_state()
+    _report_startup()
+    asyncio.create_task(_quota_checkpoint_loop())
+    asyncio.create_task(_maintenance_loop())
+
+    coord = cluster.Coordinator(CLUSTER_SOCKET or cluster.default_socket_path(), storage, summary_scheduler, quota_gate)
+    await coord.start()
+    cluster_coordinator = coord
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        shards = CLUSTER_SHARDS or await cluster.recommended_shards(DISCORD_TOKEN)
+        await coord.supervise(os.path.abspath(__file__), CLUSTER_WORKERS, shards,
+                              int(os.environ.get("PORT", "10000")), stop)
+    finally:
+        await coord.close()
+        await storage.flush()
+
+startup_timings["import"] = round(time.perf_counter() - _IMPORT_STARTED, 4)
+
 if __name__ == "__main__":
-    bot.run(DISCORD_TOKEN)
+    create_app()
+    if IS_WORKER:
+        try:
+            bot.run(DISCORD_TOKEN)
+        finally:
+            event_log.close()
+    elif CLUSTER_WORKERS > 0:
+        try:
+            asyncio.run(_run_coordinator())
+        finally:
+            _checkpoint_quota()
+            event_log.close()
+            storage.close()
+    else:
+        try:
+            bot.run(DISCORD_TOKEN)
+        finally:
+            _checkpoint_quota()
+            event_log.close()
+            storage.close()
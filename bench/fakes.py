@@ -0,0 +1,170 @@
+# bench/fakes.py
+# In-process stand-ins for the discord objects the summary commands touch: a TextChannel
+# with a synthetic history and an Interaction that records what the bot sent.
+
+import time
+import random
+import asyncio
+from datetime import datetime, timezone
+from typing import List, Optional
+
+import discord
+
+DISCORD_EPOCH_MS = 1420070400000
+
+def snowflake(ts: float, seq: int = 0) -> int:
+    return (int(ts * 1000) - DISCORD_EPOCH_MS) << 22 | (seq & 0x3FFFFF)
+
+class FakeAuthor:
+    __slots__ = ("id", "display_name", "bot")
+
+    def __init__(self, user_id: int, display_name: str, bot: bool = False):
+        self.id = user_id
+        self.display_name = display_name
+        self.bot = bot
+
+class FakeMessage:
+    __slots__ = ("id", "author", "content", "created_at")
+
+    def __init__(self, message_id: int, author: FakeAuthor, content: str, created_at: datetime):
+        self.id = message_id
+        self.author = author
+        self.content = content
+        self.created_at = created_at
+
+_WORDS = ("deploy", "release", "bug", "meeting", "tomorrow", "link", "docs", "vote", "server", "map",
+          "raid", "patch", "event", "question", "thanks", "lol", "agreed", "idea", "schedule", "role")
+
+def make_history(n: int, seed: int = 0, users: int = 12, bot_ratio: float = 0.05, empty_ratio: float = 0.03,
+                 long_ratio: float = 0.05, long_chars: int = 1800, interval: float = 30.0) -> List[FakeMessage]:
+    # Oldest first, ending now, with a realistic mix of bots, attachment-only (empty) and long messages.
+    rng = random.Random(seed)
+    people = [FakeAuthor(1000 + i, f"user{i}") for i in range(users)]
+    bot = FakeAuthor(999, "SomeBot", bot=True)
+    now = time.time()
+    out: List[FakeMessage] = []
+    for i in range(n):
+        ts = now - (n - i) * interval
+        r = rng.random()
+        if r < bot_ratio:
+            author, content = bot, "Automated notice " + " ".join(rng.choices(_WORDS, k=8))
+        elif r < bot_ratio + empty_ratio:
+            author, content = rng.choice(people), ""
+        elif r < bot_ratio + empty_ratio + long_ratio:
+            author = rng.choice(people)
+            content = " ".join(rng.choices(_WORDS, k=long_chars // 6))[:long_chars]
+        else:
+            author = rng.choice(people)
+            content = " ".join(rng.choices(_WORDS, k=rng.randint(3, 25)))
+        out.append(FakeMessage(snowflake(ts, i), author, content, datetime.fromtimestamp(ts, timezone.utc)))
+    return out
+
+class FakeTextChannel(discord.TextChannel):
+    # Passes the isinstance(TextChannel) checks without a connection state. history() pages
+    # like REST does: up to 100 messages per simulated request.
+    def __init__(self, channel_id: int, name: str, messages: List[FakeMessage], page_latency: float = 0.0):
+        self.id = channel_id
+        self.name = name
+        self._messages = messages
+        self.page_latency = page_latency
+        self.pages_fetched = 0
+        self.sent: List[str] = []
+        self.nsfw = False
+        self.last_message_id = messages[-1].id if messages else None
+
+    def permissions_for(self, obj) -> discord.Permissions:
+        return discord.Permissions(view_channel=True, read_message_history=True, send_messages=True)
+
+    def __repr__(self) -> str:
+        return f"<FakeTextChannel id={self.id} name={self.name!r}>"
+
+    def history(self, limit: Optional[int] = 100, before=None, after=None, oldest_first: Optional[bool] = None):
+        msgs = self._messages
+        if before is not None:
+            msgs = [m for m in msgs if m.id < before.id]
+        if after is not None:
+            msgs = [m for m in msgs if m.id > after.id]
+        if oldest_first is None:
+            oldest_first = after is not None
+        if not oldest_first:
+            msgs = list(reversed(msgs))
+        if limit is not None:
+            msgs = msgs[:limit]
+        return self._pages(msgs)
+
+    async def _pages(self, msgs: List[FakeMessage]):
+        for i, m in enumerate(msgs):
+            if i % 100 == 0:
+                self.pages_fetched += 1
+                if self.page_latency:
+                    await asyncio.sleep(self.page_latency)
+            yield m
+
+    async def send(self, content: str = "", **kwargs):
+        self.sent.append(content)
+
+class FakeGuild:
+    def __init__(self, guild_id: int, name: str):
+        self.id = guild_id
+        self.name = name
+        self.filesize_limit = 25 * 1024 * 1024
+        self.text_channels: List[FakeTextChannel] = []
+        self.threads: list = []
+        self.me = None
+
+class FakeDM:
+    def __init__(self, log: List[str]):
+        self._log = log
+
+    async def edit(self, content: str = "", **kwargs):
+        self._log.append(content)
+
+    async def delete(self):
+        pass
+
+class FakeUser:
+    def __init__(self, user_id: int, name: str):
+        self.id = user_id
+        self.display_name = name
+        self.dms: List[str] = []
+
+    async def send(self, content: str = "", **kwargs) -> FakeDM:
+        self.dms.append(content)
+        return FakeDM(self.dms)
+
+class FakeResponse:
+    def __init__(self, log: List[str]):
+        self._log = log
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def defer(self, **kwargs):
+        self._done = True
+
+    async def send_message(self, content: str = "", **kwargs):
+        self._done = True
+        self._log.append(content)
+
+class FakeFollowup:
+    def __init__(self, log: List[str]):
+        self._log = log
+
+    async def send(self, content: str = "", **kwargs):
+        self._log.append(content)
+
+class FakeInteraction:
+    def __init__(self, guild: FakeGuild, channel: FakeTextChannel, user: FakeUser):
+        self.guild = guild
+        self.guild_id = guild.id
+        self.channel = channel
+        self.user = user
+        self.created_at = datetime.now(timezone.utc)
+        self.log: List[str] = []
+        self.response = FakeResponse(self.log)
+        self.followup = FakeFollowup(self.log)
+        self.original: str = ""
+
+    async def edit_original_response(self, content: str = "", **kwargs):
+        self.original = content
@@ -0,0 +1,331 @@
+# bench/run.py
+# Offline end-to-end benchmark: drives the /backscroll and /backscroll_private command
+# callbacks against fake channels and a stub LLM, then prints one JSON document. The digest
+# scenario drives the scheduled-digest loop instead, on a simulated clock.
+#
+#   python -m bench.run --guilds 20 --users 5 --latency 0.8 --out bench.json
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import asyncio
+import argparse
+import tempfile
+import threading
+import contextlib
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from bench.fakes import FakeGuild, FakeInteraction, FakeTextChannel, FakeUser, make_history
+from bench.stub_llm import StubLLM
+
+SCENARIOS = ("public", "private", "mixed", "hot_channel", "server", "digest")
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    s = sorted(values)
+    k = max(0, min(len(s) - 1, int(round(p / 100 * len(s) + 0.5)) - 1))
+    return s[k]
+
+class SqliteProbe:
+    # Reads metrics.db from its own connection while the bot writes, to see lock waits.
+    def __init__(self, path: str, interval: float = 0.01):
+        self.path = path
+        self.interval = interval
+        self.samples: List[float] = []
+        self.busy = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sqlite-probe", daemon=True)
+
+    def _run(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            while not self._stop.is_set():
+                t0 = time.perf_counter()
+                try:
+                    conn.execute("SELECT COUNT(*) FROM usage_events WHERE ts > ?", (int(time.time()) - 60,)).fetchone()
+                except sqlite3.OperationalError:
+                    self.busy += 1
+                self.samples.append(time.perf_counter() - t0)
+                self._stop.wait(self.interval)
+        finally:
+            conn.close()
+
+    def __enter__(self) -> "SqliteProbe":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+async def _sample_pending(storage, out: Dict[str, int], stop: asyncio.Event):
+    while not stop.is_set():
+        out["peak_pending"] = max(out["peak_pending"], storage.pending())
+        try:
+            await asyncio.wait_for(stop.wait(), 0.01)
+        except asyncio.TimeoutError:
+            pass
+
+async def run_scenario(b, name: str, index: int, args, stub: StubLLM) -> dict:
+    guilds = args.guilds
+    channels = 1 if name == "hot_channel" else args.channels
+    base = (index + 1) * 1_000_000  # fresh ids per scenario so caches start cold
+
+    history = make_history(args.history, seed=index, bot_ratio=args.bot_ratio, empty_ratio=args.empty_ratio,
+                           long_ratio=args.long_ratio)
+    chans = {}
+    jobs = []
+    for g in range(guilds):
+        guild = FakeGuild(base + g, f"guild{g}")
+        for c in range(channels):
+            chans[(g, c)] = FakeTextChannel(base + g * 1000 + c, f"chan{c}", history, args.page_latency)
+            guild.text_channels.append(chans[(g, c)])
+        for u in range(args.users):
+            user = FakeUser(base * 10 + g * 1000 + u, f"user{u}")
+            inter = FakeInteraction(guild, chans[(g, u % channels)], user)
+            private = name == "private" or (name == "mixed" and u % 2 == 1)
+            jobs.append((inter, private))
+
+    stub_before = stub.stats()
+    storage_before = (b.storage.writes_committed, b.storage.batches_committed, b.storage.write_errors)
+    latencies: List[float] = []
+    outcomes: Dict[str, int] = {}
+
+    async def one(inter: FakeInteraction, private: bool, delay: float):
+        await asyncio.sleep(delay)
+        cmd = b.backscroll_private if private else b.backscroll
+        t0 = time.perf_counter()
+        try:
+            if name == "server":
+                await b.backscroll_server.callback(inter, args.server_since)
+            else:
+                await cmd.callback(inter, args.count)
+            kind = "ok" if (inter.user.dms if private else inter.original) else "no_reply"
+            if inter.log and any(x.startswith(("❌", "⌛", "🚫", "⏳")) for x in inter.log):
+                kind = "rejected"
+            if inter.log and any(x.startswith("🚦") for x in inter.log):
+                kind = "shed"
+        except Exception as e:
+            kind = f"exception:{type(e).__name__}"
+        latencies.append(time.perf_counter() - t0)
+        outcomes[kind] = outcomes.get(kind, 0) + 1
+
+    pending = {"peak_pending": 0}
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(_sample_pending(b.storage, pending, stop))
+    with SqliteProbe(b.DB_PATH) as probe:
+        started = time.perf_counter()
+        await asyncio.gather(*[
+            one(inter, private, args.ramp * i / max(1, len(jobs) - 1))
+            for i, (inter, private) in enumerate(jobs)
+        ])
+        wall = time.perf_counter() - started
+        t0 = time.perf_counter()
+        await b.storage.flush()
+        flush = time.perf_counter() - t0
+    stop.set()
+    await sampler
+
+    stub_after = stub.stats()
+    ok = outcomes.get("ok", 0)
+    return {
+        "scenario": name,
+        "requests": len(jobs),
+        "outcomes": outcomes,
+        "wall_s": round(wall, 4),
+        "summaries_per_sec": round(ok / wall, 3) if wall else 0.0,
+        "latency_s": {
+            "p50": round(percentile(latencies, 50), 4),
+            "p95": round(percentile(latencies, 95), 4),
+            "p99": round(percentile(latencies, 99), 4),
+            "max": round(max(latencies, default=0.0), 4),
+        },
+        "llm": {
+            "requests": stub_after["requests"] - stub_before["requests"],
+            "errors": stub_after["errors"] - stub_before["errors"],
+            "abandoned": stub_after["abandoned"] - stub_before["abandoned"],
+            "peak_inflight": stub_after["peak_inflight"],
+            "router": b.llm_router.stats(),
+        },
+        "admission": b.admission.stats(),
+        "rest_pages": sum(ch.pages_fetched for ch in chans.values()),
+        "sqlite": {
+            "writes": b.storage.writes_committed - storage_before[0],
+            "batches": b.storage.batches_committed - storage_before[1],
+            "write_errors": b.storage.write_errors - storage_before[2],
+            "peak_pending": pending["peak_pending"],
+            "final_flush_s": round(flush, 4),
+            "probe_reads": len(probe.samples),
+            "probe_busy": probe.busy,
+            "probe_read_p50_ms": round(percentile(probe.samples, 50) * 1000, 3),
+            "probe_read_p99_ms": round(percentile(probe.samples, 99) * 1000, 3),
+        },
+    }
+
+async def run_digest_scenario(b, index: int, args, stub: StubLLM) -> dict:
+    # Every channel has an hourly digest that just came due. Each tick finishes the open batches
+    # and collects what is due, like _digest_loop, with the clock advanced digest_step seconds;
+    # failed channels come back only once their backoff has passed.
+    base = (index + 1) * 1_000_000
+    now = int(time.time())
+    # A message a minute, so an hour's window fits one batch line without the map step.
+    history = make_history(args.history, seed=index, bot_ratio=args.bot_ratio, empty_ratio=args.empty_ratio,
+                           long_ratio=args.long_ratio, interval=60.0)
+    chans: Dict[int, FakeTextChannel] = {}
+    for g in range(args.guilds):
+        for c in range(args.channels):
+            ch = FakeTextChannel(base + g * 1000 + c, f"chan{c}", history, args.page_latency)
+            chans[ch.id] = ch
+            b.digest_store.add(base + g, ch.id, "hourly", 0, now - 3600)
+    await b.storage.flush()
+
+    get_channel = b.bot.get_channel
+    b.bot.get_channel = lambda cid: chans.get(cid) or get_channel(cid)
+    use_batch = b.DIGEST_USE_BATCH
+    b.DIGEST_USE_BATCH = not args.digest_direct
+    stub_before = stub.stats()
+    before = {k: b.DIGESTS.value(k) for k in ("batched", "direct", "posted", "failed", "empty")}
+    started = time.perf_counter()
+    try:
+        for tick in range(args.digest_ticks):
+            t = now + tick * args.digest_step
+            for batch_id in await b.digest_store.open_batches(b.DIGEST_OWNER):
+                await b._finish_digest_batch(batch_id, t)
+            await b._collect_digests(t)
+            await b.storage.flush()
+            await asyncio.sleep(stub.batch_latency)
+    finally:
+        b.bot.get_channel = get_channel
+        b.DIGEST_USE_BATCH = use_batch
+    wall = time.perf_counter() - started
+
+    end = now + (args.digest_ticks - 1) * args.digest_step
+    subs = [s for s in await b.digest_store.all() if s.channel_id in chans]
+    stub_after = stub.stats()
+    return {
+        "scenario": "digest",
+        "channels": len(chans),
+        "ticks": args.digest_ticks,
+        "wall_s": round(wall, 4),
+        "digests": {k: b.DIGESTS.value(k) - v for k, v in before.items()},
+        "posts": sum(len(ch.sent) for ch in chans.values()),
+        "subscriptions": {
+            "pending_batch": sum(1 for s in subs if s.pending_batch),
+            "backing_off": sum(1 for s in subs if s.retry_at > end),
+            "attempts": {str(n): sum(1 for s in subs if s.attempts == n) for n in sorted({s.attempts for s in subs})},
+        },
+        "llm": {k: stub_after[k] - stub_before[k] for k in ("requests", "errors", "batches", "batch_requests",
+                                                             "batch_errors")},
+        "rest_pages": sum(ch.pages_fetched for ch in chans.values()),
+    }
+
+async def main_async(args) -> dict:
+    stub = StubLLM(args.latency, args.jitter, error_rate=args.error_rate, batch_latency=args.batch_latency,
+                   batch_error_rate=args.batch_error_rate).start()
+    fallback = None
+    if args.fallback_latency is not None:
+        # A second endpoint at the end of the route list, for hedging and fallback runs.
+        fallback = StubLLM(args.fallback_latency, args.jitter).start()
+        os.environ["LLM_ROUTES"] = f"gpt-4o-mini, fallback@{fallback.base_url}"
+    os.environ.update({
+        "DISCORD_TOKEN": "bench",
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": stub.base_url,
+        "OPENAI_MAX_RETRIES": "0",
+        "PORT": "0",
+        "STREAM_REPLIES": "1" if args.stream else "0",
+        "STREAM_EDIT_INTERVAL": str(args.edit_interval),
+        "MAX_CONCURRENT_SUMMARIES_GLOBAL": str(args.concurrency),
+        "LLM_HEDGE": "1" if args.hedge else "0",
+        "LLM_CACHE_TTL_SECONDS": "0",
+    })
+    if not args.shed:
+        os.environ["SHED_THRESHOLDS"] = "1e9,1e9,1e9,1e9"
+    workdir = args.workdir or tempfile.mkdtemp(prefix="backscroll-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+
+    # The bot prints per-request diagnostics; keep stdout for the report.
+    with contextlib.redirect_stdout(sys.stderr):
+        import backscroll as b
+        b.create_app()
+        await b.guild_settings.preload()
+        # Limits would turn most of a load test into rejections.
+        b.quota_gate.guild_limit = b.quota_gate.user_limit = 10 ** 9
+        b.quota.cooldown = 0
+
+        results = []
+        for i, name in enumerate(args.scenarios):
+            if name == "digest":
+                results.append(await run_digest_scenario(b, i, args, stub))
+            else:
+                results.append(await run_scenario(b, name, i, args, stub))
+        b.event_log.close()
+        b.storage.close()
+    stub.close()
+    if fallback is not None:
+        fallback.close()
+
+    return {
+        "config": {k: v for k, v in vars(args).items() if k != "out"},
+        "workdir": workdir,
+        "startup_s": dict(b.startup_timings),
+        "event_log": b.event_log.stats(),
+        "scenarios": results,
+    }
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Offline backscroll benchmark")
+    p.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=SCENARIOS)
+    p.add_argument("--guilds", type=int, default=10)
+    p.add_argument("--channels", type=int, default=2, help="channels per guild")
+    p.add_argument("--users", type=int, default=4, help="users per guild")
+    p.add_argument("--count", type=int, default=100, help="messages per request")
+    p.add_argument("--server-since", default="6h", help="window for the server scenario")
+    p.add_argument("--history", type=int, default=600, help="messages per channel")
+    p.add_argument("--bot-ratio", type=float, default=0.05)
+    p.add_argument("--empty-ratio", type=float, default=0.03)
+    p.add_argument("--long-ratio", type=float, default=0.05)
+    p.add_argument("--page-latency", type=float, default=0.05, help="seconds per 100-message history page")
+    p.add_argument("--latency", type=float, default=0.8, help="stub LLM latency in seconds")
+    p.add_argument("--jitter", type=float, default=0.2)
+    p.add_argument("--error-rate", type=float, default=0.0)
+    p.add_argument("--fallback-latency", type=float, default=None,
+                   help="start a second stub LLM with this latency as a fallback route")
+    p.add_argument("--batch-latency", type=float, default=0.2, help="seconds until a stub batch completes")
+    p.add_argument("--batch-error-rate", type=float, default=0.0, help="share of batch lines that fail")
+    p.add_argument("--digest-ticks", type=int, default=6, help="digest loop ticks in the digest scenario")
+    p.add_argument("--digest-step", type=int, default=900, help="simulated seconds between digest ticks")
+    p.add_argument("--digest-direct", action="store_true",
+                   help="summarize digests with live requests instead of the Batch API")
+    p.add_argument("--hedge", action=argparse.BooleanOptionalAction, default=True)
+    p.add_argument("--concurrency", type=int, default=3)
+    p.add_argument("--shed", action=argparse.BooleanOptionalAction, default=True,
+                   help="let the admission controller degrade or reject under load")
+    p.add_argument("--ramp", type=float, default=0.0, help="spread request starts over this many seconds")
+    p.add_argument("--stream", action=argparse.BooleanOptionalAction, default=True)
+    p.add_argument("--edit-interval", type=float, default=0.25)
+    p.add_argument("--workdir", default=None, help="where metrics.db is created (default: a temp dir)")
+    p.add_argument("--out", default=None, help="write the JSON report here instead of stdout")
+    return p.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = asyncio.run(main_async(args))
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# bench/startup.py
+# Cold-start timing: boots the bot (without connecting to Discord) on a fresh metrics.db,
+# seeds it with a large usage history, then boots it again in a new process.
+#
+#   python -m bench.startup --events 1000000 --out startup.json
+
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in a child process so every boot pays the full import cost.
+_BOOT = """
+import sys, json, asyncio, contextlib
+sys.path.insert(0, %r)
+with contextlib.redirect_stdout(sys.stderr):
+    import backscroll as b
+    b.create_app(serve_metrics=False)
+
+    async def hook():
+        with b._startup_step("preload"):
+            await b.guild_settings.preload()
+        with b._startup_step("quota_state"):
+            await b._load_quota_state()
+
+    asyncio.run(hook())
+    b._report_startup()
+    b.storage.close()
+print(json.dumps(b.startup_timings))
+"""
+
+def boot(workdir: str) -> dict:
+    env = dict(os.environ, DISCORD_TOKEN="bench", OPENAI_API_KEY="bench")
+    t0 = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", _BOOT % ROOT], cwd=workdir, env=env,
+                         capture_output=True, text=True, check=True)
+    timings = json.loads(out.stdout.strip().splitlines()[-1])
+    timings["process_wall"] = round(time.perf_counter() - t0, 4)
+    return timings
+
+def seed(path: str, events: int, guilds: int, users: int, days: int, batch: int = 50_000):
+    rng = random.Random(0)
+    now = int(time.time())
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    commands = ("backscroll", "backscroll_private")
+    done = 0
+    while done < events:
+        n = min(batch, events - done)
+        rows = []
+        for _ in range(n):
+            g = rng.randrange(guilds)
+            u = rng.randrange(users)
+            rows.append((str(10 ** 17 + g), f"guild{g}", rng.choice(commands), now - rng.randrange(days * 86400),
+                         str(10 ** 17 + u), f"user{u}", "1", "general"))
+        conn.executemany("""
+            INSERT INTO usage_events (guild_id, guild_name, command_name, ts, user_id, user_name, channel_id, channel_name)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+        conn.commit()
+        done += n
+    conn.executemany("INSERT OR REPLACE INTO guild_settings (guild_id, language) VALUES (?, ?)",
+                     [(str(10 ** 17 + g), "Spanish") for g in range(0, guilds, 3)])
+    conn.commit()
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Backscroll cold-start benchmark")
+    p.add_argument("--events", type=int, default=1_000_000, help="usage_events rows to seed")
+    p.add_argument("--guilds", type=int, default=20_000)
+    p.add_argument("--users", type=int, default=200_000)
+    p.add_argument("--days", type=int, default=90)
+    p.add_argument("--workdir", default=None, help="where metrics.db is created (default: a temp dir)")
+    p.add_argument("--out", default=None, help="write the JSON report here instead of stdout")
+    args = p.parse_args(argv)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="backscroll-startup-")
+    os.makedirs(workdir, exist_ok=True)
+    db = os.path.join(workdir, "metrics.db")
+
+    fresh = boot(workdir)
+    t0 = time.perf_counter()
+    seed(db, args.events, args.guilds, args.users, args.days)
+    seeded = time.perf_counter() - t0
+    large = boot(workdir)
+
+    budget = float(os.environ.get("STARTUP_BUDGET_SECONDS", "3"))
+    report = {
+        "config": {k: v for k, v in vars(args).items() if k != "out"},
+        "workdir": workdir,
+        "db_mb": round(os.path.getsize(db) / 2 ** 20, 1),
+        "seed_s": round(seeded, 2),
+        "budget_s": budget,
+        "fresh_db": fresh,
+        "large_db": large,
+        "within_budget": large["total"] <= budget,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
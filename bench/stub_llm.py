@@ -0,0 +1,237 @@
+# bench/stub_llm.py
+# OpenAI-compatible /v1/chat/completions stub for benchmarks. Answers after a configurable
+# latency, plain or as an SSE stream, and counts what it served. Also stands in for the
+# Batch API (/v1/files, /v1/batches): a batch completes batch_latency seconds after creation,
+# with batch_error_rate of its lines answered by an error instead.
+
+import json
+import time
+import uuid
+import random
+import threading
+from email import policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple
+
+class StubLLM:
+    def __init__(self, latency: float = 0.8, jitter: float = 0.2, stream_chunks: int = 8,
+                 reply_words: int = 120, error_rate: float = 0.0, batch_latency: float = 1.0,
+                 batch_error_rate: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.stream_chunks = stream_chunks
+        self.reply_words = reply_words
+        self.error_rate = error_rate
+        self.batch_latency = batch_latency
+        self.batch_error_rate = batch_error_rate
+        self._lock = threading.Lock()
+        self._files: Dict[str, bytes] = {}
+        self._batches: Dict[str, dict] = {}
+        self._batch_started: Dict[str, float] = {}
+        self.batches = 0
+        self.batch_requests = 0
+        self.batch_errors = 0
+        self.requests = 0
+        self.errors = 0
+        self.inflight = 0
+        self.peak_inflight = 0
+        self.prompt_chars = 0
+        self.abandoned = 0
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "StubLLM":
+        threading.Thread(target=self._server.serve_forever, name="stub-llm", daemon=True).start()
+        return self
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "peak_inflight": self.peak_inflight,
+            "prompt_chars": self.prompt_chars,
+            "abandoned": self.abandoned,
+            "batches": self.batches,
+            "batch_requests": self.batch_requests,
+            "batch_errors": self.batch_errors,
+        }
+
+    def _delay(self) -> float:
+        return max(0.0, random.gauss(self.latency, self.jitter)) if self.jitter else self.latency
+
+    def _reply(self, req: dict) -> Tuple[str, dict]:
+        prompt = sum(len(m.get("content") or "") for m in req.get("messages", []))
+        words = min(self.reply_words, req.get("max_tokens") or self.reply_words)
+        text = "**Summary**\n" + " ".join(f"word{i}" for i in range(words))
+        return text, {"prompt_tokens": prompt // 4, "completion_tokens": words, "total_tokens": prompt // 4 + words}
+
+    def _batch_view(self, batch: dict) -> dict:
+        # Runs the batch the first time it is looked at after batch_latency has passed.
+        with self._lock:
+            if batch["status"] == "in_progress" and time.time() - self._batch_started[batch["id"]] >= self.batch_latency:
+                out = []
+                for line in self._files[batch["input_file_id"]].decode().splitlines():
+                    if not line.strip():
+                        continue
+                    row = json.loads(line)
+                    self.batch_requests += 1
+                    if self.batch_error_rate and random.random() < self.batch_error_rate:
+                        self.batch_errors += 1
+                        out.append(json.dumps({
+                            "id": f"batch_req_{uuid.uuid4().hex[:12]}", "custom_id": row["custom_id"],
+                            "response": {"status_code": 500, "body": {"error": {"message": "stub failure"}}},
+                            "error": None,
+                        }))
+                        continue
+                    text, usage = self._reply(row["body"])
+                    out.append(json.dumps({
+                        "id": f"batch_req_{uuid.uuid4().hex[:12]}", "custom_id": row["custom_id"], "error": None,
+                        "response": {"status_code": 200, "body": {
+                            "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()),
+                            "model": row["body"].get("model", "stub"), "usage": usage,
+                            "choices": [{"index": 0, "finish_reason": "stop",
+                                         "message": {"role": "assistant", "content": text}}],
+                        }},
+                    }))
+                file_id = f"file-{uuid.uuid4().hex[:12]}"
+                self._files[file_id] = ("\n".join(out) + "\n").encode()
+                batch.update(status="completed", output_file_id=file_id, completed_at=int(time.time()))
+            return dict(batch)
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _json(self, status: int, body: dict):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", "0")))
+                if self.path.endswith("/files"):
+                    return self._upload(body)
+                if self.path.endswith("/batches"):
+                    return self._create_batch(json.loads(body or b"{}"))
+                req = json.loads(body or b"{}")
+                prompt = sum(len(m.get("content") or "") for m in req.get("messages", []))
+                with stub._lock:
+                    stub.requests += 1
+                    stub.prompt_chars += prompt
+                    stub.inflight += 1
+                    stub.peak_inflight = max(stub.peak_inflight, stub.inflight)
+                try:
+                    self._serve(req, prompt)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client gave up: a cancelled hedge or an attempt past its deadline.
+                    with stub._lock:
+                        stub.abandoned += 1
+                    self.close_connection = True
+                finally:
+                    with stub._lock:
+                        stub.inflight -= 1
+
+            def _serve(self, req: dict, prompt: int):
+                delay = stub._delay()
+                if stub.error_rate and random.random() < stub.error_rate:
+                    time.sleep(delay / 2)
+                    with stub._lock:
+                        stub.errors += 1
+                    return self._json(500, {"error": {"message": "stub failure", "type": "server_error"}})
+
+                text, usage = stub._reply(req)
+                base = {"id": "chatcmpl-stub", "created": int(time.time()), "model": req.get("model", "stub")}
+
+                if not req.get("stream"):
+                    time.sleep(delay)
+                    return self._json(200, dict(base, object="chat.completion", usage=usage, choices=[{
+                        "index": 0, "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": text},
+                    }]))
+
+                # First token after ~30% of the latency, the rest spread evenly.
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                n = max(1, stub.stream_chunks)
+                step = -(-len(text) // n)
+                time.sleep(delay * 0.3)
+                for i in range(n):
+                    piece = text[i * step:(i + 1) * step]
+                    self._event(dict(base, object="chat.completion.chunk", choices=[{
+                        "index": 0, "delta": {"content": piece}, "finish_reason": "stop" if i == n - 1 else None,
+                    }]))
+                    time.sleep(delay * 0.7 / n)
+                if (req.get("stream_options") or {}).get("include_usage"):
+                    self._event(dict(base, object="chat.completion.chunk", choices=[], usage=usage))
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+            def do_GET(self):
+                parts = self.path.rstrip("/").split("/")
+                if len(parts) >= 2 and parts[-2] == "batches" and parts[-1] in stub._batches:
+                    return self._json(200, stub._batch_view(stub._batches[parts[-1]]))
+                if parts[-1] == "content" and parts[-2] in stub._files:
+                    data = stub._files[parts[-2]]
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/octet-stream")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                    return
+                self._json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+
+            def _upload(self, body: bytes):
+                # multipart/form-data with a `file` part and a `purpose` field.
+                msg = BytesParser(policy=policy.default).parsebytes(
+                    b"Content-Type: " + self.headers["Content-Type"].encode() + b"\r\n\r\n" + body
+                )
+                data = b""
+                filename = "upload.jsonl"
+                for part in msg.iter_parts():
+                    if part.get_param("name", header="content-disposition") == "file":
+                        data = part.get_payload(decode=True)
+                        filename = part.get_filename() or filename
+                file_id = f"file-{uuid.uuid4().hex[:12]}"
+                with stub._lock:
+                    stub._files[file_id] = data
+                self._json(200, {"id": file_id, "object": "file", "bytes": len(data), "created_at": int(time.time()),
+                                 "filename": filename, "purpose": "batch", "status": "processed"})
+
+            def _create_batch(self, req: dict):
+                batch_id = f"batch_{uuid.uuid4().hex[:12]}"
+                batch = {"id": batch_id, "object": "batch", "endpoint": req.get("endpoint", "/v1/chat/completions"),
+                         "input_file_id": req["input_file_id"], "completion_window": req.get("completion_window", "24h"),
+                         "status": "in_progress", "created_at": int(time.time()), "output_file_id": None,
+                         "error_file_id": None}
+                with stub._lock:
+                    stub._batches[batch_id] = batch
+                    stub._batch_started[batch_id] = time.time()
+                    stub.batches += 1
+                self._json(200, dict(batch))
+
+            def _event(self, obj: dict):
+                self.wfile.write(b"data: " + json.dumps(obj).encode() + b"\n\n")
+                self.wfile.flush()
+
+        return Handler
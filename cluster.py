@@ -0,0 +1,550 @@
+# cluster.py
+# Cluster mode: one coordinator process owns everything that has to be global (LLM slots,
+# cooldowns and quotas, SQLite writes) and serves it over a Unix socket to worker processes,
+# each running an AutoShardedBot for a contiguous range of shards.
+#
+# Protocol: one JSON object per line. Requests carry an "id" and get exactly one reply
+# ({"id", "ok", "result"|"error"}); acquire may also get {"id", "event": "wait"} pushes.
+# Frames without an id are fire-and-forget. Every second the coordinator also pushes
+# {"event": "scheduler"} with the global queue, so workers can shed load on real numbers.
+#
+# The socket carries raw SQL, so it lives in a directory only our uid can enter, is itself
+# 0600, and the coordinator drops any peer whose credentials show a different uid.
+
+import os
+import sys
+import json
+import stat
+import time
+import signal
+import socket
+import struct
+import asyncio
+import tempfile
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import discord
+
+from scheduler import FairScheduler, QueueTimeout, WaitCallback
+from quota import QuotaGate
+from storage import Storage
+
+class CoordinatorError(Exception):
+    pass
+
+def _check_private_dir(path: str):
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise CoordinatorError(f"{path} must be a directory owned by uid {os.getuid()} with mode 0700")
+
+def default_socket_path() -> str:
+    # One socket per coordinator, under $XDG_RUNTIME_DIR or a per-user dir in the temp dir.
+    base = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    d = os.path.join(base, f"backscroll-{os.getuid()}")
+    try:
+        os.makedirs(d, mode=0o700, exist_ok=True)
+        _check_private_dir(d)
+    except OSError as e:
+        raise CoordinatorError(f"can't set up runtime dir {d}: {e}") from e
+    return os.path.join(d, f"coordinator-{os.getpid()}.sock")
+
+def _peer_uid(writer: asyncio.StreamWriter) -> Optional[int]:
+    sock = writer.get_extra_info("socket")
+    if sock is None or not hasattr(socket, "SO_PEERCRED"):
+        return None
+    _pid, uid, _gid = struct.unpack("3i", sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")))
+    return uid
+
+def shard_ranges(shard_count: int, workers: int) -> List[List[int]]:
+    workers = max(1, min(workers, shard_count))
+    base, extra = divmod(shard_count, workers)
+    out, start = [], 0
+    for i in range(workers):
+        n = base + (1 if i < extra else 0)
+        out.append(list(range(start, start + n)))
+        start += n
+    return out
+
+async def recommended_shards(token: str) -> int:
+    http = discord.http.HTTPClient(asyncio.get_running_loop())
+    try:
+        await http.static_login(token)
+        shards, _url, _limits = await http.get_bot_gateway()
+        return int(shards)
+    finally:
+        await http.close()
+
+class Coordinator:
+    def __init__(self, path: str, storage: Storage, scheduler: FairScheduler, gate: QuotaGate):
+        self.path = path
+        self.storage = storage
+        self.scheduler = scheduler
+        self.gate = gate
+        self.workers: Dict[int, asyncio.subprocess.Process] = {}
+        self.connections = 0
+        self.requests = 0
+        self.snapshot_interval = 1.0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._peers: Set[Callable[[dict], None]] = set()
+        self._snapshots: Optional[asyncio.Task] = None
+
+    async def start(self):
+        try:
+            _check_private_dir(os.path.dirname(os.path.abspath(self.path)))
+            try:
+                st = os.lstat(self.path)
+            except FileNotFoundError:
+                pass
+            else:
+                # Only clear a stale socket of ours; anything else at that path is a mistake.
+                if not stat.S_ISSOCK(st.st_mode) or st.st_uid != os.getuid():
+                    raise CoordinatorError(f"{self.path} exists and isn't our socket")
+                os.unlink(self.path)
+            self._server = await asyncio.start_unix_server(self._serve, path=self.path, limit=16 * 1024 * 1024)
+            os.chmod(self.path, 0o600)
+        except OSError as e:
+            raise CoordinatorError(f"can't listen on {self.path}: {e}") from e
+        self._snapshots = asyncio.create_task(self._push_snapshots())
+
+    async def _push_snapshots(self):
+        while True:
+            await asyncio.sleep(self.snapshot_interval)
+            s = self.scheduler.stats()
+            msg = {"event": "scheduler", "queued": s["queued"], "running": s["running"],
+                   "avg_service": s["avg_service"]}
+            for send in list(self._peers):
+                send(msg)
+
+    async def close(self):
+        if self._snapshots is not None:
+            self._snapshots.cancel()
+            self._snapshots = None
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+    def healthy(self) -> bool:
+        return bool(self.workers) and all(p.returncode is None for p in self.workers.values())
+
+    async def stats(self) -> Dict[str, Any]:
+        return {
+            "scheduler": self.scheduler.stats(),
+            "quota": await self.gate.stats(),
+            "storage": {
+                "pending": self.storage.pending(),
+                "writes": self.storage.writes_committed,
+                "errors": self.storage.write_errors,
+            },
+            "connections": self.connections,
+            "workers_alive": sum(1 for p in self.workers.values() if p.returncode is None),
+        }
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        uid = _peer_uid(writer)
+        if uid is not None and uid != os.getuid():
+            print(f"⚠️ coordinator: refusing a connection from uid {uid}")
+            writer.close()
+            return
+        self.connections += 1
+        granted: Dict[int, Any] = {}
+        waiting: Dict[int, asyncio.Task] = {}
+
+        def send(obj: dict):
+            if not writer.is_closing():
+                writer.write(json.dumps(obj, separators=(",", ":")).encode() + b"\n")
+
+        self._peers.add(send)
+        async def run(rid: int, coro: Awaitable[Any]):
+            try:
+                send({"id": rid, "ok": True, "result": await coro})
+            except QueueTimeout:
+                send({"id": rid, "ok": False, "error": "QueueTimeout"})
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                send({"id": rid, "ok": False, "error": f"{type(e).__name__}: {e}"})
+
+        async def acquire(rid: int, msg: dict) -> float:
+            async def on_wait(position: int, eta: float):
+                send({"id": rid, "event": "wait", "position": position, "eta": eta})
+            t = await self.scheduler.acquire(msg["guild_id"], msg["channel_id"], msg.get("cost", 1),
+                                             msg.get("timeout"), on_wait)
+            granted[rid] = t
+            return t.started_at - t.enqueued_at
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                msg = json.loads(line)
+                op = msg["op"]
+                rid = msg.get("id")
+                self.requests += 1
+
+                # Writes and releases are handled inline so they keep their order on the wire.
+                if op == "write":
+                    self.storage.write(msg["sql"], tuple(msg.get("params") or ()))
+                elif op == "release":
+                    t = granted.pop(msg["ticket"], None)
+                    if t is not None:
+                        self.scheduler.release(t)
+                elif op == "cancel":
+                    task = waiting.pop(msg["ticket"], None)
+                    if task is not None:
+                        task.cancel()
+                elif op == "charge":
+                    self.gate.charge(msg["guild_id"], msg["user_id"], msg["charge_user"], msg["ts"], msg["day_key"])
+                elif op == "acquire":
+                    task = asyncio.create_task(run(rid, acquire(rid, msg)))
+                    waiting[rid] = task
+                    task.add_done_callback(lambda _t, rid=rid: waiting.pop(rid, None))
+                elif op == "read":
+                    asyncio.create_task(run(rid, self.storage.read(msg["sql"], tuple(msg.get("params") or ()))))
+                elif op == "read_one":
+                    asyncio.create_task(run(rid, self.storage.read_one(msg["sql"], tuple(msg.get("params") or ()))))
+                elif op == "flush":
+                    asyncio.create_task(run(rid, self.storage.flush()))
+                elif op == "admit":
+                    asyncio.create_task(run(rid, self.gate.admit(
+                        msg["guild_id"], msg["user_id"], msg["check_user"], msg["now"], msg["day_key"]
+                    )))
+                elif op == "stats":
+                    asyncio.create_task(run(rid, self.stats()))
+                elif rid is not None:
+                    send({"id": rid, "ok": False, "error": f"unknown op {op!r}"})
+                await writer.drain()
+        except (ConnectionError, json.JSONDecodeError) as e:
+            print(f"⚠️ coordinator: dropping worker connection: {e}")
+        except asyncio.CancelledError:
+            pass  # shutting down
+        finally:
+            # A worker that goes away must not keep LLM slots or queue positions.
+            for task in list(waiting.values()):
+                task.cancel()
+            for t in granted.values():
+                self.scheduler.release(t)
+            self._peers.discard(send)
+            self.connections -= 1
+            writer.close()
+
+    async def supervise(self, script: str, workers: int, shard_count: int, base_port: int,
+                        stop: asyncio.Event, restart_delay: float = 5.0):
+        ranges = shard_ranges(shard_count, workers)
+        print(f"✅ Cluster: {len(ranges)} workers for {shard_count} shards")
+
+        async def spawn(i: int) -> asyncio.subprocess.Process:
+            env = dict(os.environ)
+            env.update({
+                "CLUSTER_ROLE": "worker",
+                "CLUSTER_SOCKET": self.path,
+                "CLUSTER_WORKER_INDEX": str(i),
+                "CLUSTER_SHARD_IDS": ",".join(map(str, ranges[i])),
+                "CLUSTER_SHARD_COUNT": str(shard_count),
+                "PORT": str(base_port + 1 + i),
+            })
+            return await asyncio.create_subprocess_exec(sys.executable, script, env=env)
+
+        for i in range(len(ranges)):
+            self.workers[i] = await spawn(i)
+            # IDENTIFY is rate limited per bucket; don't start every worker at once.
+            await asyncio.sleep(1)
+
+        waits = {asyncio.create_task(p.wait()): i for i, p in self.workers.items()}
+        stopper = asyncio.create_task(stop.wait())
+        try:
+            while not stop.is_set():
+                done, _ = await asyncio.wait(set(waits) | {stopper}, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task is stopper:
+                        continue
+                    i = waits.pop(task)
+                    print(f"⚠️ Cluster worker {i} exited with {task.result()}; restarting in {restart_delay:.0f}s")
+                    await asyncio.sleep(restart_delay)
+                    if stop.is_set():
+                        break
+                    self.workers[i] = await spawn(i)
+                    waits[asyncio.create_task(self.workers[i].wait())] = i
+        finally:
+            stopper.cancel()
+            for p in self.workers.values():
+                if p.returncode is None:
+                    p.send_signal(signal.SIGTERM)
+            for p in self.workers.values():
+                try:
+                    await asyncio.wait_for(p.wait(), 20)
+                except asyncio.TimeoutError:
+                    p.kill()
+
+class CoordinatorClient:
+    def __init__(self, path: str):
+        self.path = path
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._events: Dict[int, Callable[[dict], None]] = {}
+        self._pushes: Dict[str, Callable[[dict], None]] = {}
+        self._backlog: List[bytes] = []
+        self._next_id = 0
+        self._closed = False
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    def backlog(self) -> int:
+        return len(self._backlog)
+
+    def on_push(self, event: str, cb: Callable[[dict], None]):
+        # For id-less {"event": ...} frames the coordinator sends on its own.
+        self._pushes[event] = cb
+
+    def new_id(self) -> int:
+        self._next_id += 1
+        return self._next_id
+
+    async def connect(self, attempts: int = 30):
+        for n in range(attempts):
+            try:
+                reader, self._writer = await asyncio.open_unix_connection(self.path, limit=16 * 1024 * 1024)
+                break
+            except (FileNotFoundError, ConnectionError):
+                if n == attempts - 1:
+                    raise
+                await asyncio.sleep(min(5.0, 0.2 * 2 ** n))
+        self._reader_task = asyncio.create_task(self._read(reader))
+        backlog, self._backlog = self._backlog, []
+        for frame in backlog:
+            self._writer.write(frame)
+
+    async def close(self):
+        self._closed = True
+        if self._writer is not None:
+            self._writer.close()
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+
+    async def _read(self, reader: asyncio.StreamReader):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                msg = json.loads(line)
+                rid = msg.get("id")
+                if "event" in msg:
+                    cb = self._events.get(rid) if rid is not None else self._pushes.get(msg["event"])
+                    if cb is not None:
+                        cb(msg)
+                    continue
+                fut = self._pending.pop(rid, None)
+                if fut is None or fut.done():
+                    continue
+                if msg.get("ok"):
+                    fut.set_result(msg.get("result"))
+                elif msg.get("error") == "QueueTimeout":
+                    fut.set_exception(QueueTimeout())
+                else:
+                    fut.set_exception(CoordinatorError(msg.get("error")))
+        finally:
+            self._writer = None
+            for fut in self._pending.values():
+                if not fut.done():
+                    fut.set_exception(CoordinatorError("coordinator connection lost"))
+            self._pending.clear()
+            if not self._closed:
+                asyncio.get_running_loop().create_task(self._reconnect())
+
+    async def _reconnect(self):
+        print("⚠️ Lost the coordinator connection; reconnecting")
+        try:
+            await self.connect(attempts=60)
+        except Exception as e:
+            print(f"❌ Could not reconnect to the coordinator: {e}")
+
+    def send(self, op: str, **fields):
+        frame = json.dumps(dict(fields, op=op), separators=(",", ":")).encode() + b"\n"
+        if self.connected:
+            self._writer.write(frame)
+        else:
+            self._backlog.append(frame)
+
+    async def request(self, op: str, rid: Optional[int] = None,
+                      on_event: Optional[Callable[[dict], None]] = None, **fields) -> Any:
+        if not self.connected:
+            raise CoordinatorError("not connected to the coordinator")
+        rid = rid or self.new_id()
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[rid] = fut
+        if on_event is not None:
+            self._events[rid] = on_event
+        try:
+            self.send(op, id=rid, **fields)
+            return await fut
+        finally:
+            self._pending.pop(rid, None)
+            self._events.pop(rid, None)
+
+class RemoteStorage:
+    # The slice of Storage the bot uses, forwarded to the coordinator's storage thread.
+    def __init__(self, client: CoordinatorClient):
+        self._client = client
+        self.writes_committed = 0
+        self.write_errors = 0
+
+    def start(self):
+        pass
+
+    def close(self):
+        pass
+
+    def pending(self) -> int:
+        return self._client.backlog()
+
+    def write(self, sql: str, params: Tuple = ()):
+        self._client.send("write", sql=sql, params=list(params))
+        self.writes_committed += 1
+
+    async def read(self, sql: str, params: Tuple = ()) -> List[list]:
+        return await self._client.request("read", sql=sql, params=list(params))
+
+    async def read_one(self, sql: str, params: Tuple = ()) -> Optional[list]:
+        return await self._client.request("read_one", sql=sql, params=list(params))
+
+    async def flush(self):
+        await self._client.request("flush")
+
+    async def call(self, fn):
+        raise CoordinatorError("storage.call runs on the coordinator only")
+
+class RemoteTicket:
+    __slots__ = ("rid", "guild_id", "channel_id", "enqueued_at", "started_at")
+
+    def __init__(self, rid: int, guild_id: int, channel_id: int):
+        self.rid = rid
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.enqueued_at = time.monotonic()
+        self.started_at = 0.0
+
+class RemoteScheduler:
+    # Same acquire/release/slot surface as FairScheduler; admission happens on the coordinator.
+    # running, queued and avg_service come from the coordinator's latest snapshot of the whole
+    # cluster, and fall back to this worker's own counts when that is stale.
+    def __init__(self, client: CoordinatorClient, concurrency: int, snapshot_ttl: float = 5.0):
+        self._client = client
+        self.concurrency = concurrency
+        self.snapshot_ttl = snapshot_ttl
+        self._running = 0
+        self._queued = 0
+        self._snapshot: Dict[str, float] = {}
+        self._snapshot_at = 0.0
+        self.granted = 0
+        self.timed_out = 0
+        self.cancelled = 0
+        self.total_wait = 0.0
+        client.on_push("scheduler", self._on_snapshot)
+
+    def _on_snapshot(self, msg: dict):
+        self._snapshot = msg
+        self._snapshot_at = time.monotonic()
+
+    def _global(self, key: str, local: float) -> float:
+        if time.monotonic() - self._snapshot_at > self.snapshot_ttl:
+            return local
+        # Our own changes since the snapshot aren't in it yet.
+        return max(self._snapshot.get(key, 0), local)
+
+    @property
+    def running(self) -> int:
+        return int(self._global("running", self._running))
+
+    @property
+    def queued(self) -> int:
+        return int(self._global("queued", self._queued))
+
+    async def acquire(self, guild_id: int, channel_id: int, cost: int = 1, timeout: Optional[float] = None,
+                      on_wait: Optional[WaitCallback] = None) -> RemoteTicket:
+        t = RemoteTicket(self._client.new_id(), guild_id, channel_id)
+
+        def on_event(msg: dict):
+            if on_wait is not None:
+                asyncio.get_running_loop().create_task(on_wait(msg["position"], msg["eta"]))
+
+        self._queued += 1
+        try:
+            waited = await self._client.request("acquire", rid=t.rid, on_event=on_event, guild_id=guild_id,
+                                                channel_id=channel_id, cost=cost, timeout=timeout)
+        except QueueTimeout:
+            self.timed_out += 1
+            raise
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            self._client.send("cancel", ticket=t.rid)
+            self._client.send("release", ticket=t.rid)
+            raise
+        finally:
+            self._queued -= 1
+        t.started_at = time.monotonic()
+        t.enqueued_at = t.started_at - waited
+        self._running += 1
+        self.granted += 1
+        self.total_wait += waited
+        return t
+
+    def release(self, t: RemoteTicket):
+        self._running -= 1
+        self._client.send("release", ticket=t.rid)
+
+    def slot(self, guild_id: int, channel_id: int, cost: int = 1, timeout: Optional[float] = None,
+             on_wait: Optional[WaitCallback] = None) -> "_RemoteSlot":
+        return _RemoteSlot(self, guild_id, channel_id, cost, timeout, on_wait)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "running": self.running,
+            "queued": self.queued,
+            "guilds_waiting": 0,
+            "granted": self.granted,
+            "timed_out": self.timed_out,
+            "cancelled": self.cancelled,
+            "avg_wait": round(self.total_wait / self.granted, 3) if self.granted else 0.0,
+            # 0.0 lets callers fall back to their own estimate.
+            "avg_service": self._global("avg_service", 0.0),
+        }
+
+class _RemoteSlot:
+    def __init__(self, sched: RemoteScheduler, guild_id: int, channel_id: int, cost: int,
+                 timeout: Optional[float], on_wait: Optional[WaitCallback]):
+        self._sched = sched
+        self._args = (guild_id, channel_id, cost, timeout, on_wait)
+        self._ticket: Optional[RemoteTicket] = None
+
+    async def __aenter__(self) -> RemoteTicket:
+        self._ticket = await self._sched.acquire(*self._args)
+        return self._ticket
+
+    async def __aexit__(self, *exc):
+        self._sched.release(self._ticket)
+        return False
+
+class RemoteQuotaGate:
+    def __init__(self, client: CoordinatorClient):
+        self._client = client
+
+    async def admit(self, guild_id: int, user_id: int, check_user: bool, now: int, day_key: str) -> Tuple[str, int]:
+        verdict, value = await self._client.request("admit", guild_id=guild_id, user_id=user_id,
+                                                    check_user=check_user, now=now, day_key=day_key)
+        return verdict, value
+
+    def charge(self, guild_id: int, user_id: int, charge_user: bool, ts: int, day_key: str):
+        self._client.send("charge", guild_id=guild_id, user_id=user_id, charge_user=charge_user,
+                          ts=ts, day_key=day_key)
+
+    async def stats(self) -> Dict[str, int]:
+        return (await self._client.request("stats"))["quota"]
@@ -0,0 +1,113 @@
+# compaction.py
+# Shrinks a chat transcript before it goes to the LLM: merges runs by the same author,
+# replaces markup with short placeholders, collapses duplicates and long code blocks,
+# and drops the least informative lines when over a token budget.
+
+import re
+from typing import List, Sequence, Tuple
+
+_CODE_BLOCK = re.compile(r"```(?:[\w+-]*\n)?(.*?)```", re.S)
+_URL = re.compile(r"https?://(?:www\.)?([^/\s]+)\S*")
+_CUSTOM_EMOJI = re.compile(r"<a?:(\w+):\d+>")
+_USER_MENTION = re.compile(r"<@!?\d+>")
+_ROLE_MENTION = re.compile(r"<@&\d+>")
+_CHANNEL_MENTION = re.compile(r"<#\d+>")
+_TIMESTAMP = re.compile(r"<t:\d+(?::\w)?>")
+_SPACES = re.compile(r"\s+")
+_WORD = re.compile(r"\w+")
+
+CODE_BLOCK_MAX_CHARS = 160
+
+def estimate_tokens(text: str) -> int:
+    # ~4 chars/token for Latin text, ~2 for everything else (Arabic, Cyrillic, CJK, emoji)
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return ascii_chars // 4 + (len(text) - ascii_chars) // 2 + 1
+
+class CompactionResult:
+    __slots__ = ("text", "chars_before", "chars_after", "tokens_before", "tokens_after", "dropped")
+
+    def __init__(self, text: str, chars_before: int, tokens_before: int, dropped: int):
+        self.text = text
+        self.chars_before = chars_before
+        self.chars_after = len(text)
+        self.tokens_before = tokens_before
+        self.tokens_after = estimate_tokens(text)
+        self.dropped = dropped
+
+    @property
+    def chars_saved(self) -> int:
+        return self.chars_before - self.chars_after
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+def _collapse_code(m: "re.Match") -> str:
+    body = m.group(1)
+    if len(body) <= CODE_BLOCK_MAX_CHARS:
+        return "`" + _SPACES.sub(" ", body).strip() + "`"
+    lines = body.strip().count("\n") + 1
+    first = body.strip().split("\n", 1)[0][:60]
+    return f"[code, {lines} lines: {first}…]"
+
+def compact_text(content: str) -> str:
+    text = _CODE_BLOCK.sub(_collapse_code, content)
+    text = _URL.sub(r"<link:\1>", text)
+    text = _CUSTOM_EMOJI.sub(r":\1:", text)
+    text = _USER_MENTION.sub("@user", text)
+    text = _ROLE_MENTION.sub("@role", text)
+    text = _CHANNEL_MENTION.sub("#channel", text)
+    text = _TIMESTAMP.sub("<time>", text)
+    return _SPACES.sub(" ", text).strip()
+
+def _info_score(text: str) -> int:
+    return len(set(w.lower() for w in _WORD.findall(text)))
+
+def compact_transcript(messages: Sequence[Tuple[int, str, str]], budget_tokens: int) -> CompactionResult:
+    # messages: (author_id, author_name, content), oldest first. Authors are told apart by id:
+    # two people may share a display name, and two people saying the same thing both count.
+    raw_lines = []
+    frags: List[Tuple[int, str, str]] = []
+    seen = set()
+    for author_id, name, content in messages:
+        flat = content.replace("\n", " ").replace("\r", " ").strip()
+        raw_lines.append(f"{name}: {flat}")
+
+        text = compact_text(content)
+        if not text:
+            continue
+        if frags and frags[-1][0] == author_id and frags[-1][2] == text:
+            continue
+        # A long-ish line someone posts over and over (spam, copypasta) only needs to appear once.
+        if len(text) > 20:
+            key = (author_id, text.lower())
+            if key in seen:
+                continue
+            seen.add(key)
+        frags.append((author_id, name, text))
+    raw = "\n".join(raw_lines)
+
+    dropped = 0
+    total = sum(estimate_tokens(t) + 2 for _, _, t in frags)
+    if total > budget_tokens:
+        # Least informative first (fewest distinct words), oldest first among equals.
+        order = sorted(range(len(frags)), key=lambda i: (_info_score(frags[i][2]), i))
+        drop = set()
+        for i in order:
+            if total <= budget_tokens:
+                break
+            total -= estimate_tokens(frags[i][2]) + 2
+            drop.add(i)
+        frags = [f for i, f in enumerate(frags) if i not in drop]
+        dropped = len(drop)
+
+    lines: List[str] = []
+    last_author = None
+    for author_id, name, text in frags:
+        if author_id == last_author:
+            lines[-1] += f" / {text}"
+        else:
+            lines.append(f"{name}: {text}")
+            last_author = author_id
+
+    return CompactionResult("\n".join(lines), len(raw), estimate_tokens(raw), dropped)
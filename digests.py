@@ -0,0 +1,264 @@
+# digests.py
+# Opt-in hourly/daily channel digests. Subscriptions live in metrics.db; due channels are
+# collected while the bot is quiet and summarized through the Batch API in one submission,
+# and the results are posted when the batch completes. Pending batches survive restarts.
+
+import io
+import json
+from datetime import datetime, tzinfo
+from typing import Dict, List, Optional, Sequence, Tuple
+
+HOURLY = "hourly"
+DAILY = "daily"
+PERIOD_SECONDS = {HOURLY: 3600, DAILY: 86400}
+
+# Batch states after which nothing more will happen.
+FINISHED = ("completed", "failed", "expired", "cancelled")
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS digest_subscriptions (
+        guild_id TEXT NOT NULL,
+        channel_id TEXT NOT NULL,
+        period TEXT NOT NULL,
+        created_by TEXT,
+        created_at INTEGER NOT NULL,
+        last_run INTEGER NOT NULL DEFAULT 0,
+        last_message_id TEXT NOT NULL DEFAULT '',
+        pending_batch TEXT NOT NULL DEFAULT '',
+        PRIMARY KEY (guild_id, channel_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS digest_batches (
+        batch_id TEXT PRIMARY KEY,
+        owner TEXT NOT NULL,
+        submitted_at INTEGER NOT NULL,
+        status TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS digest_items (
+        batch_id TEXT NOT NULL,
+        guild_id TEXT NOT NULL,
+        channel_id TEXT NOT NULL,
+        since_ts INTEGER NOT NULL,
+        last_message_id TEXT NOT NULL,
+        message_count INTEGER NOT NULL,
+        PRIMARY KEY (batch_id, channel_id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_digest_batches_owner ON digest_batches(owner, status)",
+]
+
+def ensure_schema(conn):
+    for sql in SCHEMA:
+        conn.execute(sql)
+
+# Added to digest_subscriptions by a later migration.
+RETRY_COLUMNS = [("attempts", "INTEGER NOT NULL DEFAULT 0"), ("retry_at", "INTEGER NOT NULL DEFAULT 0")]
+
+class Subscription:
+    __slots__ = ("guild_id", "channel_id", "period", "last_run", "last_message_id", "pending_batch",
+                 "attempts", "retry_at")
+
+    def __init__(self, guild_id: int, channel_id: int, period: str, last_run: int,
+                 last_message_id: Optional[int], pending_batch: str, attempts: int = 0, retry_at: int = 0):
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.period = period
+        self.last_run = last_run
+        self.last_message_id = last_message_id
+        self.pending_batch = pending_batch
+        self.attempts = attempts
+        self.retry_at = retry_at
+
+    def is_due(self, now: int, quiet: bool, tz: tzinfo) -> bool:
+        if self.pending_batch or now < self.retry_at:
+            return False
+        if self.period == HOURLY:
+            return now - self.last_run >= PERIOD_SECONDS[HOURLY]
+        # Daily digests go out once per local day, inside the quiet window.
+        return quiet and datetime.fromtimestamp(self.last_run, tz).date() != datetime.fromtimestamp(now, tz).date()
+
+class DigestItem:
+    __slots__ = ("guild_id", "channel_id", "since_ts", "last_message_id", "message_count")
+
+    def __init__(self, guild_id: int, channel_id: int, since_ts: int, last_message_id: int, message_count: int):
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.since_ts = since_ts
+        self.last_message_id = last_message_id
+        self.message_count = message_count
+
+def in_window(now: int, hours: Tuple[int, int], tz: tzinfo) -> bool:
+    # hours=(start, end) in local time; the window may wrap past midnight.
+    start, end = hours
+    h = datetime.fromtimestamp(now, tz).hour
+    return start <= h < end if start <= end else h >= start or h < end
+
+def parse_hours(text: str) -> Tuple[int, int]:
+    start, _, end = text.partition("-")
+    return int(start) % 24, int(end or start) % 24
+
+class DigestStore:
+    def __init__(self, storage, max_attempts: int = 4, retry_base: int = 600, retry_max: int = 21600):
+        # storage is a Storage or cluster.RemoteStorage; only read and write are used.
+        self._storage = storage
+        # A channel whose digest fails is retried after retry_base, doubling up to retry_max;
+        # after max_attempts failures in a row that window is given up.
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+
+    def add(self, guild_id: int, channel_id: int, period: str, user_id: int, now: int):
+        # A new subscription starts its first window now rather than digesting old history.
+        self._storage.write("""
+            INSERT INTO digest_subscriptions(guild_id, channel_id, period, created_by, created_at, last_run)
+            VALUES(?, ?, ?, ?, ?, ?)
+            ON CONFLICT(guild_id, channel_id) DO UPDATE SET period = excluded.period
+        """, (str(guild_id), str(channel_id), period, str(user_id), now, now))
+
+    def remove(self, guild_id: int, channel_id: int):
+        self._storage.write("DELETE FROM digest_subscriptions WHERE guild_id = ? AND channel_id = ?",
+                            (str(guild_id), str(channel_id)))
+
+    async def for_guild(self, guild_id: int) -> List[Subscription]:
+        return self._rows(await self._storage.read(
+            "SELECT guild_id, channel_id, period, last_run, last_message_id, pending_batch, attempts, retry_at "
+            "FROM digest_subscriptions WHERE guild_id = ? ORDER BY created_at", (str(guild_id),)
+        ))
+
+    async def all(self) -> List[Subscription]:
+        return self._rows(await self._storage.read(
+            "SELECT guild_id, channel_id, period, last_run, last_message_id, pending_batch, attempts, retry_at "
+            "FROM digest_subscriptions"
+        ))
+
+    @staticmethod
+    def _rows(rows) -> List[Subscription]:
+        return [Subscription(int(g), int(c), p, last_run or 0, int(m) if m else None, b or "", a or 0, r or 0)
+                for g, c, p, last_run, m, b, a, r in rows]
+
+    def record_batch(self, batch_id: str, owner: str, items: Sequence[DigestItem], now: int):
+        self._storage.write("INSERT INTO digest_batches(batch_id, owner, submitted_at, status) VALUES(?, ?, ?, ?)",
+                            (batch_id, owner, now, "submitted"))
+        for it in items:
+            self._storage.write("""
+                INSERT INTO digest_items(batch_id, guild_id, channel_id, since_ts, last_message_id, message_count)
+                VALUES(?, ?, ?, ?, ?, ?)
+            """, (batch_id, str(it.guild_id), str(it.channel_id), it.since_ts, str(it.last_message_id),
+                  it.message_count))
+            self._storage.write(
+                "UPDATE digest_subscriptions SET pending_batch = ? WHERE guild_id = ? AND channel_id = ?",
+                (batch_id, str(it.guild_id), str(it.channel_id))
+            )
+
+    async def open_batches(self, owner: str) -> List[str]:
+        rows = await self._storage.read(
+            "SELECT batch_id FROM digest_batches WHERE owner = ? AND status = 'submitted' ORDER BY submitted_at",
+            (owner,)
+        )
+        return [r[0] for r in rows]
+
+    async def items(self, batch_id: str) -> List[DigestItem]:
+        rows = await self._storage.read(
+            "SELECT guild_id, channel_id, since_ts, last_message_id, message_count FROM digest_items WHERE batch_id = ?",
+            (batch_id,)
+        )
+        return [DigestItem(int(g), int(c), s, int(m), n) for g, c, s, m, n in rows]
+
+    def done(self, item: DigestItem, now: int):
+        # The window is consumed: the next digest starts after the last message summarized.
+        self._storage.write("""
+            UPDATE digest_subscriptions SET last_run = ?, last_message_id = ?, pending_batch = '', attempts = 0,
+                retry_at = 0
+            WHERE guild_id = ? AND channel_id = ?
+        """, (now, str(item.last_message_id), str(item.guild_id), str(item.channel_id)))
+
+    def skipped(self, guild_id: int, channel_id: int, now: int):
+        self._storage.write("""
+            UPDATE digest_subscriptions SET last_run = ?, pending_batch = '', attempts = 0, retry_at = 0
+            WHERE guild_id = ? AND channel_id = ?
+        """, (now, str(guild_id), str(channel_id)))
+
+    def failed(self, guild_id: int, channel_id: int, now: int, last_message_id: Optional[int] = None):
+        # Backs the channel off exponentially. On the last attempt the window is given up as if it
+        # had been posted (past last_message_id when known), so one bad transcript can't keep
+        # failing forever. SET expressions all see the row as it was before the update.
+        n, give_up = self.max_attempts, "attempts + 1 >= ?"
+        self._storage.write(f"""
+            UPDATE digest_subscriptions SET
+                last_run = CASE WHEN {give_up} THEN ? ELSE last_run END,
+                last_message_id = CASE WHEN {give_up} THEN COALESCE(?, last_message_id) ELSE last_message_id END,
+                retry_at = CASE WHEN {give_up} THEN 0 ELSE ? + MIN(?, ? * (1 << attempts)) END,
+                attempts = CASE WHEN {give_up} THEN 0 ELSE attempts + 1 END,
+                pending_batch = ''
+            WHERE guild_id = ? AND channel_id = ?
+        """, (n, now, n, None if last_message_id is None else str(last_message_id), n, now, self.retry_max,
+              self.retry_base, n, str(guild_id), str(channel_id)))
+
+    def close_batch(self, batch_id: str, status: str):
+        # Channels still pointing at this batch (the caller has already marked each item done or
+        # failed) are released and will be collected again.
+        self._storage.write("UPDATE digest_batches SET status = ? WHERE batch_id = ?", (status, batch_id))
+        self._storage.write("UPDATE digest_subscriptions SET pending_batch = '' WHERE pending_batch = ?", (batch_id,))
+        self._storage.write("DELETE FROM digest_items WHERE batch_id = ?", (batch_id,))
+
+class BatchClient:
+    # Thin wrapper over the OpenAI Batch API (files + batches) on one llm_router.Route,
+    # one JSONL line per channel.
+    def __init__(self, route, completion_window: str = "24h"):
+        self.route = route
+        self.completion_window = completion_window
+
+    @property
+    def client(self):
+        return self.route.client
+
+    @property
+    def model(self) -> str:
+        return self.route.model
+
+    async def submit(self, requests: Sequence[Tuple[str, List[dict], int]]) -> str:
+        lines = [
+            json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {"model": self.model, "messages": messages, "temperature": 0.3, "max_tokens": max_tokens},
+            }, ensure_ascii=False)
+            for custom_id, messages, max_tokens in requests
+        ]
+        data = ("\n".join(lines) + "\n").encode("utf-8")
+        f = await self.client.files.create(file=("digests.jsonl", io.BytesIO(data)), purpose="batch")
+        batch = await self.client.batches.create(
+            input_file_id=f.id, endpoint="/v1/chat/completions", completion_window=self.completion_window
+        )
+        return batch.id
+
+    async def poll(self, batch_id: str) -> Tuple[str, Optional[str]]:
+        batch = await self.client.batches.retrieve(batch_id)
+        return batch.status, batch.output_file_id
+
+    async def results(self, file_id: str) -> Dict[str, Tuple[str, int]]:
+        # custom_id -> (text, total tokens); failed lines are left out.
+        content = await self.client.files.content(file_id)
+        out: Dict[str, Tuple[str, int]] = {}
+        for line in content.text.splitlines():
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            resp = row.get("response") or {}
+            if row.get("error") or resp.get("status_code") != 200:
+                continue
+            body = resp.get("body") or {}
+            try:
+                text = body["choices"][0]["message"]["content"].strip()
+            except (KeyError, IndexError, AttributeError):
+                continue
+            out[row["custom_id"]] = (text, (body.get("usage") or {}).get("total_tokens", 0))
+        return out
+
+def item_id(guild_id: int, channel_id: int) -> str:
+    return f"{guild_id}:{channel_id}"
@@ -0,0 +1,154 @@
+# event_log.py
+# Append-only JSON-lines event log written by a background thread. emit() only puts the
+# event on a bounded queue, so the event loop never touches the file; when the queue is full
+# the event is dropped and counted instead of blocking. The file is rotated by size and at
+# fixed time boundaries, optionally gzipped, and only the newest backups are kept.
+
+import os
+import glob
+import gzip
+import json
+import time
+import queue
+import shutil
+import threading
+from typing import Any, Dict, List, Optional
+
+_STOP = object()
+
+class EventLog:
+    def __init__(self, path: str, max_bytes: int = 50 * 2 ** 20, rotate_seconds: int = 86400,
+                 backups: int = 14, compress: bool = True, max_queue: int = 10000,
+                 flush_interval: float = 1.0, max_batch: int = 1000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.backups = backups
+        self.compress = compress
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._q: "queue.Queue[Any]" = queue.Queue(max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._f = None
+        self._period = 0
+
+        self.written = 0
+        self.dropped = 0
+        self.rotations = 0
+        self.write_errors = 0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="event-log", daemon=True)
+        self._thread.start()
+
+    def close(self, timeout: float = 5.0):
+        if self._thread is None:
+            return
+        try:
+            self._q.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+        self._thread = None
+
+    def pending(self) -> int:
+        return self._q.qsize()
+
+    def emit(self, event: str, **fields: Any) -> bool:
+        record = {"ts": int(time.time()), "event": event, **fields}
+        try:
+            self._q.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def _open(self):
+        d = os.path.dirname(self.path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self._f = open(self.path, "a", encoding="utf-8")
+        # Like a timed log handler: a file left by an earlier run belongs to the period it was last written in.
+        try:
+            since = os.path.getmtime(self.path)
+        except OSError:
+            since = time.time()
+        self._period = self._period_of(since)
+
+    def _period_of(self, ts: float) -> int:
+        return int(ts // self.rotate_seconds) if self.rotate_seconds > 0 else 0
+
+    def _due(self) -> bool:
+        if self._f is None:
+            return False
+        if self.max_bytes > 0 and self._f.tell() >= self.max_bytes:
+            return True
+        return self._f.tell() > 0 and self._period_of(time.time()) != self._period
+
+    def _rotate(self):
+        self._f.close()
+        self._f = None
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        target = f"{self.path}.{stamp}"
+        n = 1
+        while os.path.exists(target) or os.path.exists(target + ".gz"):
+            target = f"{self.path}.{stamp}-{n}"
+            n += 1
+        os.replace(self.path, target)
+        if self.compress:
+            with open(target, "rb") as src, gzip.open(target + ".gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(target)
+        self.rotations += 1
+        old = sorted(glob.glob(glob.escape(self.path) + ".*"), key=os.path.getmtime)
+        for p in old[:max(0, len(old) - self.backups)]:
+            os.remove(p)
+        self._open()
+
+    def _write(self, batch: List[Dict[str, Any]]):
+        try:
+            if self._f is None:
+                self._open()
+            elif self._due():
+                self._rotate()
+            self._f.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in batch))
+            self._f.flush()
+            self.written += len(batch)
+        except (OSError, TypeError, ValueError) as e:
+            self.write_errors += 1
+            print(f"⚠️ event log write failed: {e}")
+            if self._f is not None and self._f.closed:
+                self._f = None
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._q.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._q.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._write(batch)
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "written": self.written,
+            "dropped": self.dropped,
+            "pending": self.pending(),
+            "rotations": self.rotations,
+            "write_errors": self.write_errors,
+        }
@@ -0,0 +1,123 @@
+# export.py
+# Streams usage_events (and the retention archive) into CSV parts on disk, optionally
+# gzip-compressed, each part under the attachment size limit. Runs in a worker thread on
+# its own read-only connection.
+
+import io
+import os
+import csv
+import gzip
+import sqlite3
+import tempfile
+from datetime import datetime
+from typing import List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+HEADER = ["Guild", "Channel", "User", "UserID", "Command", "Timestamp"]
+SPOOL_MAX_MEMORY = 1024 * 1024
+GZIP_SLACK = 64  # stored-block headers and the gzip trailer
+
+_UNITS = {"m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+
+def parse_when(text: str, now: int, tz: ZoneInfo) -> int:
+    # "90m", "12h", "7d", "2w" (ago), a unix timestamp, or an ISO date/datetime in tz
+    t = text.strip().lower()
+    if t[:-1].isdigit() and t[-1:] in _UNITS:
+        return now - int(t[:-1]) * _UNITS[t[-1]]
+    if t.isdigit():
+        return int(t)
+    dt = datetime.fromisoformat(text.strip())
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=tz)
+    return int(dt.timestamp())
+
+class _Part:
+    def __init__(self, compress: bool):
+        self.raw = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+        self._gz = gzip.GzipFile(fileobj=self.raw, mode="wb", compresslevel=6) if compress else None
+        # write_through so every row reaches the compressor (or file) and can be counted.
+        self.text = io.TextIOWrapper(self._gz or self.raw, encoding="utf-8", newline="", write_through=True)
+        self.writer = csv.writer(self.text)
+        self.writer.writerow(HEADER)
+        self.rows = 0
+        self._synced = 0  # uncompressed offset of the last compressor flush
+
+    def full(self, limit: int) -> bool:
+        if self._gz is None:
+            return self.raw.tell() >= limit
+        # The compressor may still hold everything written since the last flush. Deflate
+        # doesn't grow data by more than a few bytes, so only flush once that could matter;
+        # flushing every row would cost ratio.
+        held = self._gz.tell() - self._synced
+        if self.raw.tell() + held + GZIP_SLACK < limit:
+            return False
+        self._gz.flush()
+        self._synced = self._gz.tell()
+        return self.raw.tell() + GZIP_SLACK >= limit
+
+    def close(self):
+        self.text.flush()
+        self.text.detach()
+        if self._gz is not None:
+            self._gz.close()
+        self.raw.seek(0)
+
+def _query(conn: sqlite3.Connection, has_archive: bool, since: int, until: int,
+           guild_id: Optional[str], command: Optional[str]):
+    where = "ts >= ? AND ts < ?"
+    params: list = [since, until]
+    if guild_id:
+        where += " AND guild_id = ?"
+        params.append(guild_id)
+    if command:
+        where += " AND command_name = ?"
+        params.append(command)
+
+    cols = "guild_name, channel_name, user_name, user_id, command_name, ts"
+    sql = f"SELECT {cols} FROM main.usage_events WHERE {where}"
+    if has_archive:
+        sql = f"SELECT {cols} FROM archive.usage_events WHERE {where} UNION ALL " + sql
+        params = params + params
+    return conn.execute(sql + " ORDER BY ts", params)
+
+def export_usage(db_path: str, archive_path: str, since: int, until: int, guild_id: Optional[str],
+                 command: Optional[str], compress: bool, part_limit: int,
+                 max_parts: int) -> Tuple[List[Tuple[str, tempfile.SpooledTemporaryFile]], int, bool]:
+    # Returns ([(filename, file)], total_rows, truncated)
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        has_archive = os.path.exists(archive_path)
+        if has_archive:
+            conn.execute("ATTACH DATABASE ? AS archive", (f"file:{archive_path}?mode=ro",))
+            has_archive = conn.execute(
+                "SELECT 1 FROM archive.sqlite_master WHERE type = 'table' AND name = 'usage_events'"
+            ).fetchone() is not None
+
+        ext = "csv.gz" if compress else "csv"
+        parts: List[_Part] = []
+        part = _Part(compress)
+        total = 0
+        truncated = False
+        for row in _query(conn, has_archive, since, until, guild_id, command):
+            if part.rows and part.full(part_limit):
+                part.close()
+                parts.append(part)
+                if len(parts) >= max_parts:
+                    truncated = True
+                    part = None
+                    break
+                part = _Part(compress)
+            part.writer.writerow(row)
+            part.rows += 1
+            total += 1
+        if part is not None and part.rows:
+            part.close()
+            parts.append(part)
+        elif part is not None:
+            part.raw.close()
+    finally:
+        conn.close()
+
+    if len(parts) == 1:
+        return [(f"usage.{ext}", parts[0].raw)], total, truncated
+    return [(f"usage-part{i + 1}.{ext}", p.raw) for i, p in enumerate(parts)], total, truncated
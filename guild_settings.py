@@ -0,0 +1,101 @@
+# guild_settings.py
+# Cached guild_settings with bulk preload and write-through. Only guilds with a non-default
+# setting are kept in memory; rows are created the first time a setting is written.
+
+import sys
+from collections import OrderedDict
+from typing import Dict
+
+from storage import Storage
+
+class GuildSettings:
+    __slots__ = ("language", "update_notice_version")
+
+    def __init__(self, language: str = "", update_notice_version: str = ""):
+        self.language = sys.intern(language)
+        self.update_notice_version = sys.intern(update_notice_version)
+
+    def is_default(self) -> bool:
+        return not self.language and not self.update_notice_version
+
+_DEFAULT = GuildSettings()
+
+class GuildSettingsStore:
+    def __init__(self, storage: Storage, max_entries: int):
+        self._storage = storage
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[int, GuildSettings]" = OrderedDict()
+        # True while every non-default row in the table is in _cache, so a miss means "default".
+        self._complete = False
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def _put(self, guild_id: int, settings: GuildSettings):
+        # Defaults only need an entry when a miss would otherwise go to the database.
+        if settings.is_default() and self._complete:
+            self._cache.pop(guild_id, None)
+            return
+        self._cache[guild_id] = settings
+        self._cache.move_to_end(guild_id)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+            self._complete = False
+
+    async def preload(self):
+        rows = await self._storage.read("""
+            SELECT guild_id, language, update_notice_version FROM guild_settings
+            WHERE COALESCE(language, '') != '' OR COALESCE(update_notice_version, '') != ''
+        """)
+        self._cache.clear()
+        for guild_id, language, notice in rows[: self.max_entries]:
+            self._put(int(guild_id), GuildSettings((language or "").strip(), (notice or "").strip()))
+        self._complete = len(rows) <= self.max_entries
+
+    async def get(self, guild_id: int) -> GuildSettings:
+        s = self._cache.get(guild_id)
+        if s is not None:
+            self.hits += 1
+            self._cache.move_to_end(guild_id)
+            return s
+        if self._complete:
+            self.hits += 1
+            return _DEFAULT
+
+        self.misses += 1
+        return await self.reload(guild_id)
+
+    async def reload(self, guild_id: int) -> GuildSettings:
+        row = await self._storage.read_one(
+            "SELECT language, update_notice_version FROM guild_settings WHERE guild_id = ?",
+            (str(guild_id),)
+        )
+        s = GuildSettings((row[0] or "").strip(), (row[1] or "").strip()) if row else _DEFAULT
+        self._put(guild_id, s)
+        return s
+
+    async def _update(self, guild_id: int, column: str, value: str):
+        current = await self.get(guild_id)
+        s = GuildSettings(current.language, current.update_notice_version)
+        setattr(s, column, sys.intern(value))
+        self._put(guild_id, s)
+        self._storage.write(f"""
+            INSERT INTO guild_settings (guild_id, {column}) VALUES (?, ?)
+            ON CONFLICT(guild_id) DO UPDATE SET {column} = excluded.{column}
+        """, (str(guild_id), value))
+
+    async def set_language(self, guild_id: int, language: str):
+        await self._update(guild_id, "language", language.strip())
+
+    async def set_update_notice_version(self, guild_id: int, version: str):
+        await self._update(guild_id, "update_notice_version", version)
+
+    def forget(self, guild_id: int):
+        # For guilds the bot has left. The row stays in the table, so a guild that comes back must
+        # be reloaded on join: while the cache is complete a miss reads as "default".
+        self._cache.pop(guild_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._cache), "complete": int(self._complete), "hits": self.hits, "misses": self.misses}
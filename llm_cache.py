@@ -0,0 +1,113 @@
+# llm_cache.py
+# Content-addressed cache of LLM responses in metrics.db. The key is a hash of the model,
+# the sampling parameters and the exact prompt, so a retry or a repeat request on a quiet
+# channel is answered without another completion. Entries expire after a TTL and the table
+# is trimmed to the most recently used rows.
+
+import json
+import time
+import hashlib
+from typing import Any, Dict, List, Optional
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS llm_cache (
+        key TEXT PRIMARY KEY,
+        guild_id TEXT NOT NULL,
+        response TEXT NOT NULL,
+        tokens INTEGER NOT NULL DEFAULT 0,
+        created_at INTEGER NOT NULL,
+        last_used INTEGER NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_llm_cache_used ON llm_cache(last_used)",
+    "CREATE INDEX IF NOT EXISTS idx_llm_cache_guild ON llm_cache(guild_id)",
+]
+
+def ensure_schema(conn):
+    for sql in SCHEMA:
+        conn.execute(sql)
+
+def cache_key(model: str, messages: List[dict], **params: Any) -> str:
+    blob = json.dumps({"model": model, "messages": messages, "params": params},
+                      sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+class LLMCache:
+    def __init__(self, storage, ttl: int, max_entries: int, evict_every: int = 100):
+        # storage is a Storage or cluster.RemoteStorage; only read/read_one/write are used.
+        self._storage = storage
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.evict_every = evict_every
+        self._puts = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.tokens_saved = 0
+        self.purged = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    async def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        now = int(time.time())
+        row = await self._storage.read_one(
+            "SELECT response, tokens FROM llm_cache WHERE key = ? AND created_at > ?",
+            (key, now - self.ttl)
+        )
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.tokens_saved += row[1] or 0
+        self._storage.write("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def put(self, key: str, guild_id: int, response: str, tokens: int):
+        if not self.enabled or not response:
+            return
+        now = int(time.time())
+        self._storage.write("""
+            INSERT INTO llm_cache(key, guild_id, response, tokens, created_at, last_used)
+            VALUES(?, ?, ?, ?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET
+                guild_id = excluded.guild_id, response = excluded.response, tokens = excluded.tokens,
+                created_at = excluded.created_at, last_used = excluded.last_used
+        """, (key, str(guild_id), response, tokens, now, now))
+        self._puts += 1
+        if self._puts % self.evict_every == 0:
+            self.evict(now)
+
+    def evict(self, now: Optional[int] = None):
+        now = int(time.time()) if now is None else now
+        self._storage.write("DELETE FROM llm_cache WHERE created_at <= ?", (now - self.ttl,))
+        self._storage.write("""
+            DELETE FROM llm_cache WHERE key IN (
+                SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_entries,))
+
+    async def purge_guild(self, guild_id: int) -> int:
+        row = await self._storage.read_one("SELECT COUNT(*) FROM llm_cache WHERE guild_id = ?", (str(guild_id),))
+        self._storage.write("DELETE FROM llm_cache WHERE guild_id = ?", (str(guild_id),))
+        n = row[0] if row else 0
+        self.purged += n
+        return n
+
+    async def size(self) -> int:
+        row = await self._storage.read_one("SELECT COUNT(*) FROM llm_cache")
+        return row[0] if row else 0
+
+    def stats(self) -> Dict[str, float]:
+        looked_up = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / looked_up, 3) if looked_up else 0.0,
+            "tokens_saved": self.tokens_saved,
+            "purged": self.purged,
+        }
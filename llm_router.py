@@ -0,0 +1,278 @@
+# llm_router.py
+# Routes one LLM call over an ordered list of model/endpoint routes. Each attempt has its own
+# deadline; a slow attempt is hedged with a second one after the route's recent p95; retryable
+# failures are retried with jittered backoff on the next route; and a route that keeps failing
+# is skipped by its circuit breaker until a cooldown has passed.
+
+import time
+import random
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+# attempt(route, claim): claim() returns True while this attempt may show partial output.
+Attempt = Callable[["Route", Callable[[], bool]], Awaitable[Any]]
+
+class LLMUnavailable(Exception):
+    pass
+
+def is_retryable(e: BaseException) -> bool:
+    import openai  # already loaded by the time a request has failed; kept off the import path
+    if isinstance(e, (asyncio.TimeoutError, openai.APITimeoutError, openai.APIConnectionError,
+                      openai.RateLimitError, openai.InternalServerError)):
+        return True
+    if isinstance(e, openai.APIStatusError):
+        return e.status_code in (408, 409, 429) or e.status_code >= 500
+    return False
+
+def parse_routes(spec: str) -> List[Tuple[str, Optional[str]]]:
+    # "gpt-4o-mini, gpt-4.1-mini@https://fallback.example/v1" -> [(model, base_url or None), ...]
+    out = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        model, _, base_url = part.partition("@")
+        out.append((model.strip(), base_url.strip() or None))
+    return out
+
+class CircuitBreaker:
+    def __init__(self, failures: int, cooldown: float):
+        self.failures = failures
+        self.cooldown = cooldown
+        self._streak = 0
+        self._open_until = 0.0
+        self._probing = False
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        if self._streak < self.failures:
+            return "closed"
+        return "open" if time.monotonic() < self._open_until else "half_open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probing:
+            self._probing = True  # one trial request decides whether the route is back
+            return True
+        return False
+
+    def release(self):
+        # The attempt ended without saying anything about the route (cancelled, or our own bad request).
+        self._probing = False
+
+    def record(self, ok: bool):
+        self._probing = False
+        if ok:
+            self._streak = 0
+            return
+        self._streak += 1
+        if self._streak >= self.failures:
+            if self._open_until <= time.monotonic():
+                self.opened += 1
+            self._open_until = time.monotonic() + self.cooldown
+
+class LatencyWindow:
+    def __init__(self, size: int = 200):
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def quantile(self, q: float) -> float:
+        s = sorted(self._samples)
+        return s[min(len(s) - 1, int(q * len(s)))] if s else 0.0
+
+class Route:
+    def __init__(self, name: str, model: str, connect: Callable[[], Any], breaker: CircuitBreaker):
+        # connect() builds the API client the first time the route is used.
+        self.name = name
+        self.model = model
+        self._connect = connect
+        self._client = None
+        self.breaker = breaker
+        self.latency: Dict[str, LatencyWindow] = {}
+        self.results: Dict[str, int] = {}
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = self._connect()
+        return self._client
+
+    def count(self, result: str):
+        self.results[result] = self.results.get(result, 0) + 1
+
+class LLMRouter:
+    def __init__(self, routes: List[Route], attempt_timeout: float, deadline: float, max_attempts: int,
+                 hedge: bool = True, hedge_min: float = 1.0, hedge_default: float = 8.0, hedge_samples: int = 20,
+                 backoff_base: float = 0.25, backoff_max: float = 4.0):
+        if not routes:
+            raise ValueError("at least one route is required")
+        self.routes = routes
+        self.attempt_timeout = attempt_timeout
+        self.deadline = deadline
+        self.max_attempts = max(1, max_attempts)
+        self.hedge = hedge
+        self.hedge_min = hedge_min
+        self.hedge_default = hedge_default
+        self.hedge_samples = hedge_samples
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.calls = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.unavailable = 0
+
+    def hedge_delay(self, route: Route, mode: str) -> float:
+        window = route.latency.get(mode)
+        if window is None or len(window) < self.hedge_samples:
+            return self.hedge_default
+        return max(self.hedge_min, window.quantile(0.95))
+
+    def _available(self) -> List[Route]:
+        return [r for r in self.routes if r.breaker.state != "open"]
+
+    async def run(self, attempt: Attempt, mode: str = "plain") -> Any:
+        self.calls += 1
+        loop = asyncio.get_running_loop()
+        end = loop.time() + self.deadline
+        last: Optional[BaseException] = None
+
+        for n in range(self.max_attempts):
+            remaining = end - loop.time()
+            if remaining <= 0:
+                break
+            routes = self._available()
+            # Later attempts move down the fallback list; the hedge goes to the next route along.
+            k = n % len(routes) if routes else 0
+            primary = next((r for r in routes[k:] + routes[:k] if r.breaker.allow()), None)
+            if primary is None:
+                self.unavailable += 1
+                raise LLMUnavailable("every LLM route is failing") from last
+            spare = [r for r in routes if r is not primary and r.breaker.state == "closed"]
+            hedge_route = spare[0] if spare else primary
+
+            try:
+                return await self._round(attempt, primary, hedge_route, mode, remaining)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                last = e
+                if not is_retryable(e) or n == self.max_attempts - 1:
+                    raise
+            self.retries += 1
+            backoff = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** n))
+            await asyncio.sleep(min(backoff, max(0.0, end - loop.time())))
+
+        raise asyncio.TimeoutError(f"LLM deadline of {self.deadline}s exceeded") from last
+
+    async def _round(self, attempt: Attempt, primary: Route, hedge_route: Route, mode: str, budget: float) -> Any:
+        loop = asyncio.get_running_loop()
+        end = loop.time() + budget
+        tasks: Dict[asyncio.Task, Route] = {}
+        winner: List[asyncio.Task] = []
+
+        def claim(task: asyncio.Task) -> bool:
+            if not winner:
+                winner.append(task)
+                for t in tasks:
+                    if t is not task:
+                        t.cancel()
+            return winner[0] is task
+
+        def launch(route: Route) -> asyncio.Task:
+            this: List[asyncio.Task] = []
+            task = asyncio.create_task(self._attempt(attempt, route, mode, lambda: claim(this[0]), end))
+            this.append(task)
+            tasks[task] = route
+            return task
+
+        first = launch(primary)
+        pending = {first}
+        hedge_at = loop.time() + self.hedge_delay(primary, mode) if self.hedge else None
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                wake = end if hedge_at is None else min(end, hedge_at)
+                done, pending = await asyncio.wait(pending, timeout=max(0.0, wake - loop.time()),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    if t.cancelled():
+                        continue
+                    if t.exception() is None:
+                        if t is not first:
+                            self.hedge_wins += 1
+                            tasks[t].count("hedge_win")
+                        return t.result()
+                    error = t.exception()
+                if done:
+                    continue
+                if loop.time() >= end:
+                    break
+                if hedge_at is not None and not winner and hedge_route.breaker.allow():
+                    self.hedges += 1
+                    pending.add(launch(hedge_route))
+                hedge_at = None
+        finally:
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        raise error or asyncio.TimeoutError("LLM attempt deadline exceeded")
+
+    async def _attempt(self, attempt: Attempt, route: Route, mode: str, claim: Callable[[], bool],
+                       end: float) -> Any:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        first: List[float] = []
+
+        def timed_claim() -> bool:
+            if not first:
+                first.append(loop.time())
+            return claim()
+
+        try:
+            result = await asyncio.wait_for(attempt(route, timed_claim),
+                                            max(0.0, min(self.attempt_timeout, end - started)))
+        except asyncio.CancelledError:
+            route.count("cancelled")
+            route.breaker.release()
+            raise
+        except Exception as e:
+            route.count("timeout" if isinstance(e, asyncio.TimeoutError) else "error")
+            if is_retryable(e):
+                route.breaker.record(False)
+            else:
+                route.breaker.release()
+            raise
+        route.breaker.record(True)
+        route.count("ok")
+        # Streams are hedged on time to first token, plain calls on the whole response.
+        route.latency.setdefault(mode, LatencyWindow()).add((first[0] if first else loop.time()) - started)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "unavailable": self.unavailable,
+            "routes": {
+                r.name: {
+                    "state": r.breaker.state,
+                    "opened": r.breaker.opened,
+                    "p95": {m: round(w.quantile(0.95), 3) for m, w in r.latency.items()},
+                    **r.results,
+                }
+                for r in self.routes
+            },
+        }
@@ -0,0 +1,169 @@
+# maintenance.py
+# Usage rollups kept up to date by triggers, plus the retention job that archives old raw
+# events and keeps metrics.db compact. Everything here runs on the storage thread.
+
+import sqlite3
+from typing import Dict
+
+HOUR = 3600
+DAY = 86400
+
+ROLLUP_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS usage_hourly (
+        hour_ts INTEGER NOT NULL,
+        guild_id TEXT NOT NULL,
+        user_id TEXT NOT NULL,
+        command_name TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (hour_ts, guild_id, user_id, command_name)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS usage_daily (
+        day_ts INTEGER NOT NULL,
+        guild_id TEXT NOT NULL,
+        user_id TEXT NOT NULL,
+        command_name TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day_ts, guild_id, user_id, command_name)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS guild_names (
+        guild_id TEXT PRIMARY KEY,
+        name TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_names (
+        user_id TEXT PRIMARY KEY,
+        name TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS maintenance_state (
+        name TEXT PRIMARY KEY,
+        last_run INTEGER NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_usage_guild_ts ON usage_events(guild_id, ts)",
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_usage_rollup AFTER INSERT ON usage_events
+    BEGIN
+        INSERT INTO usage_hourly (hour_ts, guild_id, user_id, command_name, count)
+        VALUES (NEW.ts - NEW.ts % 3600, COALESCE(NEW.guild_id, ''), COALESCE(NEW.user_id, ''),
+                COALESCE(NEW.command_name, ''), 1)
+        ON CONFLICT (hour_ts, guild_id, user_id, command_name) DO UPDATE SET count = count + 1;
+
+        INSERT INTO usage_daily (day_ts, guild_id, user_id, command_name, count)
+        VALUES (NEW.ts - NEW.ts % 86400, COALESCE(NEW.guild_id, ''), COALESCE(NEW.user_id, ''),
+                COALESCE(NEW.command_name, ''), 1)
+        ON CONFLICT (day_ts, guild_id, user_id, command_name) DO UPDATE SET count = count + 1;
+
+        INSERT INTO guild_names (guild_id, name) VALUES (COALESCE(NEW.guild_id, ''), NEW.guild_name)
+        ON CONFLICT (guild_id) DO UPDATE SET name = excluded.name;
+
+        INSERT INTO user_names (user_id, name) VALUES (COALESCE(NEW.user_id, ''), NEW.user_name)
+        ON CONFLICT (user_id) DO UPDATE SET name = excluded.name;
+    END
+    """,
+]
+
+def _mark(conn: sqlite3.Connection, name: str, ts: int):
+    conn.execute("""
+        INSERT INTO maintenance_state (name, last_run) VALUES (?, ?)
+        ON CONFLICT (name) DO UPDATE SET last_run = excluded.last_run
+    """, (name, ts))
+
+def last_run(conn: sqlite3.Connection, name: str) -> int:
+    row = conn.execute("SELECT last_run FROM maintenance_state WHERE name = ?", (name,)).fetchone()
+    return int(row[0]) if row else 0
+
+def ensure_rollups(conn: sqlite3.Connection, now: int):
+    for stmt in ROLLUP_SCHEMA:
+        conn.execute(stmt)
+
+    if last_run(conn, "rollup_backfill"):
+        return
+    # First boot with rollups: rebuild them from the raw history that predates the trigger.
+    for table, col, width in (("usage_hourly", "hour_ts", HOUR), ("usage_daily", "day_ts", DAY)):
+        conn.execute(f"DELETE FROM {table}")
+        conn.execute(f"""
+            INSERT INTO {table} ({col}, guild_id, user_id, command_name, count)
+            SELECT ts - ts % {width}, COALESCE(guild_id, ''), COALESCE(user_id, ''), COALESCE(command_name, ''), COUNT(*)
+            FROM usage_events GROUP BY 1, 2, 3, 4
+        """)
+    conn.execute("""
+        INSERT OR REPLACE INTO guild_names (guild_id, name)
+        SELECT guild_id, guild_name FROM (
+            SELECT COALESCE(guild_id, '') AS guild_id, guild_name, MAX(id) FROM usage_events GROUP BY 1
+        )
+    """)
+    conn.execute("""
+        INSERT OR REPLACE INTO user_names (user_id, name)
+        SELECT user_id, user_name FROM (
+            SELECT user_id, user_name, MAX(id) FROM usage_events WHERE user_id IS NOT NULL GROUP BY user_id
+        )
+    """)
+    _mark(conn, "rollup_backfill", now)
+    conn.commit()
+
+def archive_batch(conn: sqlite3.Connection, cutoff: int, archive_path: str, batch: int = 5000) -> int:
+    # Moves one batch of raw events older than cutoff into the archive database. Called
+    # repeatedly so queued writes get a turn on the storage thread between batches.
+    conn.execute("ATTACH DATABASE ? AS archive", (archive_path,))
+    try:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS archive.usage_events (
+                id INTEGER PRIMARY KEY,
+                guild_id TEXT,
+                guild_name TEXT,
+                command_name TEXT,
+                ts INTEGER,
+                user_id TEXT,
+                user_name TEXT,
+                channel_id TEXT,
+                channel_name TEXT
+            )
+        """)
+        ids = [r[0] for r in conn.execute(
+            "SELECT id FROM main.usage_events WHERE ts < ? ORDER BY id LIMIT ?", (cutoff, batch)
+        )]
+        if ids:
+            marks = ",".join("?" * len(ids))
+            conn.execute(f"""
+                INSERT OR IGNORE INTO archive.usage_events
+                (id, guild_id, guild_name, command_name, ts, user_id, user_name, channel_id, channel_name)
+                SELECT id, guild_id, guild_name, command_name, ts, user_id, user_name, channel_id, channel_name
+                FROM main.usage_events WHERE id IN ({marks})
+            """, ids)
+            conn.execute(f"DELETE FROM main.usage_events WHERE id IN ({marks})", ids)
+        conn.commit()
+        return len(ids)
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        conn.execute("DETACH DATABASE archive")
+
+def finish_retention(conn: sqlite3.Connection, now: int, hourly_days: int) -> Dict[str, int]:
+    cur = conn.execute("DELETE FROM usage_hourly WHERE hour_ts < ?", (now - hourly_days * DAY,))
+    _mark(conn, "retention", now)
+    conn.commit()
+    conn.execute("PRAGMA optimize")
+    return {"hourly_pruned": cur.rowcount}
+
+def vacuum(path: str, now: int):
+    # The exception to the rule above: VACUUM can take minutes on a large database, so it gets
+    # its own connection (run it off the event loop) and the storage thread keeps serving reads.
+    # Writes that find the database locked meanwhile are held by the storage thread and applied
+    # once VACUUM is done; callers still keep it to quiet hours so few of them pile up.
+    conn = sqlite3.connect(path, timeout=60)
+    try:
+        conn.execute("ANALYZE")
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        _mark(conn, "vacuum", now)
+        conn.commit()
+    finally:
+        conn.close()
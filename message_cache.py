@@ -0,0 +1,217 @@
+# message_cache.py
+# Gateway-fed ring of recent human messages per channel, so summaries don't have to page
+# through channel.history for messages the bot already saw.
+
+import sys
+import time
+from itertools import islice
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Iterable, List, Optional
+
+class CachedMessage:
+    __slots__ = ("id", "author_id", "author_name", "content", "created_at")
+
+    def __init__(self, id: int, author_id: int, author_name: str, content: str, created_at: float):
+        self.id = id
+        self.author_id = author_id
+        self.author_name = author_name
+        self.content = content
+        self.created_at = created_at
+
+    @classmethod
+    def from_message(cls, m) -> "CachedMessage":
+        return cls(m.id, m.author.id, sys.intern(m.author.display_name), m.content, m.created_at.timestamp())
+
+    def __repr__(self) -> str:
+        return f"CachedMessage(id={self.id}, author_name={self.author_name!r})"
+
+# slotted instance + boxed int ids + boxed float timestamp + deque slot
+_RECORD_OVERHEAD = sys.getsizeof(CachedMessage(0, 0, "", "", 0.0)) + 2 * 32 + 24 + 8
+
+def _record_size(rec: CachedMessage) -> int:
+    return _RECORD_OVERHEAD + sys.getsizeof(rec.content)
+
+class _ChannelRing:
+    __slots__ = ("msgs", "bytes", "last_active")
+
+    def __init__(self):
+        self.msgs: Deque[CachedMessage] = deque()
+        self.bytes = 0
+        self.last_active = time.monotonic()
+
+class MessageCache:
+    def __init__(self, per_channel: int, max_bytes: int, idle_seconds: float):
+        self.per_channel = per_channel
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        self._rings: "OrderedDict[int, _ChannelRing]" = OrderedDict()
+        self._bytes = 0
+        self._last_sweep = time.monotonic()
+
+        self.hits = 0
+        self.partial_hits = 0
+        self.misses = 0
+        self.messages_served = 0
+        self.evicted_channels = 0
+
+    def __len__(self) -> int:
+        return len(self._rings)
+
+    @property
+    def bytes_used(self) -> int:
+        return self._bytes
+
+    def _touch(self, channel_id: int, ring: _ChannelRing):
+        ring.last_active = time.monotonic()
+        self._rings.move_to_end(channel_id)
+
+    def _drop_ring(self, channel_id: int):
+        ring = self._rings.pop(channel_id, None)
+        if ring is not None:
+            self._bytes -= ring.bytes
+            self.evicted_channels += 1
+
+    def add(self, channel_id: int, rec: CachedMessage):
+        ring = self._rings.get(channel_id)
+        if ring is None:
+            ring = self._rings[channel_id] = _ChannelRing()
+        self._touch(channel_id, ring)
+
+        size = _record_size(rec)
+        ring.msgs.append(rec)
+        ring.bytes += size
+        self._bytes += size
+
+        while len(ring.msgs) > self.per_channel:
+            old = ring.msgs.popleft()
+            sz = _record_size(old)
+            ring.bytes -= sz
+            self._bytes -= sz
+
+        self._enforce_limits(keep=channel_id)
+
+    def edit(self, channel_id: int, message_id: int, content: Optional[str]):
+        ring = self._rings.get(channel_id)
+        if ring is None:
+            return
+        for rec in reversed(ring.msgs):
+            if rec.id != message_id:
+                continue
+            if not (content and content.strip()):
+                self._remove(ring, {message_id})
+                return
+            delta = sys.getsizeof(content) - sys.getsizeof(rec.content)
+            rec.content = content
+            ring.bytes += delta
+            self._bytes += delta
+            return
+
+    def delete(self, channel_id: int, message_ids: Iterable[int]):
+        ring = self._rings.get(channel_id)
+        if ring is not None:
+            self._remove(ring, set(message_ids))
+
+    def _remove(self, ring: _ChannelRing, ids: set):
+        kept: Deque[CachedMessage] = deque()
+        for rec in ring.msgs:
+            if rec.id in ids:
+                sz = _record_size(rec)
+                ring.bytes -= sz
+                self._bytes -= sz
+            else:
+                kept.append(rec)
+        ring.msgs = kept
+
+    def drop_channel(self, channel_id: int):
+        self._drop_ring(channel_id)
+
+    def channel_ids(self) -> List[int]:
+        return list(self._rings)
+
+    def clear(self):
+        self._rings.clear()
+        self._bytes = 0
+
+    def recent(self, channel_id: int, limit: int) -> List[CachedMessage]:
+        ring = self._rings.get(channel_id)
+        if ring is None or not ring.msgs:
+            self.misses += 1
+            return []
+        self._touch(channel_id, ring)
+
+        n = min(limit, len(ring.msgs))
+        out = list(islice(ring.msgs, len(ring.msgs) - n, None))
+        if n >= limit:
+            self.hits += 1
+        else:
+            self.partial_hits += 1
+        self.messages_served += n
+        return out
+
+    def after(self, channel_id: int, after_id: int, limit: int) -> List[CachedMessage]:
+        # Newest `limit` cached messages with id > after_id, oldest first.
+        ring = self._rings.get(channel_id)
+        if ring is None or not ring.msgs:
+            self.misses += 1
+            return []
+        self._touch(channel_id, ring)
+
+        out: List[CachedMessage] = []
+        for rec in reversed(ring.msgs):
+            if rec.id <= after_id or len(out) >= limit:
+                break
+            out.append(rec)
+        out.reverse()
+        # A hit means the ring reaches back to the boundary, so REST has nothing to add.
+        if len(out) >= limit or ring.msgs[0].id <= after_id:
+            self.hits += 1
+        else:
+            self.partial_hits += 1
+        self.messages_served += len(out)
+        return out
+
+    def covers(self, channel_id: int, after_id: int) -> bool:
+        ring = self._rings.get(channel_id)
+        return ring is not None and bool(ring.msgs) and ring.msgs[0].id <= after_id
+
+    def last_by_author(self, channel_id: int, author_id: int) -> Optional[int]:
+        ring = self._rings.get(channel_id)
+        if ring is None:
+            return None
+        for rec in reversed(ring.msgs):
+            if rec.author_id == author_id:
+                return rec.id
+        return None
+
+    def _enforce_limits(self, keep: int):
+        now = time.monotonic()
+        if now - self._last_sweep > 60:
+            self._last_sweep = now
+            cutoff = now - self.idle_seconds
+            for cid in [cid for cid, r in self._rings.items() if r.last_active < cutoff]:
+                self._drop_ring(cid)
+
+        while self._bytes > self.max_bytes and self._rings:
+            oldest = next(iter(self._rings))
+            if oldest == keep:
+                if len(self._rings) == 1:
+                    ring = self._rings[keep]
+                    while self._bytes > self.max_bytes and ring.msgs:
+                        sz = _record_size(ring.msgs.popleft())
+                        ring.bytes -= sz
+                        self._bytes -= sz
+                    break
+                self._rings.move_to_end(keep)
+                continue
+            self._drop_ring(oldest)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "channels": len(self._rings),
+            "bytes": self.bytes_used,
+            "hits": self.hits,
+            "partial_hits": self.partial_hits,
+            "misses": self.misses,
+            "messages_served": self.messages_served,
+            "evicted_channels": self.evicted_channels,
+        }
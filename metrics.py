@@ -0,0 +1,225 @@
+# metrics.py
+# Small in-process metrics registry (counters, gauges, histograms) rendered in the Prometheus
+# text format, and the threaded HTTP server that serves /metrics, /healthz and the keepalive
+# ping. Values are updated on the event loop and read from server threads.
+
+import json
+import math
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+LabelValues = Tuple[str, ...]
+
+def _fmt(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    if float(v).is_integer():
+        return str(int(v))
+    return repr(float(v))
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, doc, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, n: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + n
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [f"{self.name}{_labels(self.labelnames, k)} {_fmt(v)}" for k, v in items]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, n: float = 1):
+        self.inc(*labels, n=-n)
+
+    def set(self, *labels: str, value: float):
+        with self._lock:
+            self._values[labels] = value
+
+class CallbackGauge(_Metric):
+    # Read at scrape time; fn returns one value or {label_values: value}.
+    kind = "gauge"
+
+    def __init__(self, name: str, doc: str, fn: Callable[[], object], labelnames: Sequence[str] = ()):
+        super().__init__(name, doc, labelnames)
+        self._fn = fn
+
+    def render(self) -> List[str]:
+        try:
+            v = self._fn()
+        except Exception:
+            # The objects behind these live on the event loop; skip a torn read, retry next scrape.
+            return []
+        if not isinstance(v, dict):
+            v = {(): v}
+        return self._header() + [
+            f"{self.name}{_labels(self.labelnames, k)} {_fmt(float(x))}" for k, x in sorted(v.items())
+        ]
+
+class CallbackCounter(CallbackGauge):
+    # A running total kept elsewhere (an attribute that only ever grows), read at scrape time.
+    kind = "counter"
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, doc, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series: Dict[LabelValues, List[float]] = {}  # per-bucket counts..., sum, count
+
+    def observe(self, *labels: str, value: float):
+        with self._lock:
+            s = self._series.get(labels)
+            if s is None:
+                s = self._series[labels] = [0.0] * (len(self.buckets) + 2)
+            for i, upper in enumerate(self.buckets):
+                if value <= upper:
+                    s[i] += 1
+                    break
+            s[-2] += value
+            s[-1] += 1
+
+    def time(self, *labels: str, inflight: Optional[Gauge] = None) -> "_Timer":
+        return _Timer(self, labels, inflight)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(s)) for k, s in self._series.items())
+        out = self._header()
+        for k, s in items:
+            running = 0.0
+            for i, upper in enumerate(self.buckets):
+                running += s[i]
+                le = f'le="{_fmt(upper)}"'
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, k, le)} {_fmt(running)}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, k)} {_fmt(s[-2])}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, k)} {_fmt(s[-1])}")
+        return out
+
+class _Timer:
+    # Times a block into a histogram and tracks it in an optional in-flight gauge.
+    __slots__ = ("_hist", "_labels", "_inflight", "_start")
+
+    def __init__(self, hist: Histogram, labels: LabelValues, inflight: Optional[Gauge]):
+        self._hist = hist
+        self._labels = labels
+        self._inflight = inflight
+        self._start = 0.0
+
+    def __enter__(self) -> "_Timer":
+        if self._inflight is not None:
+            self._inflight.inc(*self._labels)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._hist.observe(*self._labels, value=time.perf_counter() - self._start)
+        if self._inflight is not None:
+            self._inflight.dec(*self._labels)
+        return False
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def _add(self, m):
+        self._metrics.append(m)
+        return m
+
+    def counter(self, name: str, doc: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, doc, labelnames))
+
+    def gauge(self, name: str, doc: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._add(Gauge(name, doc, labelnames))
+
+    def gauge_fn(self, name: str, doc: str, fn: Callable[[], object], labelnames: Sequence[str] = ()) -> CallbackGauge:
+        return self._add(CallbackGauge(name, doc, fn, labelnames))
+
+    def counter_fn(self, name: str, doc: str, fn: Callable[[], object],
+                   labelnames: Sequence[str] = ()) -> CallbackCounter:
+        return self._add(CallbackCounter(name, doc, fn, labelnames))
+
+    def histogram(self, name: str, doc: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, doc, labelnames, buckets))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for m in self._metrics:
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+HealthCheck = Callable[[], Tuple[bool, Dict[str, object]]]
+
+def serve(host: str, port: int, registry: Registry, health: HealthCheck) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _reply(self, status: int, body: bytes, ctype: str, head: bool = False):
+            self.send_response(status)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if not head:
+                self.wfile.write(body)
+
+        def _route(self, head: bool):
+            path = self.path.split("?", 1)[0]
+            if path == "/metrics":
+                self._reply(200, registry.render().encode(), "text/plain; version=0.0.4; charset=utf-8", head)
+            elif path == "/healthz":
+                ok, detail = health()
+                self._reply(200 if ok else 503, json.dumps(detail).encode(), "application/json", head)
+            else:
+                self._reply(200, b"OK", "text/plain", head)
+
+        def do_GET(self):
+            self._route(head=False)
+
+        def do_HEAD(self):
+            self._route(head=True)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
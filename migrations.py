@@ -0,0 +1,113 @@
+# migrations.py
+# Versioned schema for metrics.db. Each step runs once, in order, and is recorded in
+# schema_version, so a database that is already current costs a single query at startup.
+# Steps stay idempotent: a database from before versioning, or one where a step was
+# interrupted, is brought up to date by simply running them again.
+
+import time
+import sqlite3
+from typing import Callable, List, Tuple
+
+import digests
+import llm_cache
+import maintenance
+
+def _add_columns(conn: sqlite3.Connection, table: str, columns: List[Tuple[str, str]]):
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    for name, decl in columns:
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+
+def _base(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS usage_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id TEXT,
+            guild_name TEXT,
+            command_name TEXT,
+            ts INTEGER
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS guild_joins (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id TEXT,
+            guild_name TEXT,
+            owner_id TEXT,
+            joined_at INTEGER
+        )
+    """)
+    # Added after the first release; older databases get them here.
+    _add_columns(conn, "usage_events", [
+        ("user_id", "TEXT"), ("user_name", "TEXT"), ("channel_id", "TEXT"), ("channel_name", "TEXT"),
+    ])
+
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_usage_time ON usage_events(ts)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_usage_guild ON usage_events(guild_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_usage_user ON usage_events(user_id)")
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS guild_settings (
+            guild_id TEXT PRIMARY KEY,
+            language TEXT DEFAULT '',
+            update_notice_version TEXT DEFAULT ''
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_settings_guild ON guild_settings(guild_id)")
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS user_daily_usage (
+            user_id TEXT NOT NULL,
+            day_key TEXT NOT NULL,
+            used INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, day_key)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_user_daily_day ON user_daily_usage(day_key)")
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS user_cooldowns (
+            user_id TEXT PRIMARY KEY,
+            last_used INTEGER NOT NULL
+        )
+    """)
+
+def _rollups(conn: sqlite3.Connection):
+    maintenance.ensure_rollups(conn, int(time.time()))
+
+def _digest_retries(conn: sqlite3.Connection):
+    _add_columns(conn, "digest_subscriptions", digests.RETRY_COLUMNS)
+
+# (version, name, step). Append only; never renumber or edit a step that has shipped.
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Connection], None]]] = [
+    (1, "base tables", _base),
+    (2, "usage rollups", _rollups),
+    (3, "llm response cache", llm_cache.ensure_schema),
+    (4, "channel digests", digests.ensure_schema),
+    (5, "digest retries", _digest_retries),
+]
+LATEST = MIGRATIONS[-1][0]
+
+def current_version(conn: sqlite3.Connection) -> int:
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at INTEGER NOT NULL
+        )
+    """)
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+def migrate(conn: sqlite3.Connection) -> List[int]:
+    # Returns the versions applied by this call.
+    version = current_version(conn)
+    applied = []
+    for v, name, step in MIGRATIONS:
+        if v <= version:
+            continue
+        step(conn)
+        conn.execute("INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)",
+                     (v, name, int(time.time())))
+        conn.commit()
+        applied.append(v)
+    return applied
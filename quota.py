@@ -0,0 +1,154 @@
+# quota.py
+# In-memory quota state: rolling per-guild windows, per-user daily counts and cooldowns.
+# Rebuilt from SQLite at startup; preflight checks never touch the disk.
+
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Set, Tuple
+
+from storage import Storage
+
+class _Window:
+    __slots__ = ("buckets", "total")
+
+    def __init__(self):
+        self.buckets: Deque[List[int]] = deque()  # [bucket_start, count], oldest first
+        self.total = 0
+
+class QuotaEngine:
+    def __init__(self, guild_window: int, cooldown: int, bucket_seconds: int = 60):
+        self.guild_window = guild_window
+        self.cooldown = cooldown
+        self.bucket_seconds = bucket_seconds
+
+        self._guilds: Dict[int, _Window] = {}
+        self._user_days: Dict[int, Tuple[str, int]] = {}
+        self._last_used: Dict[int, int] = {}
+        self._dirty_cooldowns: Set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self._guilds) + len(self._user_days) + len(self._last_used)
+
+    def _expire(self, w: _Window, now: int):
+        cutoff = now - self.guild_window
+        while w.buckets and w.buckets[0][0] + self.bucket_seconds <= cutoff:
+            w.total -= w.buckets.popleft()[1]
+
+    def guild_used(self, guild_id: int, now: int) -> int:
+        w = self._guilds.get(guild_id)
+        if w is None:
+            return 0
+        self._expire(w, now)
+        return w.total
+
+    def record_guild(self, guild_id: int, ts: int, n: int = 1):
+        w = self._guilds.get(guild_id)
+        if w is None:
+            w = self._guilds[guild_id] = _Window()
+        start = ts - ts % self.bucket_seconds
+        if w.buckets and w.buckets[-1][0] == start:
+            w.buckets[-1][1] += n
+        elif not w.buckets or w.buckets[-1][0] < start:
+            w.buckets.append([start, n])
+        else:
+            # Out-of-order load; keep buckets sorted.
+            for b in w.buckets:
+                if b[0] == start:
+                    b[1] += n
+                    break
+            else:
+                w.buckets.append([start, n])
+                w.buckets = deque(sorted(w.buckets))
+        w.total += n
+
+    def user_used(self, user_id: int, day_key: str) -> int:
+        day, used = self._user_days.get(user_id, ("", 0))
+        return used if day == day_key else 0
+
+    def record_user(self, user_id: int, day_key: str, n: int = 1):
+        self._user_days[user_id] = (day_key, self.user_used(user_id, day_key) + n)
+
+    def cooldown_remaining(self, user_id: int, now: int) -> int:
+        last = self._last_used.get(user_id)
+        if last is None:
+            return 0
+        rem = self.cooldown - (now - last)
+        return rem if rem > 0 else 0
+
+    def bump_cooldown(self, user_id: int, now: int):
+        self._last_used[user_id] = now
+        self._dirty_cooldowns.add(user_id)
+
+    def purge(self, now: int, day_key: str) -> int:
+        removed = 0
+        for gid in list(self._guilds):
+            w = self._guilds[gid]
+            self._expire(w, now)
+            if not w.buckets:
+                del self._guilds[gid]
+                removed += 1
+        for uid in [u for u, (day, _) in self._user_days.items() if day != day_key]:
+            del self._user_days[uid]
+            removed += 1
+        for uid in [u for u, ts in self._last_used.items() if now - ts >= self.cooldown]:
+            del self._last_used[uid]
+            self._dirty_cooldowns.discard(uid)
+            removed += 1
+        return removed
+
+    def load_guild_events(self, rows: Iterable[Tuple[str, int]]):
+        for guild_id, ts in rows:
+            self.record_guild(int(guild_id), int(ts))
+
+    def load_user_days(self, rows: Iterable[Tuple[str, str, int]]):
+        for user_id, day_key, used in rows:
+            self._user_days[int(user_id)] = (day_key, int(used))
+
+    def load_cooldowns(self, rows: Iterable[Tuple[str, int]]):
+        for user_id, last_used in rows:
+            uid = int(user_id)
+            self._last_used[uid] = max(self._last_used.get(uid, 0), int(last_used))
+
+    def take_dirty_cooldowns(self) -> List[Tuple[str, int]]:
+        out = [(str(uid), self._last_used[uid]) for uid in self._dirty_cooldowns if uid in self._last_used]
+        self._dirty_cooldowns.clear()
+        return out
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "guild_windows": len(self._guilds),
+            "user_days": len(self._user_days),
+            "cooldowns": len(self._last_used),
+        }
+
+class QuotaGate:
+    # Admission and charging for summary commands on top of a QuotaEngine. Admission bumps the
+    # cooldown in the same step as the checks, so two requests can't both slip through.
+    def __init__(self, engine: QuotaEngine, storage: Storage, guild_limit: int, user_limit: int):
+        self.engine = engine
+        self.storage = storage
+        self.guild_limit = guild_limit
+        self.user_limit = user_limit
+
+    async def admit(self, guild_id: int, user_id: int, check_user: bool, now: int, day_key: str) -> Tuple[str, int]:
+        # ("", 0) when admitted, else (reason, value): cooldown seconds left or the limit hit.
+        rem = self.engine.cooldown_remaining(user_id, now)
+        if rem > 0:
+            return "cooldown", rem
+        if self.engine.guild_used(guild_id, now) >= self.guild_limit:
+            return "guild", self.guild_limit
+        if check_user and self.engine.user_used(user_id, day_key) >= self.user_limit:
+            return "user", self.user_limit
+        self.engine.bump_cooldown(user_id, now)
+        return "", 0
+
+    def charge(self, guild_id: int, user_id: int, charge_user: bool, ts: int, day_key: str):
+        self.engine.record_guild(guild_id, ts)
+        if charge_user:
+            self.engine.record_user(user_id, day_key)
+            self.storage.write("""
+                INSERT INTO user_daily_usage (user_id, day_key, used) VALUES (?,?,1)
+                ON CONFLICT(user_id, day_key) DO UPDATE SET used = used + excluded.used
+            """, (str(user_id), day_key))
+
+    async def stats(self) -> Dict[str, int]:
+        return self.engine.stats()
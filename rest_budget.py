@@ -0,0 +1,181 @@
+# rest_budget.py
+# One budget for every Discord REST call the bot makes. Requests are seen through an aiohttp
+# trace hook on discord.py's session, so call sites don't change: interactive replies always
+# go first, history paging is paced and shed before the global limit is at risk, and route
+# buckets are learned from the X-RateLimit-* headers.
+
+import re
+import time
+import asyncio
+from typing import Dict, Optional, Tuple
+
+import aiohttp
+
+INTERACTIVE = 0
+NORMAL = 1
+BULK = 2
+PRIORITY_NAMES = ("interactive", "normal", "bulk")
+
+_ID = re.compile(r"/\d{15,21}")
+_MAJOR = re.compile(r"/(channels|guilds|webhooks)/(\d+)")
+
+class RestBudgetExceeded(Exception):
+    pass
+
+def classify(method: str, path: str) -> int:
+    if "/interactions/" in path or "/webhooks/" in path:
+        return INTERACTIVE
+    if method == "GET" and path.endswith("/messages"):
+        return BULK
+    return NORMAL
+
+def route_key(method: str, path: str) -> Tuple[str, str]:
+    # (method + path with ids stripped, major parameter); mirrors how Discord buckets routes.
+    path = path.split("/api/v", 1)[-1]
+    path = path[path.find("/"):] if "/" in path else path
+    m = _MAJOR.search(path)
+    return f"{method} {_ID.sub('/{id}', path)}", m.group(2) if m else ""
+
+class _Bucket:
+    __slots__ = ("limit", "remaining", "reset_at")
+
+    def __init__(self, limit: int, remaining: int, reset_at: float):
+        self.limit = limit
+        self.remaining = remaining
+        self.reset_at = reset_at
+
+class RestGovernor:
+    def __init__(self, rate: float = 45.0, burst: int = 45, bulk_reserve: float = 0.4,
+                 normal_reserve: float = 0.1, bulk_max_wait: float = 8.0):
+        # rate/burst sit under Discord's 50 req/s global limit; bulk work may only use tokens
+        # above bulk_reserve * burst, so replies always find budget left.
+        self.rate = rate
+        self.burst = burst
+        self.bulk_floor = burst * bulk_reserve
+        self.normal_floor = burst * normal_reserve
+        self.bulk_max_wait = bulk_max_wait
+        self._tokens = float(burst)
+        self._stamp = time.monotonic()
+        self._global_until = 0.0
+        self._route_bucket: Dict[str, str] = {}
+        self._buckets: Dict[Tuple[str, str], _Bucket] = {}
+
+        self.requests = [0, 0, 0]
+        self.waited = [0.0, 0.0, 0.0]
+        self.shed = 0
+        self.global_429s = 0
+        self.route_429s = 0
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    @property
+    def tokens(self) -> float:
+        self._refill(time.monotonic())
+        return self._tokens
+
+    def pressure(self) -> float:
+        # 0 = idle, 1 = no headroom (or under a global rate limit).
+        if time.monotonic() < self._global_until:
+            return 1.0
+        return max(0.0, 1.0 - self.tokens / self.burst)
+
+    def bulk_pages_available(self) -> int:
+        # History pages that fit in the bulk share of the budget right now.
+        if time.monotonic() < self._global_until:
+            return 0
+        return max(0, int(self.tokens - self.bulk_floor))
+
+    def _route_wait(self, key: Tuple[str, str], now: float) -> float:
+        bucket_hash = self._route_bucket.get(key[0])
+        b = self._buckets.get((bucket_hash, key[1])) if bucket_hash else None
+        if b is None or b.reset_at <= now:
+            return 0.0
+        if b.remaining <= 0:
+            return b.reset_at - now
+        return 0.0
+
+    def _route_pace(self, key: Tuple[str, str], now: float) -> float:
+        # Spread the rest of a half-used bucket over its reset window instead of bursting into it.
+        bucket_hash = self._route_bucket.get(key[0])
+        b = self._buckets.get((bucket_hash, key[1])) if bucket_hash else None
+        if b is None or b.reset_at <= now or b.remaining * 2 >= b.limit:
+            return 0.0
+        return (b.reset_at - now) / (b.remaining + 1)
+
+    async def acquire(self, priority: int, key: Optional[Tuple[str, str]] = None):
+        floor = (0.0, self.normal_floor, self.bulk_floor)[priority]
+        started = time.monotonic()
+        if priority == BULK and key is not None:
+            pace = self._route_pace(key, started)
+            if pace:
+                await asyncio.sleep(pace)
+        while True:
+            now = time.monotonic()
+            wait = max(self._global_until - now, self._route_wait(key, now) if key else 0.0)
+            if wait <= 0:
+                self._refill(now)
+                if self._tokens - 1 >= floor:
+                    self._tokens -= 1
+                    break
+                wait = (floor + 1 - self._tokens) / self.rate
+            if priority == BULK and now + wait - started > self.bulk_max_wait:
+                self.shed += 1
+                raise RestBudgetExceeded(f"REST budget exhausted for {PRIORITY_NAMES[priority]} work")
+            await asyncio.sleep(min(wait, 1.0))
+        self.requests[priority] += 1
+        self.waited[priority] += time.monotonic() - started
+
+    def observe(self, method: str, path: str, status: int, headers):
+        now = time.monotonic()
+        key = route_key(method, path)
+        bucket_hash = headers.get("X-RateLimit-Bucket")
+        if bucket_hash:
+            self._route_bucket[key[0]] = bucket_hash
+            try:
+                self._buckets[(bucket_hash, key[1])] = _Bucket(
+                    int(headers.get("X-RateLimit-Limit", "1")),
+                    int(headers.get("X-RateLimit-Remaining", "1")),
+                    now + float(headers.get("X-RateLimit-Reset-After", "0")),
+                )
+            except ValueError:
+                pass
+        if status == 429:
+            retry = float(headers.get("Retry-After", "1") or 1)
+            if headers.get("X-RateLimit-Global") or headers.get("X-RateLimit-Scope") == "global":
+                self.global_429s += 1
+                self._global_until = max(self._global_until, now + retry)
+                self._tokens = 0.0
+            else:
+                self.route_429s += 1
+        if len(self._buckets) > 10000:
+            for k in [k for k, b in self._buckets.items() if b.reset_at <= now]:
+                del self._buckets[k]
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        tc = aiohttp.TraceConfig()
+
+        async def on_start(session, ctx, params: aiohttp.TraceRequestStartParams):
+            path = params.url.path
+            await self.acquire(classify(params.method, path), route_key(params.method, path))
+
+        async def on_end(session, ctx, params: aiohttp.TraceRequestEndParams):
+            self.observe(params.method, params.url.path, params.response.status, params.response.headers)
+
+        tc.on_request_start.append(on_start)
+        tc.on_request_end.append(on_end)
+        return tc
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "tokens": round(self.tokens, 2),
+            "pressure": round(self.pressure(), 3),
+            "interactive": self.requests[INTERACTIVE],
+            "normal": self.requests[NORMAL],
+            "bulk": self.requests[BULK],
+            "shed": self.shed,
+            "global_429s": self.global_429s,
+            "route_429s": self.route_429s,
+            "buckets": len(self._buckets),
+        }
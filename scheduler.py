@@ -0,0 +1,203 @@
+# scheduler.py
+# Fair admission for summary work: one queue per guild served deficit-round-robin, a global
+# concurrency cap, and at most one running job per channel.
+
+import time
+import asyncio
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Set
+
+class QueueTimeout(Exception):
+    pass
+
+class Ticket:
+    __slots__ = ("guild_id", "channel_id", "cost", "fut", "enqueued_at", "started_at")
+
+    def __init__(self, guild_id: int, channel_id: int, cost: int, fut: asyncio.Future):
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.cost = cost
+        self.fut = fut
+        self.enqueued_at = time.monotonic()
+        self.started_at = 0.0
+
+WaitCallback = Callable[[int, float], Awaitable[object]]
+
+class FairScheduler:
+    def __init__(self, concurrency: int, quantum: int = 1):
+        self.concurrency = concurrency
+        self.quantum = quantum
+        self._queues: "OrderedDict[int, Deque[Ticket]]" = OrderedDict()
+        self._deficit: Dict[int, int] = {}
+        self._credited: Optional[int] = None
+        self._weights: Dict[int, int] = {}
+        self._busy_channels: Set[int] = set()
+        self._running = 0
+        self._avg_service = 10.0
+
+        self.granted = 0
+        self.timed_out = 0
+        self.cancelled = 0
+        self.total_wait = 0.0
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    @property
+    def queued(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def set_weight(self, guild_id: int, weight: int):
+        if weight <= 1:
+            self._weights.pop(guild_id, None)
+        else:
+            self._weights[guild_id] = weight
+
+    def _eligible(self, q: Deque[Ticket]) -> Optional[Ticket]:
+        for t in q:
+            if t.channel_id not in self._busy_channels:
+                return t
+        return None
+
+    def _start(self, gid: int, t: Ticket):
+        self._queues[gid].remove(t)
+        if not self._queues[gid]:
+            del self._queues[gid]
+            self._deficit.pop(gid, None)
+            if self._credited == gid:
+                self._credited = None
+        self._busy_channels.add(t.channel_id)
+        self._running += 1
+        t.started_at = time.monotonic()
+        self.granted += 1
+        self.total_wait += t.started_at - t.enqueued_at
+        t.fut.set_result(None)
+
+    def _dispatch(self):
+        idle_visits = 0
+        while self._running < self.concurrency and self._queues:
+            gid = next(iter(self._queues))
+            q = self._queues[gid]
+            t = self._eligible(q)
+            if t is not None:
+                idle_visits = 0
+                if self._credited != gid:
+                    self._deficit[gid] = self._deficit.get(gid, 0) + self.quantum * self._weights.get(gid, 1)
+                    self._credited = gid
+                if self._deficit[gid] >= t.cost:
+                    self._deficit[gid] -= t.cost
+                    self._start(gid, t)
+                    continue
+            else:
+                idle_visits += 1
+                if idle_visits > len(self._queues):
+                    break  # every waiting job is blocked on a busy channel
+            # End of this guild's turn: move it to the back of the round.
+            self._queues.move_to_end(gid)
+            self._credited = None
+
+    def release(self, t: Ticket):
+        self._busy_channels.discard(t.channel_id)
+        self._running -= 1
+        took = time.monotonic() - t.started_at
+        self._avg_service = 0.8 * self._avg_service + 0.2 * took
+        self._dispatch()
+
+    def _abandon(self, t: Ticket):
+        if t.fut.done() and not t.fut.cancelled():
+            self.release(t)
+            return
+        t.fut.cancel()
+        q = self._queues.get(t.guild_id)
+        if q is not None and t in q:
+            q.remove(t)
+            if not q:
+                del self._queues[t.guild_id]
+                self._deficit.pop(t.guild_id, None)
+        self._dispatch()
+
+    def position(self, t: Ticket) -> int:
+        # Jobs ahead of this one: earlier jobs of the same guild, plus about one job per
+        # other guild for each of those rounds.
+        own = self._queues.get(t.guild_id)
+        if own is None or t not in own:
+            return 0
+        ahead_own = list(own).index(t)
+        ahead = ahead_own
+        for gid, q in self._queues.items():
+            if gid != t.guild_id:
+                ahead += min(len(q), ahead_own + 1)
+        return ahead + 1
+
+    def estimated_wait(self, t: Ticket) -> float:
+        pos = self.position(t)
+        if pos <= 0:
+            return 0.0
+        return (pos + self.concurrency - 1) // self.concurrency * self._avg_service
+
+    async def acquire(self, guild_id: int, channel_id: int, cost: int = 1, timeout: Optional[float] = None,
+                      on_wait: Optional[WaitCallback] = None, update_interval: float = 10.0) -> Ticket:
+        t = Ticket(guild_id, channel_id, max(1, cost), asyncio.get_running_loop().create_future())
+        self._queues.setdefault(guild_id, deque()).append(t)
+        self._dispatch()
+        if t.fut.done():
+            return t
+
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        try:
+            while True:
+                if on_wait is not None:
+                    try:
+                        await on_wait(self.position(t), self.estimated_wait(t))
+                    except Exception:
+                        pass
+                wait = update_interval
+                if deadline is not None:
+                    wait = min(wait, deadline - time.monotonic())
+                    if wait <= 0:
+                        self.timed_out += 1
+                        raise QueueTimeout()
+                try:
+                    await asyncio.wait_for(asyncio.shield(t.fut), wait)
+                    return t
+                except asyncio.TimeoutError:
+                    continue
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            self._abandon(t)
+            raise
+        except BaseException:
+            self._abandon(t)
+            raise
+
+    def slot(self, guild_id: int, channel_id: int, cost: int = 1, timeout: Optional[float] = None,
+             on_wait: Optional[WaitCallback] = None) -> "_Slot":
+        return _Slot(self, guild_id, channel_id, cost, timeout, on_wait)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "running": self._running,
+            "queued": self.queued,
+            "guilds_waiting": len(self._queues),
+            "granted": self.granted,
+            "timed_out": self.timed_out,
+            "cancelled": self.cancelled,
+            "avg_wait": round(self.total_wait / self.granted, 3) if self.granted else 0.0,
+            "avg_service": round(self._avg_service, 3),
+        }
+
+class _Slot:
+    def __init__(self, sched: FairScheduler, guild_id: int, channel_id: int, cost: int,
+                 timeout: Optional[float], on_wait: Optional[WaitCallback]):
+        self._sched = sched
+        self._args = (guild_id, channel_id, cost, timeout, on_wait)
+        self._ticket: Optional[Ticket] = None
+
+    async def __aenter__(self) -> Ticket:
+        self._ticket = await self._sched.acquire(*self._args)
+        return self._ticket
+
+    async def __aexit__(self, *exc):
+        self._sched.release(self._ticket)
+        return False
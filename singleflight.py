@@ -0,0 +1,67 @@
+# singleflight.py
+# Collapses identical concurrent calls: the first caller for a key does the work,
+# everyone who arrives while it is running awaits the same result. If the leader is
+# cancelled, its followers start over and one of them takes the lead with its own call.
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+class _LeaderCancelled(Exception):
+    pass
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.leaders = 0
+        self.followers = 0
+        self.handoffs = 0
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        # Returns (result, shared) where shared is True for followers.
+        fut = self._inflight.get(key)
+        while fut is not None:
+            self.followers += 1
+            try:
+                return await asyncio.shield(fut), True
+            except _LeaderCancelled:
+                self.followers -= 1
+                self.handoffs += 1
+                fut = self._inflight.get(key)
+
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        self.leaders += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            # Only this caller gave up; the key is freed below before any follower wakes up.
+            fut.set_exception(_LeaderCancelled())
+            fut.exception()
+            raise
+        except BaseException as e:
+            fut.set_exception(e)
+            fut.exception()  # followers may not exist; don't warn about an unretrieved exception
+            raise
+        else:
+            fut.set_result(result)
+            return result, False
+        finally:
+            if self._inflight.get(key) is fut:
+                del self._inflight[key]
+
+    @property
+    def coalesce_rate(self) -> float:
+        total = self.leaders + self.followers
+        return self.followers / total if total else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "inflight": len(self._inflight),
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "coalesce_rate": round(self.coalesce_rate, 4),
+            "handoffs": self.handoffs,
+        }
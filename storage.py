@@ -0,0 +1,224 @@
+# storage.py
+# One long-lived SQLite connection owned by a background thread. Reads are awaitable,
+# writes are queued and committed together in small batches. A write that finds the database
+# locked by another connection (VACUUM, an export) is held back, together with every write
+# queued after it, and retried until the lock is free; reads keep being served meanwhile.
+
+import time
+import queue
+import sqlite3
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, List, Optional, Sequence, Tuple
+
+_READ = 0
+_WRITE = 1
+_CALL = 2
+_STOP = 3
+
+BUSY_TIMEOUT_MS = 5000
+# While writes are held the lock is only probed, so reads aren't stuck behind a long wait.
+HELD_BUSY_TIMEOUT_MS = 50
+
+def _is_busy(e: sqlite3.Error) -> bool:
+    return (isinstance(e, sqlite3.OperationalError)
+            and getattr(e, "sqlite_errorcode", 0) & 0xFF in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED))
+
+class Storage:
+    def __init__(self, path: str, flush_interval: float = 0.005, max_batch: int = 256,
+                 retry_interval: float = 1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.retry_interval = retry_interval
+        self._held: Deque[Tuple[str, Sequence[Any]]] = deque()
+        self._q: "queue.SimpleQueue[tuple]" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self._start_error: Optional[BaseException] = None
+        self.writes_committed = 0
+        self.batches_committed = 0
+        self.write_errors = 0
+        self.busy_holds = 0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="storage", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._start_error is not None:
+            # The thread has already exited; let a later start() try again.
+            self._thread.join()
+            self._thread = None
+            self._ready.clear()
+            err, self._start_error = self._start_error, None
+            raise err
+
+    def close(self, timeout: float = 10.0):
+        if self._thread is None:
+            return
+        self._q.put((_STOP, None, None, None))
+        self._thread.join(timeout)
+        self._thread = None
+
+    def pending(self) -> int:
+        return self._q.qsize() + len(self._held)
+
+    def write(self, sql: str, params: Sequence[Any] = ()):
+        self._q.put((_WRITE, sql, params, None))
+
+    def submit_read(self, sql: str, params: Sequence[Any] = ()) -> Future:
+        fut: Future = Future()
+        self._q.put((_READ, sql, params, fut))
+        return fut
+
+    def submit_call(self, fn: Callable[[sqlite3.Connection], Any]) -> Future:
+        fut: Future = Future()
+        self._q.put((_CALL, fn, None, fut))
+        return fut
+
+    async def read(self, sql: str, params: Sequence[Any] = ()) -> List[tuple]:
+        return await asyncio.wrap_future(self.submit_read(sql, params))
+
+    async def read_one(self, sql: str, params: Sequence[Any] = ()) -> Optional[tuple]:
+        rows = await self.read(sql, params)
+        return rows[0] if rows else None
+
+    async def call(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        return await asyncio.wrap_future(self.submit_call(fn))
+
+    async def flush(self):
+        await self.call(lambda conn: None)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        return conn
+
+    def _commit(self, conn: sqlite3.Connection, batch: int):
+        # A failed COMMIT (disk full, I/O error) loses this batch but must not end the thread,
+        # or every read awaiting it would hang.
+        try:
+            if conn.in_transaction:
+                conn.commit()
+        except sqlite3.Error as e:
+            self.write_errors += batch or 1
+            print(f"⚠️ storage commit failed, {batch} writes lost: {e}")
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                pass
+            return
+        if batch:
+            self.writes_committed += batch
+            self.batches_committed += 1
+
+    def _hold(self, conn: sqlite3.Connection, sql: str, params: Sequence[Any]):
+        if not self._held:
+            self.busy_holds += 1
+            conn.execute(f"PRAGMA busy_timeout={HELD_BUSY_TIMEOUT_MS}")
+            print("⚠️ storage: database is locked, holding writes until it is free")
+        self._held.append((sql, params))
+
+    def _release_held(self, conn: sqlite3.Connection, wait: bool = False) -> bool:
+        # Applies held writes in order as one transaction. Returns True once none are left.
+        done = 0
+        while self._held:
+            sql, params = self._held[0]
+            try:
+                conn.execute(sql, params)
+            except sqlite3.Error as e:
+                if _is_busy(e):
+                    if not wait:
+                        break
+                    time.sleep(self.retry_interval)
+                    continue
+                self.write_errors += 1
+                print(f"⚠️ storage write failed: {e}")
+            else:
+                done += 1
+            self._held.popleft()
+        self._commit(conn, done)
+        if not self._held:
+            conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        return not self._held
+
+    def _run(self):
+        try:
+            conn = self._connect()
+        except BaseException as e:
+            self._start_error = e
+            return
+        finally:
+            self._ready.set()
+        batch = 0
+        deadline = 0.0
+
+        while True:
+            timeout = None
+            if batch:
+                timeout = max(0.0, deadline - time.monotonic())
+            elif self._held:
+                timeout = self.retry_interval
+            try:
+                kind, a, b, fut = self._q.get(timeout=timeout)
+            except queue.Empty:
+                self._commit(conn, batch)
+                batch = 0
+                if self._held:
+                    self._release_held(conn)
+                continue
+
+            if kind == _WRITE:
+                if self._held:
+                    # Nothing overtakes a held write, so the order of writes is kept.
+                    self._held.append((a, b))
+                    continue
+                try:
+                    conn.execute(a, b)
+                except sqlite3.Error as e:
+                    if _is_busy(e):
+                        self._hold(conn, a, b)
+                        continue
+                    self.write_errors += 1
+                    print(f"⚠️ storage write failed: {e}")
+                    continue
+                if batch == 0:
+                    deadline = time.monotonic() + self.flush_interval
+                batch += 1
+                if batch >= self.max_batch:
+                    self._commit(conn, batch)
+                    batch = 0
+                continue
+
+            if kind == _STOP:
+                self._commit(conn, batch)
+                self._release_held(conn, wait=True)
+                break
+
+            if not fut.set_running_or_notify_cancel():
+                continue
+            try:
+                if kind == _READ:
+                    # Held writes aren't visible yet; reads see the last committed state.
+                    result = conn.execute(a, b).fetchall()
+                else:
+                    self._commit(conn, batch)
+                    batch = 0
+                    # A call (and flush()) runs after every write queued before it.
+                    self._release_held(conn, wait=True)
+                    result = a(conn)
+                    if conn.in_transaction:
+                        conn.commit()
+                fut.set_result(result)
+            except BaseException as e:
+                if kind == _CALL and conn.in_transaction:
+                    conn.rollback()
+                fut.set_exception(e)
+
+        conn.close()
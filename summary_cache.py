@@ -0,0 +1,114 @@
+# summary_cache.py
+# Recent summaries keyed by (channel, first/last message id, language, include_topics), so an
+# overlapping request only has to summarize the messages that arrived since.
+
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Dict, Optional, Sequence, Tuple
+
+SummaryKey = Tuple[int, int, int, str, bool]
+
+class SummaryEntry:
+    __slots__ = ("first_id", "last_id", "count", "summary", "created_at")
+
+    def __init__(self, first_id: int, last_id: int, count: int, summary: str):
+        self.first_id = first_id
+        self.last_id = last_id
+        self.count = count
+        self.summary = summary
+        self.created_at = time.monotonic()
+
+class SummaryStore:
+    def __init__(self, per_guild: int, max_guilds: int, ttl: float, min_overlap: float = 0.6):
+        self.per_guild = per_guild
+        self.max_guilds = max_guilds
+        self.ttl = ttl
+        self.min_overlap = min_overlap
+        self._guilds: "OrderedDict[int, OrderedDict[SummaryKey, SummaryEntry]]" = OrderedDict()
+
+        self.exact_hits = 0
+        self.partial_hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return sum(len(g) for g in self._guilds.values())
+
+    def _expired(self, entry: SummaryEntry, now: float) -> bool:
+        return now - entry.created_at > self.ttl
+
+    def put(self, guild_id: int, channel_id: int, first_id: int, last_id: int,
+            language: str, include_topics: bool, count: int, summary: str):
+        entries = self._guilds.get(guild_id)
+        if entries is None:
+            entries = self._guilds[guild_id] = OrderedDict()
+        self._guilds.move_to_end(guild_id)
+
+        key = (channel_id, first_id, last_id, language, include_topics)
+        entries[key] = SummaryEntry(first_id, last_id, count, summary)
+        entries.move_to_end(key)
+
+        now = time.monotonic()
+        for k in [k for k, e in entries.items() if self._expired(e, now)]:
+            del entries[k]
+        while len(entries) > self.per_guild:
+            entries.popitem(last=False)
+        while len(self._guilds) > self.max_guilds:
+            self._guilds.popitem(last=False)
+
+    def find(self, guild_id: int, channel_id: int, ids: Sequence[int],
+             language: str, include_topics: bool) -> Optional[SummaryEntry]:
+        # ids: message ids of the new request, ascending
+        entries = self._guilds.get(guild_id)
+        if not entries or not ids:
+            self.misses += 1
+            return None
+        first_id, last_id = ids[0], ids[-1]
+
+        now = time.monotonic()
+        best_key = None
+        best: Optional[SummaryEntry] = None
+        for key, e in list(entries.items()):
+            if self._expired(e, now):
+                del entries[key]
+                continue
+            if key[0] != channel_id or key[3] != language or key[4] != include_topics:
+                continue
+            # The stored range must cover the start of the request and end inside it.
+            if not (e.first_id <= first_id <= e.last_id <= last_id):
+                continue
+            if bisect_right(ids, e.last_id) < self.min_overlap * e.count:
+                continue
+            if best is None or e.last_id > best.last_id:
+                best_key, best = key, e
+
+        if best is None:
+            self.misses += 1
+            return None
+
+        entries.move_to_end(best_key)
+        self._guilds.move_to_end(guild_id)
+        if best.first_id == first_id and best.last_id == last_id:
+            self.exact_hits += 1
+        else:
+            self.partial_hits += 1
+        return best
+
+    def invalidate(self, guild_id: int, channel_id: int, message_id: int):
+        entries = self._guilds.get(guild_id)
+        if not entries:
+            return
+        for k in [k for k, e in entries.items()
+                  if k[0] == channel_id and e.first_id <= message_id <= e.last_id]:
+            del entries[k]
+
+    def purge_guild(self, guild_id: int):
+        self._guilds.pop(guild_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self),
+            "exact_hits": self.exact_hits,
+            "partial_hits": self.partial_hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,20 @@
+# tests/conftest.py
+# The modules live at the repository root, next to backscroll.py.
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import migrations
+from storage import Storage
+
+@pytest.fixture
+def storage(tmp_path):
+    s = Storage(str(tmp_path / "metrics.db"))
+    s.start()
+    s.submit_call(migrations.migrate).result()
+    yield s
+    s.close()
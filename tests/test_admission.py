@@ -0,0 +1,48 @@
+import admission
+from admission import AdmissionController
+
+def _ctl(**kw):
+    # Load 1.0 = 100 s of expected queue wait; the other signals stay at 0.
+    return AdmissionController(queue_seconds=100.0, hold_seconds=30.0, **kw)
+
+def _observe(ctl, load, now):
+    return ctl.observe(load * 100.0, 0.0, 0.0, now=now)
+
+def test_rises_at_once():
+    ctl = _ctl()
+    assert _observe(ctl, 0.5, 0) == admission.NORMAL
+    assert _observe(ctl, 2.5, 1) == admission.LITE
+    assert _observe(ctl, 3.0, 2) == admission.REJECT
+    assert not ctl.admit()
+
+def test_falls_one_level_per_hold_period():
+    ctl = _ctl()
+    _observe(ctl, 2.5, 0)
+    assert _observe(ctl, 1.0, 10) == admission.LITE
+    assert _observe(ctl, 1.0, 30) == admission.NO_TOPICS
+    # 1.0 is under the exit line of NO_TOPICS (1.5 * 0.7) but not below FEWER_MESSAGES' threshold.
+    assert _observe(ctl, 1.0, 60) == admission.FEWER_MESSAGES
+    assert _observe(ctl, 1.0, 600) == admission.FEWER_MESSAGES
+
+def test_load_above_exit_line_holds_the_level():
+    ctl = _ctl()
+    _observe(ctl, 1.2, 0)
+    for now in range(10, 300, 10):
+        assert _observe(ctl, 0.8, now) == admission.FEWER_MESSAGES
+    assert _observe(ctl, 0.5, 310) == admission.FEWER_MESSAGES
+    assert _observe(ctl, 0.5, 340) == admission.NORMAL
+
+def test_quiet_spell_walks_down_several_levels():
+    ctl = _ctl()
+    _observe(ctl, 2.5, 0)
+    assert _observe(ctl, 0.0, 100) == admission.NORMAL
+    assert ctl.transitions == 4
+
+def test_plan_degrades_by_level():
+    ctl = _ctl(max_count=200, lite_model="lite", lite_max_tokens=250)
+    _observe(ctl, 1.8, 0)
+    plan = ctl.plan(500, None)
+    assert (plan.count, plan.include_topics, plan.model, plan.degraded) == (200, False, None, True)
+    _observe(ctl, 2.5, 1)
+    plan = ctl.plan(100, True)
+    assert (plan.count, plan.include_topics, plan.model, plan.max_tokens) == (100, False, "lite", 250)
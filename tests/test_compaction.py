@@ -0,0 +1,29 @@
+from compaction import compact_text, compact_transcript
+
+def test_consecutive_repeat_by_same_author_is_dropped():
+    r = compact_transcript([(1, "sam", "hi"), (1, "sam", "hi"), (1, "sam", "bye")], 1000)
+    assert r.text == "sam: hi / bye"
+
+def test_same_text_from_different_authors_is_kept():
+    r = compact_transcript([(1, "sam", "+1"), (2, "sam", "+1")], 1000)
+    assert r.text == "sam: +1\nsam: +1"
+
+def test_long_line_repeated_later_appears_once_per_author():
+    spam = "buy cheap followers at the usual place"
+    msgs = [(1, "a", spam), (2, "b", "no thanks"), (1, "a", spam), (3, "c", spam)]
+    r = compact_transcript(msgs, 1000)
+    assert r.text == f"a: {spam}\nb: no thanks\nc: {spam}"
+
+def test_runs_merge_by_author_id_not_name():
+    r = compact_transcript([(1, "sam", "one"), (2, "sam", "two"), (2, "sam", "three")], 1000)
+    assert r.text == "sam: one\nsam: two / three"
+
+def test_budget_drops_least_informative_lines_first():
+    msgs = [(1, "a", "ok"), (2, "b", "the build fails on arm64 since the last compiler bump"), (3, "c", "ok ok")]
+    r = compact_transcript(msgs, 18)
+    assert r.dropped == 2
+    assert r.text == "b: the build fails on arm64 since the last compiler bump"
+    assert r.tokens_after < r.tokens_before
+
+def test_markup_is_shortened():
+    assert compact_text("see https://www.example.com/a/b <@123> <#456>") == "see <link:example.com> @user #channel"
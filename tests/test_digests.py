@@ -0,0 +1,44 @@
+import asyncio
+
+from digests import DigestItem, DigestStore
+
+def _row(storage, channel_id=20):
+    async def read():
+        await storage.flush()
+        return await storage.read_one(
+            "SELECT attempts, retry_at, last_run, last_message_id, pending_batch FROM digest_subscriptions "
+            "WHERE guild_id = '10' AND channel_id = ?", (str(channel_id),)
+        )
+    return asyncio.run(read())
+
+def test_failed_backs_off_exponentially_then_gives_up(storage):
+    store = DigestStore(storage, max_attempts=4, retry_base=600, retry_max=1000)
+    store.add(10, 20, "hourly", 1, now=100)
+    store.record_batch("b1", "me", [DigestItem(10, 20, 100, 555, 3)], now=200)
+    assert _row(storage)[4] == "b1"
+
+    store.failed(10, 20, now=1000, last_message_id=555)
+    assert _row(storage) == (1, 1600, 100, "", "")
+    store.failed(10, 20, now=2000, last_message_id=555)
+    assert _row(storage) == (2, 3000, 100, "", "")
+    # 600 * 4 is capped at retry_max.
+    store.failed(10, 20, now=3000, last_message_id=555)
+    assert _row(storage) == (3, 4000, 100, "", "")
+    # The last attempt gives the window up as if it had been posted.
+    store.failed(10, 20, now=4000, last_message_id=555)
+    assert _row(storage) == (0, 0, 4000, "555", "")
+
+def test_giving_up_without_a_message_id_keeps_the_old_one(storage):
+    store = DigestStore(storage, max_attempts=1)
+    store.add(10, 20, "daily", 1, now=100)
+    store.done(DigestItem(10, 20, 100, 444, 3), now=150)
+    store.failed(10, 20, now=500)
+    assert _row(storage) == (0, 0, 500, "444", "")
+
+def test_failure_only_touches_its_channel(storage):
+    store = DigestStore(storage)
+    store.add(10, 20, "hourly", 1, now=100)
+    store.add(10, 21, "hourly", 1, now=100)
+    store.failed(10, 20, now=1000)
+    assert _row(storage, 20)[0] == 1
+    assert _row(storage, 21)[:2] == (0, 0)
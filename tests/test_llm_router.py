@@ -0,0 +1,60 @@
+import types
+
+import pytest
+
+import llm_router
+from llm_router import CircuitBreaker
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_router, "time", types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+def test_opens_after_a_failure_streak(clock):
+    b = CircuitBreaker(failures=3, cooldown=30)
+    b.record(False)
+    b.record(False)
+    b.record(True)
+    b.record(False)
+    b.record(False)
+    assert b.state == "closed" and b.allow()
+    b.record(False)
+    assert b.state == "open" and not b.allow()
+    assert b.opened == 1
+
+def test_half_open_lets_one_probe_through(clock):
+    b = CircuitBreaker(failures=1, cooldown=30)
+    b.record(False)
+    clock[0] += 30
+    assert b.state == "half_open"
+    assert b.allow()
+    assert not b.allow()
+    b.record(True)
+    assert b.state == "closed" and b.allow()
+
+def test_failed_probe_reopens(clock):
+    b = CircuitBreaker(failures=1, cooldown=30)
+    b.record(False)
+    clock[0] += 30
+    assert b.allow()
+    b.record(False)
+    assert b.state == "open" and b.opened == 2
+    clock[0] += 29
+    assert not b.allow()
+
+def test_released_probe_frees_the_slot(clock):
+    b = CircuitBreaker(failures=1, cooldown=30)
+    b.record(False)
+    clock[0] += 30
+    assert b.allow()
+    b.release()
+    assert b.state == "half_open" and b.allow()
+
+def test_failures_while_open_extend_it_without_counting_again(clock):
+    b = CircuitBreaker(failures=1, cooldown=30)
+    b.record(False)
+    clock[0] += 20
+    b.record(False)
+    clock[0] += 20
+    assert b.state == "open" and b.opened == 1
@@ -0,0 +1,35 @@
+import sqlite3
+
+import migrations
+
+def _schema(conn):
+    return conn.execute("SELECT type, name, sql FROM sqlite_master ORDER BY type, name").fetchall()
+
+def test_migrate_twice_applies_nothing_the_second_time(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "metrics.db"))
+    assert migrations.migrate(conn) == [v for v, _, _ in migrations.MIGRATIONS]
+    assert migrations.current_version(conn) == migrations.LATEST
+    before = _schema(conn)
+    assert migrations.migrate(conn) == []
+    assert _schema(conn) == before
+
+def test_steps_can_run_again_on_a_current_database(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "metrics.db"))
+    migrations.migrate(conn)
+    before = _schema(conn)
+    for _, _, step in migrations.MIGRATIONS:
+        step(conn)
+    conn.commit()
+    assert _schema(conn) == before
+
+def test_unversioned_database_is_brought_up_to_date(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "metrics.db"))
+    # The first release: usage_events without the user and channel columns, and no schema_version.
+    conn.execute("CREATE TABLE usage_events (id INTEGER PRIMARY KEY AUTOINCREMENT, guild_id TEXT, "
+                 "guild_name TEXT, command_name TEXT, ts INTEGER)")
+    conn.execute("INSERT INTO usage_events (guild_id, guild_name, command_name, ts) VALUES ('1', 'g', 'backscroll', 5)")
+    conn.commit()
+    migrations.migrate(conn)
+    cols = {row[1] for row in conn.execute("PRAGMA table_info(usage_events)")}
+    assert {"user_id", "user_name", "channel_id", "channel_name"} <= cols
+    assert conn.execute("SELECT guild_id, ts FROM usage_events").fetchall() == [("1", 5)]
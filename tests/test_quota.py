@@ -0,0 +1,61 @@
+import asyncio
+
+from quota import QuotaEngine, QuotaGate
+
+def test_guild_window_expires_by_bucket():
+    q = QuotaEngine(guild_window=3600, cooldown=60, bucket_seconds=60)
+    q.record_guild(1, 1000)
+    q.record_guild(1, 1010)
+    q.record_guild(1, 2000)
+    assert q.guild_used(1, 2000) == 3
+    # The bucket starting at 960 covers up to 1020 and leaves the window an hour after that.
+    assert q.guild_used(1, 4619) == 3
+    assert q.guild_used(1, 4620) == 1
+    assert q.guild_used(2, 4620) == 0
+
+def test_out_of_order_events_stay_sorted():
+    q = QuotaEngine(guild_window=3600, cooldown=60)
+    q.load_guild_events([("1", 2000), ("1", 1000), ("1", 1500), ("1", 1000)])
+    assert [b[0] for b in q._guilds[1].buckets] == [960, 1500, 1980]
+    assert q.guild_used(1, 2000) == 4
+    assert q.guild_used(1, 1020 + 3600) == 2
+
+def test_user_days_and_cooldowns():
+    q = QuotaEngine(guild_window=3600, cooldown=60)
+    q.record_user(7, "2026-01-01")
+    q.record_user(7, "2026-01-01")
+    assert q.user_used(7, "2026-01-01") == 2
+    assert q.user_used(7, "2026-01-02") == 0
+    q.bump_cooldown(7, 100)
+    assert q.cooldown_remaining(7, 130) == 30
+    assert q.cooldown_remaining(7, 160) == 0
+    assert q.take_dirty_cooldowns() == [("7", 100)]
+    assert q.take_dirty_cooldowns() == []
+
+def test_purge_drops_expired_state():
+    q = QuotaEngine(guild_window=3600, cooldown=60)
+    q.record_guild(1, 0)
+    q.record_user(7, "2026-01-01")
+    q.bump_cooldown(7, 0)
+    assert q.purge(3660, "2026-01-02") == 3
+    assert len(q) == 0
+
+class _Writes:
+    def __init__(self):
+        self.writes = []
+
+    def write(self, sql, params=()):
+        self.writes.append(params)
+
+def test_gate_checks_cooldown_then_guild_then_user():
+    gate = QuotaGate(QuotaEngine(guild_window=3600, cooldown=60), _Writes(), guild_limit=2, user_limit=1)
+    day = "2026-01-01"
+    assert asyncio.run(gate.admit(1, 7, True, 0, day)) == ("", 0)
+    # Admission starts the cooldown at once, before anything is charged.
+    assert asyncio.run(gate.admit(1, 7, True, 10, day)) == ("cooldown", 50)
+    gate.charge(1, 7, True, 0, day)
+    assert gate.storage.writes == [("7", day)]
+    assert asyncio.run(gate.admit(1, 7, True, 60, day)) == ("user", 1)
+    assert asyncio.run(gate.admit(1, 7, False, 60, day)) == ("", 0)
+    gate.charge(1, 8, False, 60, day)
+    assert asyncio.run(gate.admit(1, 9, True, 60, day)) == ("guild", 2)
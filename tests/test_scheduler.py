@@ -0,0 +1,64 @@
+import asyncio
+
+from scheduler import FairScheduler
+
+async def _grant_order(sched, jobs):
+    # Hold the only slot, queue everything, then release one job at a time.
+    running = await sched.acquire(0, 0)
+    order = []
+
+    async def job(guild_id, channel_id):
+        order.append(await sched.acquire(guild_id, channel_id))
+
+    tasks = [asyncio.create_task(job(g, c)) for g, c in jobs]
+    await asyncio.sleep(0)
+    for n in range(1, len(jobs) + 1):
+        sched.release(running)
+        while len(order) < n:
+            await asyncio.sleep(0)
+        running = order[-1]
+    sched.release(running)
+    await asyncio.gather(*tasks)
+    return [t.guild_id for t in order]
+
+def test_guilds_take_turns():
+    jobs = [(1, c) for c in range(10, 14)] + [(2, c) for c in range(20, 22)]
+    assert asyncio.run(_grant_order(FairScheduler(1), jobs)) == [1, 2, 1, 2, 1, 1]
+
+def test_weight_gives_more_turns():
+    async def main():
+        sched = FairScheduler(1)
+        sched.set_weight(1, 3)
+        jobs = [(1, c) for c in range(10, 15)] + [(2, c) for c in range(20, 22)]
+        return await _grant_order(sched, jobs)
+    assert asyncio.run(main()) == [1, 1, 1, 2, 1, 1, 2]
+
+def test_one_job_per_channel():
+    async def main():
+        sched = FairScheduler(2)
+        first = await sched.acquire(1, 10)
+        second = asyncio.create_task(sched.acquire(1, 10))
+        other = await sched.acquire(1, 11)
+        await asyncio.sleep(0)
+        assert not second.done() and sched.running == 2
+        sched.release(other)
+        await asyncio.sleep(0)
+        assert not second.done()
+        sched.release(first)
+        sched.release(await second)
+        assert sched.stats()["queued"] == 0 and sched.running == 0
+    asyncio.run(main())
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def main():
+        sched = FairScheduler(1)
+        held = await sched.acquire(1, 10)
+        waiter = asyncio.create_task(sched.acquire(2, 20))
+        await asyncio.sleep(0)
+        assert sched.queued == 1
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert sched.queued == 0 and sched.cancelled == 1
+        sched.release(held)
+        assert sched.running == 0
+    asyncio.run(main())